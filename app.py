@@ -1,14 +1,15 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-from recommendation_engine import RecommendationEngine
-from data_handling import DataHandler
+from data_store import get_data_store
+from utils.instrumentation import instrumentation
 
-# Initialize session state
-if 'recommendation_engine' not in st.session_state:
-    st.session_state.recommendation_engine = RecommendationEngine()
-    st.session_state.recommendation_engine.initialize()
+# One data snapshot + engine per process, shared by all sessions and pages
+data_store = get_data_store()
+
+# sort options of the paginated lists: label -> column (None -> data order)
+DESTINATION_SORTS = {'Catalog order': None, 'Name': 'name', 'Popularity': 'popularity_score', 'Budget': 'budget_level'}
+TRIP_SORTS = {'Trip order': None, 'Visit date': 'visit_date', 'Rating': 'rating', 'Destination': 'name'}
+PAGE_SIZES = [10, 25, 50, 100]
 
 def main():
     st.set_page_config(
@@ -24,18 +25,25 @@ def main():
     # Sidebar for navigation
     st.sidebar.title("Navigation")
     page = st.sidebar.selectbox("Choose a page", 
-                               ["Home", "Get Recommendations", "Explore Destinations", "Travel History"])
-    
-    if page == "Home":
-        show_home_page()
-    elif page == "Get Recommendations":
-        show_recommendations_page()
-    elif page == "Explore Destinations":
-        show_explore_page()
-    elif page == "Travel History":
-        show_history_page()
+                               ["Home", "Get Recommendations", "Explore Destinations", "Travel History", "Diagnostics"])
+    
+    # Refresh hook: rebuild the shared snapshot after the data files changed
+    if st.sidebar.button("🔄 Reload data"):
+        data_store.refresh()
+    
+    with data_store.snapshot() as snapshot:
+        if page == "Home":
+            show_home_page(snapshot)
+        elif page == "Get Recommendations":
+            show_recommendations_page(snapshot)
+        elif page == "Explore Destinations":
+            show_explore_page(snapshot)
+        elif page == "Travel History":
+            show_history_page(snapshot)
+        elif page == "Diagnostics":
+            show_diagnostics_page(snapshot)
 
-def show_home_page():
+def show_home_page(snapshot):
     st.header("Welcome to Your Personal Travel Recommender!")
     
     col1, col2 = st.columns(2)
@@ -63,8 +71,7 @@ def show_home_page():
         st.subheader("📊 System Stats")
         
         # Get some stats from the data
-        data_handler = DataHandler()
-        destinations_df, user_history_df = data_handler.load_data()
+        destinations_df, user_history_df = snapshot.destinations_df, snapshot.user_history_df
         
         stats_col1, stats_col2 = st.columns(2)
         with stats_col1:
@@ -75,7 +82,7 @@ def show_home_page():
             st.metric("Destination Types", destinations_df['type'].nunique())
             st.metric("Your Visits", len(user_history_df))
 
-def show_recommendations_page():
+def show_recommendations_page(snapshot):
     st.header("🎯 Get Personalized Recommendations")
     
     # User preferences
@@ -94,10 +101,17 @@ def show_recommendations_page():
         preferred_climate = st.selectbox("Preferred Climate", 
                                        ["Any", "Tropical", "Temperate", "Mediterranean", "Desert", "Cold"])
     
+    # sidebar preferences become filters applied before scoring
+    budget_ranges = {"Low (1-2)": (1, 2), "Medium (3)": (3, 3), "High (4-5)": (4, 5)}
+    filters = {
+        'budget_range': budget_ranges.get(preferred_budget),
+        'climate': [] if preferred_climate == "Any" else [preferred_climate]
+    }
+    
     if st.button("Get Recommendations", type="primary"):
         with st.spinner("Generating personalized recommendations..."):
-            recommendations = st.session_state.recommendation_engine.get_recommendations(
-                user_id=1, num_recommendations=num_recommendations
+            recommendations = snapshot.engine.get_recommendations(
+                user_id=1, num_recommendations=num_recommendations, filters=filters
             )
             
             if not recommendations.empty:
@@ -124,7 +138,7 @@ def show_recommendations_page():
                             
                             # Find similar destinations
                             if st.button(f"Find Similar", key=f"similar_{rec['destination_id']}"):
-                                similar = st.session_state.recommendation_engine.get_similar_destinations(
+                                similar = snapshot.engine.get_similar_destinations(
                                     rec['destination_id'], num_similar=3
                                 )
                                 if not similar.empty:
@@ -134,12 +148,11 @@ def show_recommendations_page():
             else:
                 st.info("No recommendations available. Try adjusting your preferences!")
 
-def show_explore_page():
+def show_explore_page(snapshot):
     st.header("🗺️ Explore All Destinations")
     
-    # Get all destinations
-    data_handler = DataHandler()
-    destinations_df, _ = data_handler.load_data()
+    # distinct countries / types / climates of the catalog, kept with the pre-aggregated counts
+    analytics = snapshot.engine.analytics
     
     # Filters
     st.subheader("Filter Destinations")
@@ -147,34 +160,33 @@ def show_explore_page():
     
     with col1:
         country_filter = st.multiselect("Countries", 
-                                      options=destinations_df['country'].unique(),
+                                      options=analytics.countries,
                                       default=[])
     
     with col2:
         type_filter = st.multiselect("Destination Types", 
-                                   options=destinations_df['type'].unique(),
+                                   options=analytics.types,
                                    default=[])
     
     with col3:
         climate_filter = st.multiselect("Climate", 
-                                      options=destinations_df['climate'].unique(),
+                                      options=analytics.climates,
                                       default=[])
     
-    # apply filters
-    filtered_df = destinations_df.copy()
-    
-    if country_filter:
-        filtered_df = filtered_df[filtered_df['country'].isin(country_filter)]
-    if type_filter:
-        filtered_df = filtered_df[filtered_df['type'].isin(type_filter)]
-    if climate_filter:
-        filtered_df = filtered_df[filtered_df['climate'].isin(climate_filter)]
+    # apply filters (bitmap intersection on the engine's attribute index)
+    filtered_rows = snapshot.engine.attribute_index.candidates({
+        'country': country_filter,
+        'type': type_filter,
+        'climate': climate_filter
+    })
     
-    # display results
-    st.subheader(f"Found {len(filtered_df)} destinations")
+    # display results, one page at a time (sorted and sliced by the snapshot, only the page is rendered)
+    st.subheader(f"Found {len(filtered_rows)} destinations")
+    sort_by, descending, page, page_size = page_controls('explore', len(filtered_rows), DESTINATION_SORTS)
+    page_df, _ = snapshot.destination_page(filtered_rows, sort_by, descending, page, page_size)
     
     # Create a more visual display
-    for idx, dest in filtered_df.iterrows():
+    for idx, dest in page_df.iterrows():
         with st.expander(f"🏖️ {dest['name']}, {dest['country']}", expanded=False):
             col1, col2 = st.columns(2)
             
@@ -190,55 +202,50 @@ def show_explore_page():
                 st.write(f"**Popularity Score:** {dest['popularity_score']:.1f}/10")
                 st.progress(dest['popularity_score'] / 10)
     
-    # Visualization
+    # Visualization (from the engine's pre-aggregated counts, same cost for any catalog size)
+    import plotly.express as px     # imported by the chart pages only, keeps it out of the first page load
+    
     st.subheader("📊 Destination Analytics")
     
+    type_counts, budget_popularity = analytics.destination_summary(country_filter, type_filter, climate_filter)
     col1, col2 = st.columns(2)
     
     with col1:
-        # Popularity vs Budget scatter plot
-        fig_scatter = px.scatter(filtered_df, 
-                               x='budget_level', 
-                               y='popularity_score',
-                               color='type',
-                               hover_data=['name', 'country'],
+        # Popularity vs Budget histogram (destinations per budget level and popularity bin)
+        fig_heatmap = px.imshow(budget_popularity.T, 
+                               x=[str(level) for level in budget_popularity.index],
+                               labels={'x': 'Budget Level', 'y': 'Popularity Score', 'color': 'Destinations'},
+                               origin='lower', aspect='auto', text_auto=True,
                                title="Popularity vs Budget Level")
-        st.plotly_chart(fig_scatter, use_container_width=True)
+        st.plotly_chart(fig_heatmap, use_container_width=True)
     
     with col2:
         # Distribution by type
-        type_counts = filtered_df['type'].value_counts()
         fig_pie = px.pie(values=type_counts.values, 
                         names=type_counts.index,
                         title="Distribution by Destination Type")
         st.plotly_chart(fig_pie, use_container_width=True)
 
-def show_history_page():
+def show_history_page(snapshot):
     st.header("📚 Your Travel History")
     
-    # get user history
-    data_handler = DataHandler()
-    destinations_df, user_history_df = data_handler.load_data()
-    
-    # merge history with destination details
-    history_with_details = user_history_df.merge(destinations_df, on='destination_id')
+    # Travel analytics, from the engine's pre-aggregated visit counts (no merge of the whole history)
+    visits = snapshot.engine.analytics.visit_summary()
+    import plotly.express as px
     
-    # Travel analytics
     st.subheader("Your Travel Analytics")
     
     col1, col2 = st.columns(2)
     
     with col1:
         # average rating
-        avg_rating = history_with_details['rating'].mean()
-        st.metric("Average Trip Rating", f"{avg_rating:.1f}/5")
+        st.metric("Average Trip Rating", f"{visits['average_rating']:.1f}/5")
         
         # favorite destination type
-        fav_type = history_with_details['type'].mode().iloc[0] if not history_with_details['type'].mode().empty else "None"
-        st.metric("Favorite Destination Type", fav_type)
+        st.metric("Favorite Destination Type", visits['favorite_type'] or "None")
         
         # Travel preferences chart
-        type_ratings = history_with_details.groupby('type')['rating'].mean().sort_values(ascending=False)
+        type_ratings = visits['type_ratings']
         fig_bar = px.bar(x=type_ratings.index, y=type_ratings.values,
                         title="Your Average Ratings by Destination Type",
                         labels={'x': 'Destination Type', 'y': 'Average Rating'})
@@ -246,25 +253,25 @@ def show_history_page():
     
     with col2:
         # Climate preferences
-        climate_counts = history_with_details['climate'].value_counts()
+        climate_counts = visits['climate_visits']
         fig_climate = px.pie(values=climate_counts.values, 
                            names=climate_counts.index,
                            title="Your Climate Preferences")
         st.plotly_chart(fig_climate, use_container_width=True)
         
-        # Budget vs Rating scatter
-        fig_budget = px.scatter(history_with_details, 
-                              x='budget_level', 
-                              y='rating',
-                              size='popularity_score',      # size of data-point wrt popularity
-                              hover_data=['name'],
+        # Budget vs Rating histogram (trips per budget level and rating)
+        budget_ratings = visits['budget_ratings']
+        fig_budget = px.imshow(budget_ratings.T, 
+                              x=[str(level) for level in budget_ratings.index],
+                              labels={'x': 'Budget Level', 'y': 'Rating', 'color': 'Trips'},
+                              origin='lower', aspect='auto', text_auto=True,
                               title="Budget vs Your Ratings")
         st.plotly_chart(fig_budget, use_container_width=True)
     
     # User profile insights
     st.subheader("🎯 Your Travel Profile")
     
-    profile = st.session_state.recommendation_engine.create_user_profile(user_id=1)
+    profile = snapshot.engine.create_user_profile(user_id=1)
     if profile:
         col1, col2 = st.columns(2)
         
@@ -291,7 +298,9 @@ def show_history_page():
     
     st.subheader("Your Previous Trips")
     
-    for idx, trip in history_with_details.iterrows():
+    sort_by, descending, page, page_size = page_controls('trips', snapshot.num_trips(), TRIP_SORTS)
+    trips_df, _ = snapshot.history_page(sort_by, descending, page, page_size)
+    for idx, trip in trips_df.iterrows():
         with st.expander(f"⭐ {trip['name']}, {trip['country']} - Rated {trip['rating']}/5", expanded=True):
             col1, col2, col3 = st.columns(3)
             
@@ -311,14 +320,87 @@ def show_history_page():
                 st.write(f"**Rating:** {stars}")
                 
                 # Find similar button
-                if st.button(f"Find Similar to {trip['name']}", key=f"find_similar_{trip['destination_id']}"):
-                    similar_destinations = st.session_state.recommendation_engine.get_similar_destinations(
+                if st.button(f"Find Similar to {trip['name']}", key=f"find_similar_{idx}"):
+                    similar_destinations = snapshot.engine.get_similar_destinations(
                         trip['destination_id'], num_similar=3
                     )
                     if not similar_destinations.empty:
                         st.write("**Similar destinations you might like:**")
                         for _, sim_dest in similar_destinations.iterrows():
                             st.write(f"• {sim_dest['name']}, {sim_dest['country']} (Similarity: {sim_dest['similarity_score']:.2f})")
+
+def page_controls(key, total, sort_options):
+    """
+        Sort and page widgets for a long list, returns (sort column, descending, page, page size)
+        
+        The page number resets to 1 when the number of rows changes (eg. other filters)
+    """
+    col1, col2, col3, col4 = st.columns([2, 1, 1, 1])
+    
+    with col1:
+        sort_label = st.selectbox("Sort by", list(sort_options), key=f"{key}_sort")
+    with col2:
+        descending = st.checkbox("Descending", key=f"{key}_descending")
+    with col3:
+        page_size = st.selectbox("Per page", PAGE_SIZES, index=1, key=f"{key}_page_size")
+    
+    num_pages = max((total + page_size - 1) // page_size, 1)
+    with col4:
+        page = st.number_input(f"Page (of {num_pages})", min_value=1, max_value=num_pages, value=1,
+                               key=f"{key}_page_{total}_{page_size}")
+    return sort_options[sort_label], descending, int(page) - 1, page_size
+
+def show_diagnostics_page(snapshot):
+    st.header("🩺 Diagnostics")
+    
+    enabled = st.toggle("Instrumentation enabled", value=instrumentation.enabled,
+                        help="Stage timers add a little overhead to every request while enabled")
+    if enabled != instrumentation.enabled:
+        if enabled:
+            instrumentation.enable()
+        else:
+            instrumentation.disable()
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        if st.button("Reset counters"):
+            instrumentation.reset()
+    with col2:
+        st.download_button("Prometheus metrics", instrumentation.to_prometheus(),
+                           file_name="recommender_metrics.prom", mime="text/plain")
+    with col3:
+        st.download_button("JSON lines", instrumentation.to_json_lines(),
+                           file_name="recommender_metrics.jsonl", mime="application/jsonl")
+    
+    metrics = instrumentation.snapshot()
+    
+    st.subheader("⏱️ Stage Timings")
+    if metrics['timers']:
+        timings = pd.DataFrame.from_dict(metrics['timers'], orient='index')
+        timings.index.name = 'stage'
+        timings[['total_s', 'mean_s', 'max_s']] *= 1000
+        st.dataframe(timings.rename(columns={'total_s': 'total (ms)', 'mean_s': 'mean (ms)', 'max_s': 'max (ms)'}),
+                     use_container_width=True)
+    else:
+        st.info("Nothing recorded yet. Enable instrumentation and use the other pages.")
+    
+    st.subheader("🔢 Counters")
+    for name, value in metrics['counters'].items():
+        st.write(f"• {name}: {value}")
+    
+    st.subheader("🗄️ Data Store")
+    store_stats = data_store.stats()
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Snapshot Version", store_stats['version'])
+    col2.metric("Snapshots Alive", store_stats['snapshots_alive'])
+    col3.metric("Active Readers", store_stats['references'])
+    
+    st.subheader("♻️ Result Cache")
+    cache_stats = snapshot.engine.result_cache.stats()
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Cached Results", cache_stats['entries'])
+    col2.metric("Hit Rate", f"{cache_stats['hit_rate']:.0%}")
+    col3.metric("Evictions", cache_stats['evictions'] + cache_stats['expirations'])
     
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,68 @@
+"""
+    Explore / Travel History chart data: recomputed from the raw rows vs read from the analytics cubes
+
+    For growing catalogs and histories, times what the pages computed on every rerun before
+    (value_counts over the filtered destinations, the history x destinations merge with its
+    groupby / mode / value_counts) against AnalyticsCubes.destination_summary / visit_summary,
+    plus the cost of folding new ratings into the cubes.
+    Run from the repo root:  python -m benchmarks.bench_analytics [--sizes 10000 100000 1000000]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from data_handling import DataHandler
+from utils.analytics import AnalyticsCubes
+from benchmarks.synthetic import make_destinations, make_user_history
+
+def best_ms(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000
+
+def raw_explore(destinations_df, rows):
+    filtered_df = destinations_df.iloc[rows]
+    return filtered_df['type'].value_counts(), filtered_df[['budget_level', 'popularity_score', 'type']]
+
+def raw_history(destinations_df, user_history_df):
+    history_with_details = user_history_df.merge(destinations_df, on='destination_id')
+    return (history_with_details['rating'].mean(), history_with_details['type'].mode(),
+            history_with_details.groupby('type')['rating'].mean().sort_values(ascending=False),
+            history_with_details['climate'].value_counts())
+
+def run(sizes, repeat):
+    print(f"{'destinations':>12} {'visits':>9} {'explore raw (ms)':>17} {'cube':>7} {'history raw (ms)':>17} "
+          f"{'cube':>7} {'build (s)':>10} {'add 1 (us)':>11}")
+    for size in sizes:
+        data_handler = DataHandler()
+        data_handler.set_data(make_destinations(size), make_user_history(size, num_users=size // 5, visits_per_user=5))
+        destinations_df, user_history_df = data_handler.destinations_df, data_handler.user_history_df
+
+        start = time.perf_counter()
+        analytics = AnalyticsCubes().build(data_handler.catalog, user_history_df)
+        build_time = time.perf_counter() - start
+
+        countries, types = analytics.countries[:2], analytics.types[:1]
+        rows = np.flatnonzero(destinations_df['country'].isin(countries).to_numpy()
+                              & destinations_df['type'].isin(types).to_numpy())
+        explore_raw = best_ms(lambda: raw_explore(destinations_df, rows), repeat)
+        explore_cube = best_ms(lambda: analytics.destination_summary(countries, types, []), repeat)
+        history_raw = best_ms(lambda: raw_history(destinations_df, user_history_df), repeat)
+        history_cube = best_ms(analytics.visit_summary, repeat)
+
+        destination_ids = destinations_df['destination_id'].to_numpy()
+        add_time = best_ms(lambda: analytics.add_ratings([1], [destination_ids[0]], [4.0]), repeat * 10)
+        print(f"{size:>12} {len(user_history_df):>9} {explore_raw:>17.2f} {explore_cube:>7.2f} {history_raw:>17.2f} "
+              f"{history_cube:>7.2f} {build_time:>10.2f} {add_time * 1000:>11.0f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000],
+                        help='catalog sizes, the history has about the same number of visits')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    run(args.sizes, args.repeat)
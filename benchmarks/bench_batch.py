@@ -0,0 +1,46 @@
+"""
+    Throughput of RecommendationEngine.get_recommendations_batch in users per second
+
+    Run from the repo root:  python -m benchmarks.bench_batch [--users 10000] [--destinations 20000]
+"""
+import argparse
+import os
+import time
+
+from recommendation_engine import RecommendationEngine
+from benchmarks.synthetic import make_destinations, make_user_history
+
+def run(num_users, num_destinations, k, chunk_size, jobs, loop_users):
+    engine = RecommendationEngine()
+    engine.initialize(
+        make_destinations(num_destinations),
+        make_user_history(num_destinations, num_users=num_users, visits_per_user=8)
+    )
+    print(f"{num_users} users x {num_destinations} destinations, k={k}, chunk_size={chunk_size}")
+    
+    # baseline: one get_recommendations call per user (on a sample, it is slow)
+    sample = list(range(1, min(loop_users, num_users) + 1))
+    start = time.perf_counter()
+    for user_id in sample:
+        engine.get_recommendations(user_id, k)
+    elapsed = time.perf_counter() - start
+    print(f"{'per-user loop':>16}: {len(sample) / elapsed:>10.1f} users/s  ({len(sample)} users)")
+    
+    for n_jobs in jobs:
+        start = time.perf_counter()
+        rows = 0
+        for chunk in engine.iter_recommendations_batch(k=k, chunk_size=chunk_size, n_jobs=n_jobs):
+            rows += len(chunk)
+        elapsed = time.perf_counter() - start
+        print(f"{f'batch n_jobs={n_jobs}':>16}: {num_users / elapsed:>10.1f} users/s  ({rows} rows in {elapsed:.2f}s)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=10_000)
+    parser.add_argument('--destinations', type=int, default=20_000)
+    parser.add_argument('-k', type=int, default=10)
+    parser.add_argument('--chunk-size', type=int, default=256)
+    parser.add_argument('--jobs', type=int, nargs='+', default=[1, os.cpu_count() or 1])
+    parser.add_argument('--loop-users', type=int, default=200, help='users timed with the per-user loop')
+    args = parser.parse_args()
+    run(args.users, args.destinations, args.k, args.chunk_size, args.jobs, args.loop_users)
@@ -0,0 +1,86 @@
+"""
+    Memory per destination: integer-coded Catalog against the destinations DataFrame, then
+    the whole initialized engine by component
+
+    The first table compares Catalog.memory_usage() (its arrays, the sorted-id lookup and
+    each distinct string once; the names are the DataFrame's column and aren't copied) with
+    destinations_df.memory_usage(deep=True). In the second one the destinations DataFrame stays resident next to the Catalog and everything built from
+    it (scoring arrays, profile store, attribute index, analytics cubes), so the total column
+    is what a catalog of that size costs the engine. The DataFrame is measured with
+    memory_usage(deep=True) (its Arrow string buffers are not seen by tracemalloc), the other
+    components with tracemalloc while the engine builds them. The history has one visit per destination (users of 5 visits),
+    its dataframe is left out but the per-user state of the components is counted.
+    Run from the repo root:  python -m benchmarks.bench_catalog_memory [--sizes 10000 100000 1000000]
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+
+from recommendation_engine import RecommendationEngine
+from utils.catalog import Catalog
+from benchmarks.synthetic import make_destinations, make_user_history
+
+COMPONENTS = ['dataframe', 'catalog', 'scoring', 'profiles', 'attributes', 'analytics']
+
+def traced_bytes(build):
+    """
+        Bytes still allocated once build() has returned
+    """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        build()
+        gc.collect()
+        return tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+def catalog_comparison(destinations_df):
+    """
+        (dataframe bytes, catalog bytes, encode seconds) of one destinations dataframe
+    """
+    start = time.perf_counter()
+    catalog = Catalog.from_dataframe(destinations_df)
+    encode_time = time.perf_counter() - start
+    return destinations_df.memory_usage(deep=True).sum(), catalog.memory_usage(), encode_time
+
+def engine_footprint(size, activities):
+    """
+        {component: bytes} of an engine initialized with 'size' synthetic destinations
+    """
+    destinations_df = make_destinations(size, num_activities=activities)
+    user_history_df = make_user_history(size, num_users=max(size // 5, 1), visits_per_user=5)
+    engine = RecommendationEngine(similarity_index_path=None, snapshot_path=None)
+    data_handler = engine.data_handler
+
+    footprint = {'catalog': traced_bytes(lambda: data_handler.set_data(destinations_df, user_history_df))}
+    footprint['dataframe'] = data_handler.destinations_df.memory_usage(deep=True).sum()
+    footprint['scoring'] = traced_bytes(engine._build_scoring_arrays)
+    footprint['profiles'] = traced_bytes(lambda: engine.profile_store.build(user_history_df, data_handler.catalog))
+    footprint['attributes'] = traced_bytes(lambda: engine.attribute_index.build(destinations_df, user_history_df,
+                                                                                 data_handler.catalog))
+    footprint['analytics'] = traced_bytes(lambda: engine.analytics.build(data_handler.catalog, user_history_df))
+    return footprint
+
+def run(sizes, activities):
+    print(f"{'destinations':>12} {'dataframe (B/dest)':>19} {'catalog (B/dest)':>17} {'ratio':>6} {'encode (s)':>11}")
+    for size in sizes:
+        dataframe_bytes, catalog_bytes, encode_time = catalog_comparison(make_destinations(size, num_activities=activities))
+        print(f"{size:>12} {dataframe_bytes / size:>19.1f} {catalog_bytes / size:>17.1f} "
+              f"{dataframe_bytes / catalog_bytes:>5.1f}x {encode_time:>11.3f}")
+
+    print()
+    print(f"{'destinations':>12} " + ' '.join(f'{component:>10}' for component in COMPONENTS)
+          + f" {'total (B/dest)':>15}")
+    for size in sizes:
+        footprint = engine_footprint(size, activities)
+        print(f"{size:>12} " + ' '.join(f'{footprint[component] / size:>10.0f}' for component in COMPONENTS)
+              + f" {sum(footprint.values()) / size:>15.0f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--activities', type=int, default=200, help='activity vocabulary size')
+    args = parser.parse_args()
+    run(args.sizes, args.activities)
@@ -0,0 +1,78 @@
+"""
+    Cold start: time from process start to the first rendered page and to the first recommendation
+
+    Every run is a fresh Python process driving app.py through streamlit's AppTest (Home is
+    rendered, then Get Recommendations is clicked), plus an engine-only process without
+    streamlit. Runs with and without the warm-start engine snapshot.
+    Run from the repo root:  python -m benchmarks.bench_cold_start [--runs 3]
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+APP_CHILD = """
+import json, sys, time
+milestones = {}
+from streamlit.testing.v1 import AppTest
+milestones['streamlit imported'] = time.time()
+at = AppTest.from_file(sys.argv[1], default_timeout=300).run()
+assert not at.exception, at.exception
+milestones['first page'] = time.time()
+at.sidebar.selectbox[0].select("Get Recommendations").run()
+[button for button in at.button if button.label == "Get Recommendations"][0].click().run()
+assert not at.exception, at.exception
+milestones['first recommendation'] = time.time()
+print(json.dumps(milestones))
+"""
+
+ENGINE_CHILD = """
+import json, time
+milestones = {}
+from recommendation_engine import RecommendationEngine
+milestones['engine imported'] = time.time()
+engine = RecommendationEngine()
+engine.initialize()
+milestones['initialized'] = time.time()
+engine.get_recommendations(1, 5)
+milestones['first recommendation'] = time.time()
+print(json.dumps(milestones))
+"""
+
+def run_child(code, root, args=()):
+    """
+        Milestone -> seconds since the process was started
+    """
+    start = time.time()
+    output = subprocess.run([sys.executable, '-c', code, *args], cwd=root, capture_output=True, text=True, check=True)
+    milestones = json.loads(output.stdout.strip().splitlines()[-1])
+    return {name: stamp - start for name, stamp in milestones.items()}
+
+def run(root, runs, snapshot_path):
+    snapshot_path = os.path.join(root, snapshot_path)
+    print(f"{'mode':>14} {'process':>8} {'milestone':>22} {'best (s)':>9} {'median (s)':>11}")
+    for mode in ('no snapshot', 'warm start'):
+        for process, code, args in (('app', APP_CHILD, [os.path.join(root, 'app.py')]), ('engine', ENGINE_CHILD, [])):
+            if mode == 'warm start' and not os.path.exists(snapshot_path):
+                run_child(ENGINE_CHILD, root)       # writes the snapshot
+            timings = []
+            for _ in range(runs):
+                if mode == 'no snapshot':
+                    shutil.rmtree(snapshot_path, ignore_errors=True)
+                timings.append(run_child(code, root, args))
+            for milestone in timings[0]:
+                values = sorted(timing[milestone] for timing in timings)
+                print(f"{mode:>14} {process:>8} {milestone:>22} {values[0]:>9.2f} {values[len(values) // 2]:>11.2f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--root', default=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                        help='repo root (where app.py and data/ are)')
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--snapshot', default=os.path.join('data', '.cache', 'engine'),
+                        help='warm-start snapshot, relative to the root')
+    args = parser.parse_args()
+    run(args.root, args.runs, args.snapshot)
@@ -0,0 +1,74 @@
+"""
+    Collaborative filter: fit time and query latency at 1M ratings
+
+    Fits the matrix factorization with ALS and truncated SVD on a synthetic history, then
+    times scoring one user against the whole catalog (one matrix-vector product) and
+    get_recommendations with the blend against content-only scoring.
+    Run from the repo root:  python -m benchmarks.bench_collaborative [--ratings 1000000] [--factors 32]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from recommendation_engine import RecommendationEngine
+from utils.collaborative import CollaborativeFilter
+from utils.similarity_calculator import top_k_indices
+from benchmarks.synthetic import make_destinations, make_user_history
+
+def latency_ms(func, args_list):
+    """
+        (p50, p99) in ms of func(*args) over args_list
+    """
+    timings = []
+    for args in args_list:
+        start = time.perf_counter()
+        func(*args)
+        timings.append((time.perf_counter() - start) * 1000)
+    return np.percentile(timings, [50, 99])
+
+def run(num_destinations, num_ratings, visits, num_factors, num_queries, engine_users):
+    destinations = make_destinations(num_destinations)
+    history = make_user_history(num_destinations, num_users=num_ratings // visits, visits_per_user=visits)
+    rows = history['destination_id'].to_numpy() - 1       # synthetic ids are 1..N in catalog order
+    print(f"{len(history):,} ratings, {history['user_id'].nunique():,} users, {num_destinations:,} destinations, "
+          f"{num_factors} factors")
+
+    rng = np.random.default_rng(0)
+    query_users = [(user_id,) for user_id in rng.choice(history['user_id'].unique(), size=num_queries)]
+    print(f"{'method':>6} {'fit (s)':>8} {'factors (MB)':>13} {'score p50 (ms)':>15} {'p99':>7} "
+          f"{'top-10 p50 (ms)':>16} {'p99':>7}")
+    for method in ('als', 'svd'):
+        collaborative = CollaborativeFilter(num_factors=num_factors, method=method)
+        start = time.perf_counter()
+        collaborative.fit(history['user_id'].to_numpy(), rows, history['rating'].to_numpy(), num_destinations)
+        fit_time = time.perf_counter() - start
+        size = (collaborative.item_matrix.nbytes + collaborative.user_matrix.nbytes) / 2 ** 20
+
+        score = latency_ms(collaborative.scores, query_users)
+        top = latency_ms(lambda user_id: top_k_indices(collaborative.scores(user_id), 10), query_users)
+        print(f"{method:>6} {fit_time:>8.2f} {size:>13.1f} {score[0]:>15.3f} {score[1]:>7.3f} "
+              f"{top[0]:>16.3f} {top[1]:>7.3f}")
+
+    # end to end: get_recommendations with and without the blend (result cache off)
+    engine_history = history[history['user_id'] <= engine_users]
+    print(f"\nget_recommendations, {len(engine_history):,} ratings in the engine:")
+    print(f"{'scoring':>14} {'p50 (ms)':>9} {'p99 (ms)':>9}")
+    for name, collaborative in (('content', None), ('content + ALS', CollaborativeFilter(num_factors=num_factors))):
+        engine = RecommendationEngine(similarity_index_path=None, cache_size=0, collaborative=collaborative)
+        engine.initialize(destinations.copy(), engine_history.copy())
+        users = [(user_id, 10) for user_id, in query_users if user_id <= engine_users][:200] or [(1, 10)]
+        p50, p99 = latency_ms(engine.get_recommendations, users)
+        print(f"{name:>14} {p50:>9.2f} {p99:>9.2f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--destinations', type=int, default=50_000)
+    parser.add_argument('--ratings', type=int, default=1_000_000, help='approximate number of ratings')
+    parser.add_argument('--visits', type=int, default=10, help='mean ratings per user')
+    parser.add_argument('--factors', type=int, default=32)
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--engine-users', type=int, default=20_000,
+                        help='users loaded into the engine for the end to end timing')
+    args = parser.parse_args()
+    run(args.destinations, args.ratings, args.visits, args.factors, args.queries, args.engine_users)
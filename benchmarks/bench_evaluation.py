@@ -0,0 +1,48 @@
+"""
+    Offline evaluation: ranking quality and speed of the scoring backends side by side
+
+    Splits the user history by visit_date, initializes each backend on the train part and
+    replays get_recommendations for every test user across worker processes, then reports
+    precision / recall / NDCG at k, catalog coverage, latency per user and throughput.
+    Run from the repo root:
+        python -m benchmarks.bench_evaluation --destinations 20000 --users 2000 --jobs 4
+        python -m benchmarks.bench_evaluation --destinations 0      # the bundled data files
+"""
+import argparse
+
+import pandas as pd
+
+from data_handling import DataHandler
+from utils.evaluation import BACKENDS, evaluate
+from benchmarks.synthetic import make_destinations, make_user_history
+
+def run(args):
+    if args.destinations:
+        destinations = make_destinations(args.destinations, seed=args.seed)
+        history = make_user_history(args.destinations, num_users=args.users, visits_per_user=args.visits,
+                                    seed=args.seed)
+    else:
+        data_handler = DataHandler()
+        data_handler.load_data()
+        destinations, history = data_handler.destinations_df, data_handler.user_history_df
+
+    results = evaluate(destinations, history, backends=args.backends, k=args.k, test_fraction=args.test_fraction,
+                       min_rating=args.min_rating, n_jobs=args.jobs)
+    print(f"{len(destinations):,} destinations, {len(history):,} visits, test fraction {args.test_fraction}, "
+          f"k={args.k}, {args.jobs} worker(s)")
+    with pd.option_context('display.width', 200, 'display.float_format', '{:.4f}'.format):
+        print(results.to_string(index=False))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backends', nargs='+', default=['rowwise', 'vectorized', 'batch', 'ivf', 'collaborative'],
+                        choices=BACKENDS)
+    parser.add_argument('-k', type=int, default=10)
+    parser.add_argument('--test-fraction', type=float, default=0.2, help='share of the visits after the cutoff date')
+    parser.add_argument('--min-rating', type=float, default=None, help='test visits rated lower are not relevant')
+    parser.add_argument('--jobs', type=int, default=1, help='worker processes replaying the users')
+    parser.add_argument('--destinations', type=int, default=20_000, help='synthetic catalog size, 0 for the data files')
+    parser.add_argument('--users', type=int, default=2_000)
+    parser.add_argument('--visits', type=int, default=10, help='mean visits per synthetic user')
+    parser.add_argument('--seed', type=int, default=0)
+    run(parser.parse_args())
@@ -0,0 +1,49 @@
+"""
+    Latency of filtered get_recommendations against filter selectivity
+
+    Filters are applied before scoring, so latency should drop with the number of candidates.
+    Run from the repo root:  python -m benchmarks.bench_filters [--destinations 200000]
+"""
+import argparse
+import time
+
+from recommendation_engine import RecommendationEngine
+from benchmarks.synthetic import make_destinations, make_user_history
+
+FILTER_CASES = [
+    ('no filter', None),
+    ('3 climates', {'climate': ['Tropical', 'Temperate', 'Cold']}),
+    ('1 climate', {'climate': ['Tropical']}),
+    ('climate + type', {'climate': ['Tropical'], 'type': ['Beach']}),
+    ('+ budget 1-2', {'climate': ['Tropical'], 'type': ['Beach'], 'budget_range': (1, 2)}),
+    ('+ country', {'climate': ['Tropical'], 'type': ['Beach'], 'budget_range': (1, 2), 'country': ['India']})
+]
+
+def run(num_destinations, k, repeat, modes):
+    engine = RecommendationEngine(cache_size=0)     # time the scoring, not the result cache
+    engine.initialize(make_destinations(num_destinations), make_user_history(num_destinations, visits_per_user=10))
+    print(f"{num_destinations} destinations, k={k}")
+    print(f"{'filter':>16} {'candidates':>11} {'selectivity':>12}" + ''.join(f" {mode + ' (ms)':>16}" for mode in modes))
+    
+    for label, filters in FILTER_CASES:
+        num_candidates = len(engine._filtered_candidates(filters, user_id=1))
+        timings = []
+        for mode in modes:
+            best = float('inf')
+            for _ in range(repeat if mode == 'vectorized' else 1):
+                start = time.perf_counter()
+                result = engine.get_recommendations(1, k, scoring_mode=mode, filters=filters)
+                best = min(best, time.perf_counter() - start)
+            timings.append(best * 1000)
+        assert len(result) == min(k, num_candidates)
+        print(f"{label:>16} {num_candidates:>11} {num_candidates / num_destinations:>11.2%}"
+              + ''.join(f" {timing:>16.2f}" for timing in timings))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--destinations', type=int, default=200_000)
+    parser.add_argument('-k', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--modes', nargs='+', default=['vectorized', 'rowwise'])
+    args = parser.parse_args()
+    run(args.destinations, args.k, args.repeat, args.modes)
@@ -0,0 +1,73 @@
+"""
+    Throughput of streaming history ingestion (rows per second) and its memory use
+
+    The synthetic history is written as several csv / parquet log files, all but the last
+    are ingested first, then the last one is appended incrementally.
+    Run from the repo root:  python -m benchmarks.bench_ingest [--users 1000000] [--format parquet]
+"""
+import argparse
+import os
+import resource
+import tempfile
+import time
+
+from recommendation_engine import RecommendationEngine
+from benchmarks.synthetic import make_destinations, make_user_history
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def write_logs(log_dir, history, num_files, file_format):
+    """
+        Split the history into num_files consecutive log files, returns their paths
+    """
+    paths = []
+    rows_per_file = -(-len(history) // num_files)
+    for part in range(num_files):
+        chunk = history.iloc[part * rows_per_file:(part + 1) * rows_per_file]
+        path = os.path.join(log_dir, f'history-{part:03d}.{file_format}')
+        if file_format == 'parquet':
+            chunk.to_parquet(path, index=False)
+        else:
+            chunk.to_csv(path, index=False)
+        paths.append(path)
+    return paths
+
+def run(num_destinations, num_users, visits, num_files, file_format, chunk_size):
+    destinations = make_destinations(num_destinations)
+    with tempfile.TemporaryDirectory() as log_dir:
+        history = make_user_history(num_destinations, num_users=num_users, visits_per_user=visits)
+        num_rows = len(history)
+        paths = write_logs(log_dir, history, num_files, file_format)
+        del history
+
+        engine = RecommendationEngine(similarity_index_path=None)
+        engine.initialize(destinations, make_user_history(num_destinations, num_users=0))
+        print(f"{num_destinations} destinations, {num_rows} history rows in {num_files} {file_format} files, "
+              f"chunks of {chunk_size}")
+
+        rss_before = peak_rss_mb()
+        stats = engine.ingest_history(paths[:-1], chunk_size=chunk_size)
+        print(f"{'initial':>12} {stats['rows']:>12} rows {stats['seconds']:>8.2f}s {stats['rows_per_second']:>12,.0f} rows/s")
+
+        # a new log file shows up: only that one is read
+        stats = engine.ingest_history(log_dir, chunk_size=chunk_size)
+        print(f"{'append':>12} {stats['rows']:>12} rows {stats['seconds']:>8.2f}s {stats['rows_per_second']:>12,.0f} rows/s"
+              f"  ({stats['skipped']} files skipped)")
+        print(f"peak RSS grew by {peak_rss_mb() - rss_before:.0f} MB, "
+              f"{len(engine.profile_store.user_ids())} user profiles")
+
+        start = time.perf_counter()
+        engine.get_recommendations(1, 10)
+        print(f"get_recommendations after ingestion: {(time.perf_counter() - start) * 1000:.2f} ms")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--destinations', type=int, default=10_000)
+    parser.add_argument('--users', type=int, default=250_000)
+    parser.add_argument('--visits', type=int, default=8, help='average visits per user')
+    parser.add_argument('--files', type=int, default=4, help='log files the history is split into')
+    parser.add_argument('--format', choices=['csv', 'parquet'], default='csv')
+    parser.add_argument('--chunk-size', type=int, default=500_000)
+    args = parser.parse_args()
+    run(args.destinations, args.users, args.visits, args.files, args.format, args.chunk_size)
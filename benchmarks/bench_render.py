@@ -0,0 +1,74 @@
+"""
+    Explore / Travel History pages: render time and payload as the catalog grows
+
+    Every catalog size runs in a fresh process that drives app.py through streamlit's AppTest
+    with a synthetic catalog (and about one visit per two destinations). Each page is opened,
+    then rerun as a widget interaction would; the rerun is timed and the payload is the
+    serialized size of the elements it sent to the browser (what goes over the websocket,
+    without the message framing).
+    Run from the repo root:  python -m benchmarks.bench_render [--sizes 100 1000 5000] [--root <other checkout>]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+CHILD = """
+import json, sys, time
+from streamlit.testing.v1 import AppTest
+import data_store
+from recommendation_engine import RecommendationEngine
+from benchmarks.synthetic import make_destinations, make_user_history
+
+size = int(sys.argv[2])
+destinations = make_destinations(size)
+history = make_user_history(size, num_users=max(size // 10, 1), visits_per_user=5)
+
+class SyntheticEngine(RecommendationEngine):
+    def __init__(self):
+        super().__init__(similarity_index_path=None, snapshot_path=None)
+
+    def initialize(self, destinations_df=None, user_history_df=None):
+        super().initialize(destinations.copy(), history.copy())
+
+data_store._data_store = data_store.DataStore(engine_factory=SyntheticEngine)
+
+def payload(node):
+    proto = getattr(node, 'proto', None)
+    size, count = (proto.ByteSize(), 1) if proto is not None else (0, 0)
+    for child in getattr(node, 'children', {}).values():
+        child_size, child_count = payload(child)
+        size, count = size + child_size, count + child_count
+    return size, count
+
+results = {}
+at = AppTest.from_file(sys.argv[1], default_timeout=900).run()
+for page in ('Explore Destinations', 'Travel History'):
+    at.sidebar.selectbox[0].select(page).run()
+    start = time.perf_counter()
+    at.run()
+    seconds = time.perf_counter() - start
+    assert not at.exception, at.exception
+    size, count = payload(at._tree)
+    results[page] = {'seconds': seconds, 'bytes': size, 'elements': count}
+print(json.dumps(results))
+"""
+
+def run(root, sizes):
+    print(f"{'destinations':>12} {'page':>22} {'rerun (s)':>10} {'payload (KB)':>13} {'elements':>9}")
+    for size in sizes:
+        output = subprocess.run([sys.executable, '-c', CHILD, os.path.join(root, 'app.py'), str(size)], cwd=root,
+                                capture_output=True, text=True, check=True)
+        results = json.loads(output.stdout.strip().splitlines()[-1])
+        for page, result in results.items():
+            print(f"{size:>12} {page:>22} {result['seconds']:>10.2f} {result['bytes'] / 1024:>13.1f} "
+                  f"{result['elements']:>9}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--root', default=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                        help='repo root (where app.py is)')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 5000])
+    args = parser.parse_args()
+    run(args.root, args.sizes)
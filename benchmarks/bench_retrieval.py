@@ -0,0 +1,58 @@
+"""
+    Recall@k and latency of IVF candidate retrieval against exact scoring
+
+    Run from the repo root:  python -m benchmarks.bench_retrieval [--destinations 1000000] [--probes 4 16 64]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from recommendation_engine import RecommendationEngine
+from utils.retrieval import IVFRetrieval
+from benchmarks.synthetic import make_destinations, make_user_history
+
+def timed_recommendations(engine, user_ids, k):
+    """
+        Recommended ids per user and the mean latency in ms
+    """
+    start = time.perf_counter()
+    results = {user_id: engine.get_recommendations(user_id, k)['destination_id'].tolist() for user_id in user_ids}
+    return results, (time.perf_counter() - start) * 1000 / len(user_ids)
+
+def run(num_destinations, num_users, k, probes, num_lists, activities):
+    retrieval = IVFRetrieval(num_lists=num_lists)
+    engine = RecommendationEngine(similarity_index_path=None, cache_size=0, retrieval=retrieval)
+    destinations = make_destinations(num_destinations, num_activities=activities)
+    history = make_user_history(num_destinations, num_users=num_users, visits_per_user=8)
+
+    start = time.perf_counter()
+    engine.initialize(destinations, history)      # builds the retrieval index too
+    print(f"{num_destinations} destinations, {len(retrieval.list_offsets) - 1} lists, "
+          f"index built in {time.perf_counter() - start:.1f}s (with initialize)")
+
+    user_ids = history['user_id'].unique().tolist()
+    engine.retrieval = None
+    exact, exact_ms = timed_recommendations(engine, user_ids, k)
+    engine.retrieval = retrieval
+    print(f"{'num_probe':>9} {'recall@' + str(k):>10} {'latency (ms)':>13} {'exact (ms)':>11} {'speedup':>8}")
+
+    for num_probe in probes:
+        retrieval.num_probe = num_probe
+        approximate, approximate_ms = timed_recommendations(engine, user_ids, k)
+        recall = np.mean([
+            len(set(approximate[user_id]) & set(exact[user_id])) / len(exact[user_id])
+            for user_id in user_ids if exact[user_id]
+        ])
+        print(f"{num_probe:>9} {recall:>10.3f} {approximate_ms:>13.2f} {exact_ms:>11.2f} {exact_ms / approximate_ms:>7.1f}x")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--destinations', type=int, default=200_000)
+    parser.add_argument('--users', type=int, default=200, help='users queried (each with a synthetic history)')
+    parser.add_argument('-k', type=int, default=10)
+    parser.add_argument('--probes', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32, 64])
+    parser.add_argument('--lists', type=int, default=None, help='number of clusters (default sqrt(destinations))')
+    parser.add_argument('--activities', type=int, default=200, help='activity vocabulary size')
+    args = parser.parse_args()
+    run(args.destinations, args.users, args.k, args.probes, args.lists, args.activities)
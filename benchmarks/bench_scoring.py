@@ -0,0 +1,50 @@
+"""
+    Compare rowwise and vectorized scoring in RecommendationEngine.get_recommendations
+
+    Run from the repo root:  python -m benchmarks.bench_scoring [--sizes 1000 100000 1000000]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from recommendation_engine import RecommendationEngine
+from benchmarks.synthetic import make_destinations, make_user_history
+
+def time_call(func, repeat):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def run(sizes, k, repeat, rowwise_limit):
+    print(f"{'destinations':>12} {'rowwise (s)':>12} {'vectorized (s)':>15} {'speedup':>8}  same result")
+    for size in sizes:
+        engine = RecommendationEngine(cache_size=0)     # time the scoring, not the result cache
+        engine.initialize(make_destinations(size), make_user_history(size, visits_per_user=10))
+        
+        vectorized_time, vectorized = time_call(
+            lambda: engine.get_recommendations(1, k, scoring_mode='vectorized'), repeat
+        )
+        if rowwise_limit is not None and size > rowwise_limit:
+            print(f"{size:>12} {'skipped':>12} {vectorized_time:>15.4f} {'-':>8}  -")
+            continue
+        
+        rowwise_time, rowwise = time_call(
+            lambda: engine.get_recommendations(1, k, scoring_mode='rowwise'), 1
+        )
+        same = rowwise.equals(vectorized) and np.array_equal(rowwise.index, vectorized.index)
+        print(f"{size:>12} {rowwise_time:>12.4f} {vectorized_time:>15.4f} {rowwise_time / vectorized_time:>7.1f}x  {same}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 100_000, 1_000_000])
+    parser.add_argument('-k', type=int, default=10, help='number of recommendations')
+    parser.add_argument('--repeat', type=int, default=3, help='vectorized runs per size (best is reported)')
+    parser.add_argument('--rowwise-limit', type=int, default=None,
+                        help='skip the (slow) rowwise run above this many destinations')
+    args = parser.parse_args()
+    run(args.sizes, args.k, args.repeat, args.rowwise_limit)
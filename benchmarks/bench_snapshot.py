@@ -0,0 +1,74 @@
+"""
+    Engine snapshot: write once, then load from many worker processes at the same time
+
+    Compares a fresh build (encode the catalog, fit the encoders) with loading the snapshot
+    memory-mapped and loaded into private memory. Workers report their load time and how
+    much of their resident memory is private (RssAnon) against shared file pages (RssFile).
+    Run from the repo root:  python -m benchmarks.bench_snapshot [--destinations 1000000] [--workers 8]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from data_handling import DataHandler
+from utils.engine_snapshot import save_snapshot
+from benchmarks.synthetic import make_destinations, make_user_history
+
+WORKER = """
+import sys, time, json
+from utils.engine_snapshot import load_snapshot
+
+def rss():
+    with open('/proc/self/status') as f:
+        fields = dict(line.split(':', 1) for line in f)
+    return {name: int(fields[name].split()[0]) / 1024 for name in ('RssAnon', 'RssFile')}
+
+before = rss()
+start = time.perf_counter()
+arrays, params, state = load_snapshot(sys.argv[1], [sys.argv[2]], mmap=sys.argv[3] == 'mmap')
+checksum = sum(float(array.sum()) for array in arrays.values())     # touch every page
+seconds = time.perf_counter() - start
+after = rss()
+print(json.dumps({'seconds': seconds, **{name: after[name] - before[name] for name in before}}))
+"""
+
+def run(num_destinations, num_workers):
+    destinations = make_destinations(num_destinations)
+    history = make_user_history(num_destinations, num_users=max(num_destinations // 10, 1), visits_per_user=5)
+    with tempfile.TemporaryDirectory() as directory:
+        source = os.path.join(directory, 'destinations.csv')
+        destinations.to_csv(source, index=False)
+
+        data_handler = DataHandler()
+        start = time.perf_counter()
+        data_handler.set_data(destinations, history)
+        arrays, params = data_handler.export_fitted()
+        build_time = time.perf_counter() - start
+
+        snapshot = os.path.join(directory, 'engine')
+        start = time.perf_counter()
+        save_snapshot(snapshot, [source], arrays, params, state={})
+        save_time = time.perf_counter() - start
+        size = sum(array.nbytes for array in arrays.values()) / 2 ** 20
+        print(f"{num_destinations} destinations: build (encode + fit) {build_time:.2f}s, "
+              f"snapshot write {save_time:.2f}s, {size:.0f} MB of arrays")
+
+        print(f"{'load':>6} {'workers':>8} {'load (s)':>9} {'private (MB)':>13} {'shared file (MB)':>17}")
+        for mode in ('mmap', 'copy'):
+            workers = [subprocess.Popen([sys.executable, '-c', WORKER, snapshot, source, mode],
+                                        stdout=subprocess.PIPE, text=True) for _ in range(num_workers)]
+            results = [json.loads(worker.communicate()[0]) for worker in workers]
+            print(f"{mode:>6} {num_workers:>8} {max(r['seconds'] for r in results):>9.3f} "
+                  f"{sum(r['RssAnon'] for r in results) / num_workers:>13.1f} "
+                  f"{sum(r['RssFile'] for r in results) / num_workers:>17.1f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--destinations', type=int, default=200_000)
+    parser.add_argument('--workers', type=int, default=4, help='processes loading the snapshot at the same time')
+    args = parser.parse_args()
+    run(args.destinations, args.workers)
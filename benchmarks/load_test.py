@@ -0,0 +1,128 @@
+"""
+    Load test for service.py: p50 / p99 latency and requests per second
+
+    Starts the service in-process on synthetic data (or targets a running one with --url),
+    then keeps --concurrency keep-alive connections busy for --duration seconds with a mix
+    of /recommendations, /similar and /ratings requests.
+    Run from the repo root:  python -m benchmarks.load_test [--destinations 100000] [--concurrency 64]
+"""
+import argparse
+import asyncio
+import json
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import numpy as np
+
+from recommendation_engine import RecommendationEngine
+from service import RecommendationService
+from benchmarks.synthetic import make_destinations, make_user_history
+
+def start_service(args):
+    """
+        Run the service on its own event loop thread, returns (service, host, port)
+    """
+    engine = RecommendationEngine(similarity_index_path=None)
+    engine.initialize(make_destinations(args.destinations),
+                      make_user_history(args.destinations, num_users=args.users, visits_per_user=8))
+    service = RecommendationService(engine, max_workers=args.workers)
+    loop = asyncio.new_event_loop()
+    started = threading.Event()
+    address = []
+
+    async def main():
+        server = await service.start('127.0.0.1', 0)
+        address.append(server.sockets[0].getsockname()[:2])
+        started.set()
+        async with server:
+            await server.serve_forever()
+
+    threading.Thread(target=loop.run_until_complete, args=(main(),), daemon=True).start()
+    started.wait()
+    return (service,) + tuple(address[0])
+
+def make_request(rng, args):
+    """
+        (endpoint, raw request) drawn from the configured mix
+    """
+    user_id = rng.randint(1, args.hot_users) if rng.random() < args.hot_share else rng.randint(1, args.users)
+    draw = rng.random()
+    if draw < args.ratings:
+        body = json.dumps({'user_id': user_id, 'destination_id': rng.randint(1, args.destinations),
+                           'rating': rng.choice([3.0, 4.0, 4.5, 5.0])})
+        return 'ratings', (f"POST /ratings HTTP/1.1\r\nHost: load\r\nContent-Type: application/json\r\n"
+                           f"Content-Length: {len(body)}\r\n\r\n{body}")
+    if draw < args.ratings + args.similar:
+        return 'similar', f"GET /similar?destination_id={rng.randint(1, args.destinations)}&k=5 HTTP/1.1\r\nHost: load\r\n\r\n"
+    return 'recommendations', f"GET /recommendations?user_id={user_id}&k=10 HTTP/1.1\r\nHost: load\r\n\r\n"
+
+async def client(host, port, deadline, rng, args, latencies, errors):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while time.perf_counter() < deadline:
+            endpoint, request = make_request(rng, args)
+            start = time.perf_counter()
+            writer.write(request.encode())
+            await writer.drain()
+
+            status = int((await reader.readline()).split()[1])
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line == b'\r\n':
+                    break
+                name, _, value = line.decode().partition(':')
+                if name.lower() == 'content-length':
+                    length = int(value)
+            await reader.readexactly(length)
+
+            latencies.setdefault(endpoint, []).append(time.perf_counter() - start)
+            if status >= 400:
+                errors[status] = errors.get(status, 0) + 1
+    finally:
+        writer.close()
+
+async def run(host, port, args):
+    latencies, errors = {}, {}
+    deadline = time.perf_counter() + args.duration
+    start = time.perf_counter()
+    await asyncio.gather(*[
+        client(host, port, deadline, random.Random(args.seed + i), args, latencies, errors)
+        for i in range(args.concurrency)
+    ])
+    elapsed = time.perf_counter() - start
+
+    total = sum(len(values) for values in latencies.values())
+    print(f"{total} requests in {elapsed:.1f}s with {args.concurrency} connections: "
+          f"{total / elapsed:,.0f} requests/s, errors: {errors or 'none'}")
+    print(f"{'endpoint':>16} {'count':>8} {'p50 (ms)':>10} {'p99 (ms)':>10}")
+    for endpoint, values in sorted(latencies.items()) + [('all', sum(latencies.values(), []))]:
+        p50, p99 = np.percentile(np.array(values) * 1000, [50, 99])
+        print(f"{endpoint:>16} {len(values):>8} {p50:>10.2f} {p99:>10.2f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='running service, eg. http://127.0.0.1:8000 (default: start one)')
+    parser.add_argument('--destinations', type=int, default=50_000)
+    parser.add_argument('--users', type=int, default=10_000)
+    parser.add_argument('--workers', type=int, default=4, help='scoring threads of the in-process service')
+    parser.add_argument('--concurrency', type=int, default=32, help='open connections')
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds')
+    parser.add_argument('--similar', type=float, default=0.2, help='share of /similar requests')
+    parser.add_argument('--ratings', type=float, default=0.02, help='share of /ratings requests')
+    parser.add_argument('--hot-users', type=int, default=100, help='users asked for most often')
+    parser.add_argument('--hot-share', type=float, default=0.5, help='share of requests for the hot users')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    if args.url:
+        url = urlsplit(args.url)
+        service, host, port = None, url.hostname, url.port or 80
+    else:
+        service, host, port = start_service(args)
+    asyncio.run(run(host, port, args))
+    if service is not None:
+        print(f"service: {service.stats['computed']} computed, {service.stats['coalesced']} coalesced, "
+              f"result cache hit rate {service.engine.result_cache.stats()['hit_rate']:.0%}")
@@ -0,0 +1,172 @@
+"""
+    Benchmark suite for the hot paths, with results saved as JSON for regression checks
+
+    Run from the repo root:
+        python -m benchmarks.suite --scales 1000 10000 100000 --output bench.json
+        python -m benchmarks.suite --scales 1000 10000 --baseline bench.json   # compare with an older run
+"""
+import argparse
+import json
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from data_handling import DataHandler
+from recommendation_engine import RecommendationEngine
+from utils.similarity_calculator import SimilarityCalculator
+from benchmarks.synthetic import make_destinations, make_user_history, write_dataset
+
+def measure(func, repeat):
+    """
+        Best wall time of 'repeat' runs, then one more run under tracemalloc for the peak memory
+    """
+    wall_time = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        wall_time = min(wall_time, time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        func()
+        peak_memory = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return wall_time, peak_memory
+
+def build_cases(scale, args, workdir):
+    """
+        (case name, function) pairs for one catalog size, skipping the ones too big for it
+    """
+    destinations = make_destinations(scale, num_activities=args.activities, num_climates=args.climates,
+                                     num_types=args.types, seed=args.seed)
+    history = make_user_history(scale, num_users=args.users, visits_per_user=args.visits, seed=args.seed)
+    user_ids = history['user_id'].drop_duplicates().sample(
+        min(args.sample_users, history['user_id'].nunique()), random_state=args.seed
+    ).tolist()
+
+    engine = RecommendationEngine(similarity_index_path=None, cache_size=0)     # repeated calls must not hit the cache
+    engine.initialize(destinations.copy(), history.copy())
+    cases = []
+
+    if scale <= args.max_load:
+        data_dir = f'{workdir}/data_{scale}'
+        write_dataset(data_dir, destinations, history)
+        cases.append(('load_data (excel)', lambda: DataHandler(use_cache=False, data_dir=data_dir).load_data()))
+        DataHandler(data_dir=data_dir).load_data()      # warm the feather cache
+        cases.append(('load_data (cached)', lambda: DataHandler(data_dir=data_dir).load_data()))
+
+    cases.append(('create_feature_matrix', lambda: engine.data_handler.create_feature_matrix()))
+    cases.append(('create_feature_matrix (sparse)', lambda: engine.data_handler.create_feature_matrix(sparse=True)))
+    cases.append(('create_user_profile', lambda: [engine.create_user_profile(user_id) for user_id in user_ids]))
+    cases.append(('rebuild_user_profile', lambda: [engine.rebuild_user_profile(user_id) for user_id in user_ids]))
+    cases.append(('get_recommendations', lambda: [engine.get_recommendations(user_id, 10) for user_id in user_ids]))
+
+    if scale <= args.max_rowwise:
+        cases.append(('get_recommendations (rowwise)',
+                      lambda: [engine.get_recommendations(user_id, 10, scoring_mode='rowwise') for user_id in user_ids]))
+
+    destination_ids = destinations['destination_id'].sample(args.sample_users, replace=True, random_state=args.seed).tolist()
+    if scale <= args.max_pairwise:
+        cases.append(('similarity index build', lambda: engine.similarity_index.build(engine.data_handler.destinations_df)))
+        engine.get_similar_destinations(destination_ids[0])     # builds the index once
+        cases.append(('get_similar_destinations', lambda: [engine.get_similar_destinations(d, 3) for d in destination_ids]))
+
+        feature_matrix = engine.data_handler.create_feature_matrix()
+        cases.append(('cosine_similarity_matrix', lambda: SimilarityCalculator().cosine_similarity_matrix(feature_matrix)))
+
+    calculator = SimilarityCalculator()
+    similarity_arrays = calculator.similarity_arrays(engine.data_handler.catalog)
+    rows = engine.data_handler.catalog.rows_of(destination_ids).tolist()
+    cases.append(('weighted similarity one-to-all',
+                  lambda: [calculator.weighted_feature_similarity_to_all(similarity_arrays, row) for row in rows]))
+    
+    sparse_features = engine.data_handler.create_feature_matrix(sparse=True)
+    cases.append(('topk_cosine_similarity', lambda: SimilarityCalculator().topk_cosine_similarity(sparse_features, k=10)))
+    return cases
+
+def run(args):
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for scale in args.scales:
+            for case, func in build_cases(scale, args, workdir):
+                wall_time, peak_memory = measure(func, args.repeat)
+                results.append({
+                    'case': case,
+                    'scale': scale,
+                    'wall_time_s': wall_time,
+                    'peak_memory_mb': peak_memory / 1e6
+                })
+                print(f"{scale:>9} {case:<34} {wall_time:>10.4f}s {peak_memory / 1e6:>10.1f} MB", flush=True)
+
+    return {
+        'meta': {
+            'timestamp': pd.Timestamp.now().isoformat(timespec='seconds'),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'sample_users': args.sample_users,
+            'users': args.users,
+            'seed': args.seed
+        },
+        'results': results
+    }
+
+def compare(current, baseline, threshold, min_time=0.01):
+    """
+        Print the ratio against a baseline run, returns the cases slower than threshold x
+
+        Cases that took less than min_time seconds in both runs are too noisy to be flagged
+    """
+    previous = {(r['case'], r['scale']): r for r in baseline['results']}
+    regressions = []
+    print(f"\n{'scale':>9} {'case':<34} {'time x':>8} {'memory x':>9}")
+    for result in current['results']:
+        before = previous.get((result['case'], result['scale']))
+        if before is None:
+            continue
+        time_ratio = result['wall_time_s'] / max(before['wall_time_s'], 1e-9)
+        memory_ratio = result['peak_memory_mb'] / max(before['peak_memory_mb'], 1e-9)
+        noisy = max(result['wall_time_s'], before['wall_time_s']) < min_time
+        flag = '  <-- regression' if not noisy and (time_ratio > threshold or memory_ratio > threshold) else ''
+        print(f"{result['scale']:>9} {result['case']:<34} {time_ratio:>8.2f} {memory_ratio:>9.2f}{flag}")
+        if flag:
+            regressions.append(result)
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scales', type=int, nargs='+', default=[1_000, 10_000, 100_000], help='catalog sizes')
+    parser.add_argument('--users', type=int, default=1_000, help='users in the synthetic history')
+    parser.add_argument('--visits', type=int, default=8, help='average visits per user')
+    parser.add_argument('--activities', type=int, default=200, help='activity vocabulary size')
+    parser.add_argument('--climates', type=int, default=5)
+    parser.add_argument('--types', type=int, default=4)
+    parser.add_argument('--sample-users', type=int, default=20, help='requests per timed call')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--max-load', type=int, default=50_000, help='largest catalog written to excel')
+    parser.add_argument('--max-rowwise', type=int, default=10_000, help='largest catalog for the rowwise scorer')
+    parser.add_argument('--max-pairwise', type=int, default=10_000, help='largest catalog for NxN work')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--baseline', help='JSON file of an earlier run to compare with')
+    parser.add_argument('--threshold', type=float, default=1.25, help='slowdown ratio reported as regression')
+    parser.add_argument('--min-time', type=float, default=0.01, help='ignore cases faster than this (seconds)')
+    args = parser.parse_args()
+
+    current = run(args)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(current, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if compare(current, baseline, args.threshold, args.min_time):
+            sys.exit(1)
@@ -0,0 +1,91 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+CLIMATES = ['Tropical', 'Temperate', 'Mediterranean', 'Desert', 'Cold']
+TYPES = ['Cultural', 'Beach', 'Urban', 'Adventure']
+COUNTRIES = ['India', 'Nepal', 'Pakistan', 'Sri Lanka', 'Thailand', 'Malaysia', 'Bhutan', 'Indonesia']
+
+# J-shaped rating distribution (most trips are rated 4-5), half stars allowed
+RATINGS = np.arange(1.0, 5.01, 0.5)
+RATING_WEIGHTS = np.array([1, 0.5, 1.5, 1, 3, 4, 9, 10, 8], dtype=float)
+
+def _names(base, count, prefix):
+    """
+        The real names first, generated ones when a bigger cardinality is asked for
+    """
+    return base[:count] + [f'{prefix}{i}' for i in range(len(base), count)]
+
+def _zipf_weights(count, exponent=1.0):
+    weights = 1.0 / np.arange(1, count + 1) ** exponent
+    return weights / weights.sum()
+
+def make_destinations(num_destinations, num_activities=40, num_climates=5, num_types=4, num_countries=8, seed=0):
+    """
+        Synthetic destinations with the same columns as the excel file
+
+        Activities, climates, types and countries follow a Zipf-like distribution (a few are
+        very common, most are rare), popularity is skewed towards the top of the 0-10 range
+    """
+    rng = np.random.default_rng(seed)
+    vocabulary = np.array([f'Activity{i}' for i in range(num_activities)])
+    activity_weights = _zipf_weights(num_activities, 0.8)
+
+    # 2-5 distinct activities per destination (never more than the vocabulary)
+    num_per_destination = np.minimum(rng.integers(2, 6, size=num_destinations), num_activities)
+    activities = [
+        ','.join(rng.choice(vocabulary, size=n, replace=False, p=activity_weights)) for n in num_per_destination
+    ]
+
+    climates = _names(CLIMATES, num_climates, 'Climate')
+    types = _names(TYPES, num_types, 'Type')
+    countries = _names(COUNTRIES, num_countries, 'Country')
+
+    return pd.DataFrame({
+        'destination_id': np.arange(1, num_destinations + 1),
+        'name': [f'Destination {i}' for i in range(1, num_destinations + 1)],
+        'country': rng.choice(countries, size=num_destinations, p=_zipf_weights(num_countries)),
+        'type': rng.choice(types, size=num_destinations, p=_zipf_weights(num_types, 0.5)),
+        'activities': activities,
+        'climate': rng.choice(climates, size=num_destinations, p=_zipf_weights(num_climates, 0.5)),
+        'budget_level': rng.choice(np.arange(1, 6), size=num_destinations, p=[0.15, 0.3, 0.3, 0.15, 0.1]),
+        'popularity_score': np.round(10.0 * rng.beta(5, 2, size=num_destinations), 1)
+    })
+
+def make_user_history(num_destinations, num_users=1, visits_per_user=5, seed=0):
+    """
+        Synthetic user_history rows (user_id, destination_id, rating, visit_date)
+
+        Users have a geometric number of visits around visits_per_user (at least 1, no repeated
+        destination), popular destinations are visited more often, ratings are J-shaped
+    """
+    rng = np.random.default_rng(seed)
+    visits = np.minimum(rng.geometric(1.0 / max(visits_per_user, 1), size=num_users), num_destinations)
+    user_ids = np.repeat(np.arange(1, num_users + 1), visits)
+
+    # popularity-biased destinations, redrawn until no user visits the same place twice
+    destination_weights = _zipf_weights(num_destinations, 0.7)
+    destination_ids = rng.choice(num_destinations, size=len(user_ids), p=destination_weights) + 1
+    for _ in range(10):
+        duplicated = pd.DataFrame({'u': user_ids, 'd': destination_ids}).duplicated().to_numpy()
+        if not duplicated.any():
+            break
+        destination_ids[duplicated] = rng.integers(1, num_destinations + 1, size=duplicated.sum())
+    keep = ~pd.DataFrame({'u': user_ids, 'd': destination_ids}).duplicated().to_numpy()
+
+    visit_dates = pd.Timestamp('2022-01-01') + pd.to_timedelta(rng.integers(0, 730, size=len(user_ids)), unit='D')
+    return pd.DataFrame({
+        'user_id': user_ids[keep],
+        'destination_id': destination_ids[keep],
+        'rating': rng.choice(RATINGS, size=len(user_ids), p=RATING_WEIGHTS / RATING_WEIGHTS.sum())[keep],
+        'visit_date': visit_dates.strftime('%Y-%m-%d')[keep]
+    })
+
+def write_dataset(data_dir, destinations_df, user_history_df):
+    """
+        Write the dataset under the file names DataHandler.load_data reads
+    """
+    os.makedirs(data_dir, exist_ok=True)
+    destinations_df.to_excel(os.path.join(data_dir, 'India_Nearby_Travel_Destinations.xlsx'), index=False)
+    user_history_df.to_excel(os.path.join(data_dir, 'user_history.xlsx'), index=False)
@@ -1,5 +1,6 @@
 import pandas as pd
 import os
+import sys
 
 def convert_csv_to_excel(csv_file_path, excel_file_path=None):
     # Check if file exists
@@ -17,7 +18,24 @@ def convert_csv_to_excel(csv_file_path, excel_file_path=None):
     df.to_excel(excel_file_path, index=False)
     print(f"✅ Converted '{csv_file_path}' to '{excel_file_path}' successfully!")
 
+def convert_to_cache(file_path):
+    # Check if file exists
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"{file_path} does not exist.")
+
+    # Same feather cache DataHandler.load_data reads from (.cache/ next to the file)
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from utils.data_cache import build_cache
+    build_cache(file_path)
+    print(f"✅ Cached '{file_path}' as feather successfully!")
+
 if __name__ == "__main__":
+    # python csv_to_xlx.py cache [files...]  -> build the binary cache instead
+    if len(sys.argv) > 1 and sys.argv[1] == "cache":
+        for file_path in sys.argv[2:] or ["India_Nearby_Travel_Destinations.xlsx", "user_history.xlsx"]:
+            convert_to_cache(file_path)
+        sys.exit()
+    
     input_csv = "destinations.csv"
     convert_csv_to_excel(input_csv)
     
@@ -1,39 +1,212 @@
+import os
 import pandas as pd
 import numpy as np
-from sklearn.preprocessing import MultiLabelBinarizer, StandardScaler
+import scipy.sparse as sp
+from utils.catalog import Catalog
+from utils.data_cache import read_table
+from utils.instrumentation import instrumentation
+
+class SparseFeatureMatrix:
+    """
+        Feature matrix with the one-hot blocks (activities, climate, type) kept as a CSR matrix
+        
+        The scaled numerical columns are a small dense array stored alongside, columns holds
+        the names in the same order as the dense feature matrix
+    """
+    def __init__(self, info, onehot, numeric, columns):
+        self.info = info                # destination_id, name, country
+        self.onehot = onehot            # scipy.sparse CSR, N x one-hot columns
+        self.numeric = numeric          # N x 2 (budget_level, popularity_score), scaled
+        self.columns = columns
+        self.column_index = {col: i for i, col in enumerate(columns)}
+    
+    @property
+    def shape(self):
+        return (self.onehot.shape[0], len(self.columns))
+    
+    def tocsr(self):
+        """
+            All numeric features as one CSR matrix (the numeric block is only 2 columns wide)
+        """
+        return sp.hstack([self.onehot, sp.csr_matrix(self.numeric)], format='csr')
 
 class DataHandler:
-    def __init__(self):
+    def __init__(self, use_cache=True, data_dir='data'):
+        self.use_cache = use_cache          # read the spreadsheets through the feather cache in data/.cache
+        self.data_dir = data_dir
         self.destinations_df = None
-        self.user_history_df = None
-        self.mlb_activities = MultiLabelBinarizer()
-        self.mlb_climate = MultiLabelBinarizer()
-        self.scaler = StandardScaler()
+        self._user_history_df = None
+        self._new_visits = []               # rows of add_visit, appended to user_history_df on its next read
+        self.mlb_activities = None          # fitted by create_feature_matrix (sklearn is imported there)
+        self.mlb_climate = None
+        self.scaler = None
+        self.feature_columns = None         # numeric columns of the feature matrix, in order
+        self.catalog = None                 # integer-coded destinations used for scoring
+        self._fitted = None                 # (arrays, params) of export_fitted, see set_data
         
-    def load_data(self):
-        self.destinations_df = pd.read_excel('data/India_Nearby_Travel_Destinations.xlsx')
-        self.user_history_df = pd.read_excel('data/user_history.xlsx')
-        # self.user_history_df = pd.read_excel('data/empty_user_history.xlsx')
+    @property
+    def user_history_df(self):
+        """
+            Travel history, with the visits recorded by add_visit since the last read appended
+        """
+        if self._new_visits:
+            new_visits = pd.DataFrame(self._new_visits).reindex(columns=self._user_history_df.columns)
+            self._user_history_df = pd.concat([self._user_history_df, new_visits], ignore_index=True)
+            self._new_visits = []
+        return self._user_history_df
+    
+    @user_history_df.setter
+    def user_history_df(self, user_history_df):
+        self._user_history_df = user_history_df
+        self._new_visits = []
+    
+    def add_visit(self, visit):
+        """
+            Record one visit (dict of history columns), O(1): rows are buffered and concatenated
+            once on the next read of user_history_df instead of copying the history per visit.
+            Columns the visit doesn't have are left empty
+        """
+        self._new_visits.append(visit)
+    
+    def source_paths(self):
+        """
+            (destinations, user history) spreadsheets read by load_data
+        """
+        return (
+            os.path.join(self.data_dir, 'India_Nearby_Travel_Destinations.xlsx'),
+            os.path.join(self.data_dir, 'user_history.xlsx')
+            # os.path.join(self.data_dir, 'empty_user_history.xlsx')
+        )
+    
+    @instrumentation.timed('load_data')
+    def load_data(self, fitted=None):
+        destinations_path, user_history_path = self.source_paths()
+        destinations_df = read_table(destinations_path, self.use_cache)
+        user_history_df = read_table(user_history_path, self.use_cache)
         
-        # Process activities and climate into lists
-        self.destinations_df['activities_list'] = self.destinations_df['activities'].str.split(',')
-        self.destinations_df['climate_list'] = self.destinations_df['climate'].apply(lambda x: [x])
+        return self.set_data(destinations_df, user_history_df, fitted)
+    
+    def set_data(self, destinations_df, user_history_df, fitted=None):
+        """
+            Use already loaded dataframes (eg. synthetic data for benchmarks) instead of the excel files
+            
+            fitted: (arrays, params) from export_fitted for these same destinations, the catalog
+            and feature matrix are then taken from it instead of being encoded and fitted again
+        """
+        self.destinations_df = destinations_df
+        self.user_history_df = user_history_df
+        
+        # Activities / climates are kept integer-coded in the catalog, the dataframe keeps only
+        # the original columns (per-row lists are built by the encoders when they need them)
+        if fitted is None:
+            self.catalog = Catalog.from_dataframe(self.destinations_df)
+        else:
+            arrays, params = fitted
+            self.catalog = Catalog.from_arrays(arrays, params['vocabularies'],
+                                               self.destinations_df['name'].array)
+        self.feature_columns = self.feature_column_names(self.catalog)
+        self._fitted = fitted
         
         return self.destinations_df, self.user_history_df
     
-    def create_feature_matrix(self):
+    @staticmethod
+    def feature_column_names(catalog):
+        """
+            Columns create_feature_matrix will produce, read off the catalog without fitting anything
+            
+            Same order as the encoders: sorted activities, climate_ and type_ columns, then the
+            two scaled numerical columns
+        """
+        return (
+            list(catalog.activity_values)
+            + [f'climate_{value}' for value in catalog.climate_values]
+            + [f'type_{value}' for value in catalog.type_values]
+            + ['budget_level', 'popularity_score']
+        )
+    
+    def _activity_lists(self):
+        """
+            Activities of every destination as lists (encoder input, not kept)
+        """
+        return self.destinations_df['activities'].str.split(',')
+    
+    def _climate_lists(self):
+        return [[climate] for climate in self.destinations_df['climate'].tolist()]
+    
+    def _fit_encoders(self, sparse):
+        from sklearn.preprocessing import MultiLabelBinarizer, StandardScaler     # ~1s to import, only needed here
+        
+        self.mlb_activities = MultiLabelBinarizer(sparse_output=sparse)
+        self.mlb_climate = MultiLabelBinarizer(sparse_output=sparse)
+        self.scaler = StandardScaler()
+    
+    def _restore_encoders(self, params, sparse):
+        """
+            Encoders in the state export_fitted saved them in, without fitting
+        """
+        self._fit_encoders(sparse)
+        self.mlb_activities.fit([params['encoder_classes']['activities']])     # vocabulary only, not the data
+        self.mlb_climate.fit([params['encoder_classes']['climate']])
+        scaler = params['scaler']
+        self.scaler.mean_ = np.array(scaler['mean'])
+        self.scaler.var_ = np.array(scaler['var'])
+        self.scaler.scale_ = np.array(scaler['scale'])
+        self.scaler.n_samples_seen_ = scaler['n_samples_seen']
+        self.scaler.n_features_in_ = len(scaler['features'])
+        self.scaler.feature_names_in_ = np.array(scaler['features'], dtype=object)
+    
+    def export_fitted(self):
+        """
+            Catalog, fitted encoders and feature matrix as (numeric arrays, JSON-able params)
+            
+            What the engine snapshot stores so other processes can skip encoding and fitting,
+            see set_data(fitted=...). The feature matrix is kept in its sparse layout: one-hot
+            CSR parts plus the scaled numerical columns.
+        """
+        feature_matrix = self._create_sparse_feature_matrix()
+        arrays, vocabularies = self.catalog.to_arrays()
+        arrays.update(
+            onehot_data=feature_matrix.onehot.data,
+            onehot_indices=feature_matrix.onehot.indices,
+            onehot_indptr=feature_matrix.onehot.indptr,
+            numeric=feature_matrix.numeric
+        )
+        params = {
+            'vocabularies': vocabularies,
+            'encoder_classes': {'activities': self.mlb_activities.classes_.tolist(),
+                                'climate': self.mlb_climate.classes_.tolist()},
+            'scaler': {'features': ['budget_level', 'popularity_score'],
+                       'mean': self.scaler.mean_.tolist(), 'var': self.scaler.var_.tolist(),
+                       'scale': self.scaler.scale_.tolist(), 'n_samples_seen': int(self.scaler.n_samples_seen_)},
+            'feature_columns': feature_matrix.columns
+        }
+        self._fitted = (arrays, params)
+        return arrays, params
+    
+    @instrumentation.timed('create_feature_matrix')
+    def create_feature_matrix(self, sparse=False):
         """
             Create feature matrix for content-based filtering
+            
+            sparse=True returns a SparseFeatureMatrix instead of a dense dataframe
         """
         if self.destinations_df is None:
             self.load_data()
         
+        if self._fitted is not None:
+            return self._fitted_feature_matrix(sparse)
+        
+        if sparse:
+            return self._create_sparse_feature_matrix()
+        
+        self._fit_encoders(sparse=False)
+        
         # One-hot encode activities
-        activities_encoded = self.mlb_activities.fit_transform(self.destinations_df['activities_list'])
+        activities_encoded = self.mlb_activities.fit_transform(self._activity_lists())
         activities_df = pd.DataFrame(activities_encoded, columns=self.mlb_activities.classes_)
         
         # One-hot encode climate
-        climate_encoded = self.mlb_climate.fit_transform(self.destinations_df['climate_list'])
+        climate_encoded = self.mlb_climate.fit_transform(self._climate_lists())
         climate_df = pd.DataFrame(climate_encoded, columns=[f'climate_{col}' for col in self.mlb_climate.classes_])
         
         # One-hot encode destination type
@@ -55,8 +228,80 @@ class DataHandler:
             numerical_df
         ], axis=1)
         
+        self.feature_columns = feature_matrix.columns[3:].tolist()     # everything except id, name, country
+        
         return feature_matrix
     
+    def _create_sparse_feature_matrix(self):
+        """
+            Same features and column order as the dense version, without densifying the one-hot blocks
+        """
+        self._fit_encoders(sparse=True)
+        
+        # One-hot encode activities and climate
+        activities_encoded = self.mlb_activities.fit_transform(self._activity_lists())
+        climate_encoded = self.mlb_climate.fit_transform(self._climate_lists())
+        
+        # One-hot encode destination type (sorted categories, like pd.get_dummies)
+        type_codes, type_values = pd.factorize(self.destinations_df['type'], sort=True)
+        has_type = type_codes >= 0
+        type_encoded = sp.csr_matrix(
+            (np.ones(has_type.sum()), (np.flatnonzero(has_type), type_codes[has_type])),
+            shape=(len(type_codes), len(type_values))
+        )
+        
+        # Normalize numerical features
+        numerical_features = ['budget_level', 'popularity_score']
+        numerical = self.scaler.fit_transform(self.destinations_df[numerical_features])
+        
+        columns = (
+            list(self.mlb_activities.classes_)
+            + [f'climate_{col}' for col in self.mlb_climate.classes_]
+            + [f'type_{col}' for col in type_values]
+            + numerical_features
+        )
+        onehot = sp.hstack([activities_encoded, climate_encoded, type_encoded], format='csr', dtype=np.float64)
+        
+        self.feature_columns = columns
+        
+        return SparseFeatureMatrix(
+            self.destinations_df[['destination_id', 'name', 'country']].reset_index(drop=True),
+            onehot, numerical, columns
+        )
+    
+    def _fitted_feature_matrix(self, sparse):
+        """
+            create_feature_matrix rebuilt from the exported arrays, same values and dtypes as a fresh fit
+        """
+        arrays, params = self._fitted
+        self._restore_encoders(params, sparse)
+        columns = params['feature_columns']
+        self.feature_columns = columns
+        onehot = sp.csr_matrix(
+            (arrays['onehot_data'], arrays['onehot_indices'], arrays['onehot_indptr']),
+            shape=(len(self.destinations_df), len(columns) - 2)
+        )
+        
+        if sparse:
+            return SparseFeatureMatrix(
+                self.destinations_df[['destination_id', 'name', 'country']].reset_index(drop=True),
+                onehot, arrays['numeric'], columns
+            )
+        
+        # same blocks as the dense fit: integer activity / climate indicators, boolean type dummies
+        num_activities = len(params['encoder_classes']['activities'])
+        num_onehot = num_activities + len(params['encoder_classes']['climate'])
+        dense = onehot.toarray()
+        return pd.concat([
+            self.destinations_df[['destination_id', 'name', 'country']],
+            pd.DataFrame(dense[:, :num_activities].astype(np.int64), columns=columns[:num_activities]),
+            pd.DataFrame(dense[:, num_activities:num_onehot].astype(np.int64),
+                         columns=columns[num_activities:num_onehot]),
+            pd.DataFrame(dense[:, num_onehot:].astype(bool), columns=columns[num_onehot:-2]),
+            pd.DataFrame(np.array(arrays['numeric']), columns=columns[-2:])
+        ], axis=1)
+    
+    @instrumentation.timed('get_user_profile')
     def get_user_profile(self, user_id=1):
         """
             Create user profile based on travel history
@@ -77,6 +322,7 @@ class DataHandler:
         
         return visited_destinations, ratings
     
+    @instrumentation.timed('get_unvisited_destinations')
     def get_unvisited_destinations(self, user_id=1):
         """
             Returns destinations user hasn't visited
@@ -0,0 +1,200 @@
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from recommendation_engine import RecommendationEngine
+
+def sort_order(values, descending=False):
+    """
+        Stable argsort of a column, ties keep their original order in both directions
+    """
+    values = np.asarray(values)
+    keys = values if values.dtype.kind in 'iuf' else pd.factorize(values, sort=True)[0]
+    return np.argsort(-keys if descending else keys, kind='stable')
+
+class DataSnapshot:
+    """
+        One version of the data: both dataframes and an initialized engine built on them
+
+        Shared by every session of the process, so treat the data as read-only. What is
+        derived from it on first use (sort orders here; the engine's feature matrix, similarity
+        arrays and similarity index) is built once under a lock and never changed afterwards
+    """
+    def __init__(self, version, engine):
+        self.version = version
+        self.engine = engine
+        self.destinations_df = engine.data_handler.destinations_df
+        self.user_history_df = engine.data_handler.user_history_df
+        self.refcount = 0
+        self._sort_orders = {}          # (table, column, descending) -> sorted positions, see _sorted
+        self._history_rows = None       # catalog row of every history visit, -1 if not in the catalog
+        self._lock = threading.Lock()       # guards the two lazy caches above
+
+    def destination_page(self, rows, sort_by=None, descending=False, page=0, page_size=25):
+        """
+            One page of the destinations at 'rows' (catalog positions, eg. attribute_index.candidates)
+
+            Sorted by the sort_by column (None -> catalog order). The whole catalog is sorted
+            once per column and snapshot, a page keeps the positions in 'rows' and copies only
+            its own rows out of destinations_df. Returns (page dataframe, number of rows)
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        if sort_by is not None:
+            selected = np.zeros(len(self.destinations_df), dtype=bool)
+            selected[rows] = True
+            order = self._sorted('destinations', sort_by, descending)
+            rows = order[selected[order]]
+        start = page * page_size
+        return self.destinations_df.iloc[rows[start:start + page_size]], len(rows)
+
+    def history_page(self, sort_by=None, descending=False, page=0, page_size=25):
+        """
+            One page of user_history_df.merge(destinations_df, on='destination_id')
+
+            Same rows and columns as the merge (visits of destinations in the catalog, history
+            order when sort_by is None) but only the page's visits are joined, indexed by their
+            user_history_df index. sort_by is a history or a destination column.
+            Returns (page dataframe, number of rows)
+        """
+        history_rows = self._catalog_rows_of_history()
+        if sort_by is None:
+            visits = np.flatnonzero(history_rows >= 0)
+        else:
+            table = 'history' if sort_by in self.user_history_df.columns else 'history_destinations'
+            order = self._sorted(table, sort_by, descending)
+            visits = order[history_rows[order] >= 0]
+        start = page * page_size
+        visits = visits[start:start + page_size]
+
+        trips = self.user_history_df.iloc[visits]
+        details = self.destinations_df.iloc[history_rows[visits]].drop(columns='destination_id').set_axis(trips.index)
+        return pd.concat([trips, details], axis=1), self.num_trips()
+
+    def num_trips(self):
+        """
+            Number of visits of destinations in the catalog (the rows history_page pages through)
+        """
+        return int((self._catalog_rows_of_history() >= 0).sum())
+
+    def _catalog_rows_of_history(self):
+        with self._lock:
+            if self._history_rows is None:
+                self._history_rows = self.engine.data_handler.catalog.rows_of(
+                    self.user_history_df['destination_id'].to_numpy()
+                )
+            return self._history_rows
+
+    def _sorted(self, table, column, descending):
+        """
+            Positions of a whole table in the order of one of its columns, computed once per snapshot
+
+            'history_destinations' sorts the history visits by a column of their destination
+        """
+        key = (table, column, descending)
+        order = self._sort_orders.get(key)
+        if order is None:
+            if table == 'destinations':
+                values = self.destinations_df[column].to_numpy()
+            elif table == 'history':
+                values = self.user_history_df[column].to_numpy()
+            else:
+                history_rows = self._catalog_rows_of_history()
+                values = self.destinations_df[column].to_numpy()[np.maximum(history_rows, 0)]
+            order = sort_order(values, descending)
+            with self._lock:        # the first one stored wins, every session sees the same array
+                order = self._sort_orders.setdefault(key, order)
+        return order
+
+class DataStore:
+    """
+        Process-wide holder of the current DataSnapshot
+
+        Pages acquire the snapshot for the length of a render and release it afterwards.
+        refresh() swaps in a new snapshot; the old one is dropped as soon as the last
+        render using it releases it, so memory does not grow with the number of sessions
+    """
+    def __init__(self, engine_factory=RecommendationEngine):
+        self.engine_factory = engine_factory
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._current = None
+        self._retired = []          # replaced snapshots that are still in use
+        self._version = 0
+
+    def acquire(self):
+        """
+            Current snapshot with its reference count incremented (built on first use)
+        """
+        if self._current is None:
+            self.refresh(only_if_empty=True)
+
+        with self._lock:
+            snapshot = self._current
+            snapshot.refcount += 1
+            return snapshot
+
+    def release(self, snapshot):
+        with self._lock:
+            snapshot.refcount -= 1
+            if snapshot is not self._current and snapshot.refcount <= 0 and snapshot in self._retired:
+                self._retired.remove(snapshot)
+
+    @contextmanager
+    def snapshot(self):
+        """
+            with store.snapshot() as snapshot: ...
+        """
+        snapshot = self.acquire()
+        try:
+            yield snapshot
+        finally:
+            self.release(snapshot)
+
+    def refresh(self, only_if_empty=False):
+        """
+            Reload the data and build a new snapshot (eg. after the source files changed)
+
+            The new engine is built before the swap, readers keep using the old one meanwhile
+        """
+        with self._refresh_lock:
+            if only_if_empty and self._current is not None:
+                return self._current
+
+            engine = self.engine_factory()
+            engine.initialize()
+
+            with self._lock:
+                self._version += 1
+                previous = self._current
+                self._current = DataSnapshot(self._version, engine)
+                if previous is not None and previous.refcount > 0:
+                    self._retired.append(previous)
+                return self._current
+
+    def stats(self):
+        """
+            Version of the current snapshot and how many snapshots / references are alive
+        """
+        with self._lock:
+            alive = ([self._current] if self._current is not None else []) + self._retired
+            return {
+                'version': self._version,
+                'snapshots_alive': len(alive),
+                'references': sum(snapshot.refcount for snapshot in alive)
+            }
+
+_data_store = None
+_data_store_lock = threading.Lock()
+
+def get_data_store():
+    """
+        The DataStore of this process (streamlit keeps imported modules across reruns and sessions)
+    """
+    global _data_store
+    if _data_store is None:
+        with _data_store_lock:
+            if _data_store is None:
+                _data_store = DataStore()
+    return _data_store
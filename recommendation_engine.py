@@ -1,25 +1,403 @@
+import copy
+import os
+import threading
 import pandas as pd
 import numpy as np
 from data_handling import DataHandler
-from utils.similarity_calculator import SimilarityCalculator
+from utils import batch_scoring
+from utils.similarity_calculator import SimilarityCalculator, top_k_indices
+from utils.similarity_index import SimilarityIndex
+from utils.profile_store import UserProfileStore
+from utils.attribute_index import AttributeIndex
+from utils.analytics import AnalyticsCubes
+from utils.catalog import Catalog
+from utils.history_stream import HistoryIngestor
+from utils.instrumentation import instrumentation
+from utils.result_cache import ResultCache
+from utils.engine_snapshot import SnapshotError, load_snapshot, save_snapshot
+from utils.scoring_plan import DEFAULT_WEIGHTS, ScoringPlan
+
+RECOMMENDATION_COLUMNS = ['destination_id', 'name', 'country', 'type', 'activities',
+                          'climate', 'budget_level', 'popularity_score']
 
 class RecommendationEngine:
-    def __init__(self):
+    scoring_weights = DEFAULT_WEIGHTS      # compiled into scoring_plan, see set_scoring_weights
+    
+    # content score vs collaborative score, used when the engine has a collaborative filter
+    blend_weights = {
+        'content': 0.7,
+        'collaborative': 0.3
+    }
+    
+    def __init__(self, scoring_mode='vectorized', similarity_index_path='data/similarity_index.npz',
+                 num_index_neighbors=10, sparse_features=False, cache_size=1024, cache_ttl=300.0, retrieval=None,
+                 snapshot_path='data/.cache/engine', collaborative=None, blend_weights=None, scoring_weights=None):
         self.data_handler = DataHandler()
-        self.similarity_calculator = SimilarityCalculator()
-        self.feature_matrix = None
+        self.scoring_plan = ScoringPlan(self.scoring_weights if scoring_weights is None else scoring_weights)
+        self.scoring_weights = self.scoring_plan.weights
+        self.similarity_calculator = SimilarityCalculator(self.scoring_plan)
+        self.initialized = False
+        self._feature_matrix = None         # see the feature_matrix property
+        self.sparse_features = sparse_features      # keep the feature matrix as a SparseFeatureMatrix
+        self.scoring_mode = scoring_mode        # 'vectorized' (numpy) or 'rowwise' (one destination at a time)
+        self._column_index = None
+        self._scoring_arrays = None
+        self._similarity_arrays = None      # for the get_similar_destinations scan, built on first use
+        self._lazy_state_lock = threading.Lock()        # feature matrix / similarity arrays, built once when shared
+        self.retrieval = retrieval      # eg. IVFRetrieval: only its candidates are scored (None -> every destination)
+        self._plan_retrievals = {}      # plan key -> retrieval backend built with that plan's weights
+        self.collaborative = collaborative      # eg. CollaborativeFilter, blended into the scores (None -> content only)
+        if blend_weights is not None:
+            self.blend_weights = dict(blend_weights)
+        
+        # top-K neighbours for get_similar_destinations, stored next to the data (None -> memory only)
+        self.similarity_index_path = similarity_index_path
+        self.num_index_neighbors = num_index_neighbors
+        self._similarity_indexes = {}       # plan key -> SimilarityIndex, see similarity_index
+        self._similarity_index_lock = threading.Lock()      # one build / save at a time (shared engine)
+        self._persist_similarity_index = False
+        self._index_plan_key = self.scoring_plan.key        # only the configured weights' index is stored in the file
+        self.profile_store = UserProfileStore()     # running profiles, updated by add_rating
+        self.attribute_index = AttributeIndex()     # rows per climate / type / ... and visited rows per user
+        self.analytics = AnalyticsCubes()       # pre-aggregated counts for the charts, updated by add_rating
+        self.history_ingestor = HistoryIngestor(self.profile_store, self.attribute_index,     # streamed history logs
+                                                analytics=self.analytics)
+        
+        # results of get_recommendations / get_similar_destinations, keyed on the data versions they used
+        self.result_cache = ResultCache(cache_size, cache_ttl)
+        self._catalog_version = 0
+        self._user_versions = {}
+        
+        # prebuilt state of the engine for the spreadsheets in data/, see utils/engine_snapshot.py
+        # (None -> always build)
+        self.snapshot_path = snapshot_path
         
-    def initialize(self):
+    @property
+    def feature_matrix(self):
+        """
+            Feature matrix of the current catalog, built on first access
+            
+            Scoring works off the catalog arrays, so initialize doesn't fit the encoders. Built
+            under a lock, the engine is shared by concurrent sessions / request threads
+        """
+        feature_matrix = self._feature_matrix
+        if feature_matrix is None and self.initialized:
+            with self._lazy_state_lock:
+                if self._feature_matrix is None:
+                    self._feature_matrix = self.data_handler.create_feature_matrix(sparse=self.sparse_features)
+                feature_matrix = self._feature_matrix
+        return feature_matrix
+    
+    def initialize(self, destinations_df=None, user_history_df=None):
         """
             Initialize the recommendation engine with data
+            
+            Pass both dataframes to skip reading the excel files. Otherwise the data, profiles
+            and indexes come from the engine snapshot when it matches the spreadsheets, and the
+            snapshot is rewritten after a full build.
+        """
+        from_files = destinations_df is None or user_history_df is None
+        from_snapshot = False
+        if not from_files:
+            self.data_handler.set_data(destinations_df, user_history_df)
+            self._persist_similarity_index = False      # don't overwrite the index of the real data
+        else:
+            self._persist_similarity_index = self.similarity_index_path is not None
+            from_snapshot = self._load_snapshot()
+            if not from_snapshot:
+                self.data_handler.load_data()
+        self._feature_matrix = None
+        self._build_scoring_arrays()
+        if not from_snapshot:
+            self.profile_store.build(self.data_handler.user_history_df, self.data_handler.catalog)
+            self.attribute_index.build(self.data_handler.destinations_df, self.data_handler.user_history_df,
+                                       self.data_handler.catalog)
+            self.analytics.build(self.data_handler.catalog, self.data_handler.user_history_df)
+            if from_files:
+                self._save_snapshot()
+        self._fit_collaborative()
+        self.history_ingestor.reset()
+        self.initialized = True
+        self._similarity_indexes = {}       # loaded / refreshed on the first get_similar_destinations
+        self._invalidate_catalog()
+    
+    def update_destinations(self, destinations_df):
+        """
+            Add new destinations or replace existing ones (matched on destination_id)
+            
+            The similarity index is updated incrementally instead of being rebuilt
+        """
+        if not self.initialized:
+            self.initialize()
+        
+        current = self.data_handler.destinations_df
+        incoming = destinations_df[current.columns]
+        is_new = ~incoming['destination_id'].isin(current['destination_id'])
+        
+        # edited rows keep their position, new ones go to the end
+        edited = incoming[~is_new].set_index('destination_id')
+        updated = current.set_index('destination_id')
+        updated.loc[edited.index, edited.columns] = edited
+        updated = pd.concat([updated.reset_index()[current.columns], incoming[is_new]], ignore_index=True)
+        
+        self.data_handler.set_data(updated, self.data_handler.user_history_df)
+        self._feature_matrix = None
+        self._build_scoring_arrays()
+        self.profile_store.build(self.data_handler.user_history_df, self.data_handler.catalog)
+        self.attribute_index.build(self.data_handler.destinations_df, self.data_handler.user_history_df,
+                                   self.data_handler.catalog)
+        self.analytics.build(self.data_handler.catalog, self.data_handler.user_history_df)
+        self._fit_collaborative()
+        self.history_ingestor.replay()      # streamed history isn't in user_history_df, read it again
+        with self._similarity_index_lock:
+            for plan_key, index in self._similarity_indexes.items():
+                self._refresh_similarity_index(index, plan_key)
+        self._invalidate_catalog()
+    
+    def add_rating(self, user_id, destination_id, rating, visit_date=None):
+        """
+            Record a new rating: the user's profile is updated in place, no history replay
+            
+            The visit is buffered by the data handler, so the cost doesn't grow with the history
+        """
+        if not self.initialized:
+            self.initialize()
+        
+        self.profile_store.add_rating(user_id, destination_id, rating)
+        self.attribute_index.mark_visited(user_id, destination_id)
+        self.analytics.add_ratings([user_id], [destination_id], [rating])
+        if self.collaborative is not None:
+            row = self.data_handler.catalog.row_of(destination_id)
+            if row is not None:
+                self.collaborative.add_rating(user_id, row, rating)
+        
+        self.data_handler.add_visit({
+            'user_id': user_id,
+            'destination_id': destination_id,
+            'rating': rating,
+            'visit_date': visit_date if visit_date is not None else pd.Timestamp.today().strftime('%Y-%m-%d')
+        })
+        self._invalidate_user(user_id)
+    
+    @instrumentation.timed('ingest_history')
+    def ingest_history(self, paths, chunk_size=500_000):
+        """
+            Stream csv / parquet history logs (files or directories) into the user profiles
+            
+            Rows are folded into the profile store and visited sets chunk by chunk and are not
+            added to user_history_df. Files ingested before are skipped, so new log files can
+            be picked up by calling this again on the same directory.
+            
+            Returns {'files', 'skipped', 'rows', 'seconds', 'rows_per_second'}
+        """
+        if not self.initialized:
+            self.initialize()
+        
+        self.history_ingestor.chunk_size = chunk_size
+        stats = self.history_ingestor.ingest(paths, on_chunk=self._invalidate_users)
+        instrumentation.count('history_rows_ingested', stats['rows'])
+        return stats
+    
+    def set_scoring_weights(self, weights):
+        """
+            Switch to other scoring weights (eg. for an A/B test) without initializing again
+            
+            weights is a config like scoring_weights. The new plan is bound to the current
+            catalog, with a retrieval backend built for its weights, before it replaces the
+            old one in a single assignment (requests read the plan once). Retrieval backends,
+            similarity indexes and cached results are kept per weights, so switching back
+            reuses them instead of rebuilding.
+        """
+        plan = ScoringPlan(weights)
+        if self.initialized:
+            plan.bind(self._scoring_arrays, self._column_index)
+            if self.retrieval is not None and plan.key not in self._plan_retrievals:
+                self._plan_retrievals[plan.key] = copy.copy(self.retrieval).build(
+                    self._scoring_arrays, self._column_index, plan.normalized
+                )
+        self.scoring_plan = plan
+        self.scoring_weights = plan.weights
+        self.similarity_calculator.plan = plan
+        return plan
+    
+    def _retrieval_for(self, plan):
+        """
+            The retrieval backend built for the plan's weights (None without retrieval)
+        """
+        if self.retrieval is None:
+            return None
+        return self._plan_retrievals.get(plan.key, self.retrieval)
+    
+    @instrumentation.timed('fit_collaborative')
+    def _fit_collaborative(self):
+        """
+            Fit the collaborative filter on the ratings of user_history_df that are in the catalog
+            
+            History streamed with ingest_history isn't in the fit
         """
-        self.data_handler.load_data()
-        self.feature_matrix = self.data_handler.create_feature_matrix()     # modified input dataframe
+        if self.collaborative is None:
+            return
+        history = self.data_handler.user_history_df
+        catalog = self.data_handler.catalog
+        rows = catalog.rows_of(history['destination_id'].to_numpy())
+        in_catalog = rows >= 0
+        self.collaborative.fit(history['user_id'].to_numpy()[in_catalog], rows[in_catalog],
+                               history['rating'].to_numpy()[in_catalog], len(catalog))
+    
+    @instrumentation.timed('load_snapshot')
+    def _load_snapshot(self):
+        """
+            Load the data with the catalog, fitted encoders, profile store, attribute index and
+            analytics cubes of the snapshot (arrays memory-mapped, shared between processes)
+            
+            Returns False (nothing restored) when there is no snapshot, or it was written by
+            another format version or for other source data
+        """
+        if self.snapshot_path is None:
+            return False
+        try:
+            arrays, params, state = load_snapshot(self.snapshot_path, self.data_handler.source_paths())
+        except SnapshotError:
+            return False
         
+        self.data_handler.load_data(fitted=(arrays, params))
+        self.profile_store = state['profile_store']
+        self.attribute_index = state['attribute_index']
+        self.analytics = state['analytics']
+        for structure in (self.profile_store, self.attribute_index, self.analytics):
+            structure.set_catalog(self.data_handler.catalog)       # their per-destination parts come from the catalog
+        self.history_ingestor = HistoryIngestor(self.profile_store, self.attribute_index,
+                                                self.history_ingestor.chunk_size, self.analytics)
+        return True
+    
+    def _save_snapshot(self):
+        if self.snapshot_path is None:
+            return
+        arrays, params = self.data_handler.export_fitted()
+        state = {'profile_store': self.profile_store, 'attribute_index': self.attribute_index,
+                 'analytics': self.analytics}
+        try:
+            save_snapshot(self.snapshot_path, self.data_handler.source_paths(), arrays, params, state)
+        except OSError:         # eg. read-only data directory, just start cold next time
+            pass
+    
+    def _invalidate_catalog(self):
+        """
+            Every cached result depends on the catalog
+        """
+        self._catalog_version += 1
+        self.result_cache.clear()
+    
+    def _invalidate_user(self, user_id):
+        """
+            Only this user's recommendations depend on their history
+        """
+        self._user_versions[user_id] = self._user_versions.get(user_id, 0) + 1
+        self.result_cache.invalidate(lambda key: key[0] == 'recommendations' and key[1] == user_id)
+    
+    def _invalidate_users(self, user_ids):
+        """
+            _invalidate_user for many users with a single pass over the cache
+        """
+        for user_id in user_ids:
+            self._user_versions[user_id] = self._user_versions.get(user_id, 0) + 1
+        user_ids = set(user_ids)
+        self.result_cache.invalidate(lambda key: key[0] == 'recommendations' and key[1] in user_ids)
+    
+    @property
+    def similarity_index(self):
+        """
+            Similarity index of the current scoring weights, None until it is first used
+        """
+        return self._similarity_indexes.get(self.scoring_plan.key)
+    
+    def _get_similarity_index(self, plan=None):
+        """
+            Load the saved index (or build one) for the plan's weights and make sure it matches the current catalog
+            
+            Built under a lock and published once complete, so concurrent callers wait for
+            one build instead of racing on the index and its file. An unreadable file is rebuilt.
+            Only the index of the configured weights is read from / written to the file, the
+            ones of other weights (set_scoring_weights) stay in memory
+        """
+        plan = plan or self.scoring_plan
+        index = self._similarity_indexes.get(plan.key)
+        if index is None:
+            with self._similarity_index_lock:
+                index = self._similarity_indexes.get(plan.key)
+                if index is None:
+                    if self._persist_similarity_index and plan.key == self._index_plan_key:
+                        index = SimilarityIndex.load(self.similarity_index_path, self.num_index_neighbors, plan.weights)
+                    if index is None:
+                        index = SimilarityIndex(self.num_index_neighbors, plan.weights)
+                    self._refresh_similarity_index(index, plan.key)
+                    self._similarity_indexes[plan.key] = index
+        return index
+    
+    def _refresh_similarity_index(self, index, plan_key):
+        changed = index.update(self.data_handler.destinations_df)
+        if changed and self._persist_similarity_index and plan_key == self._index_plan_key:
+            index.save(self.similarity_index_path)
+    
+    def _build_scoring_arrays(self):
+        """
+            Encode every destination as numpy arrays aligned with the feature matrix columns
+            
+            Derived from the integer-coded catalog, used by the vectorized scoring mode,
+            built once per initialize
+        """
+        catalog = self.data_handler.catalog
+        self._similarity_arrays = None
+        self._column_index = {col: i for i, col in enumerate(self.data_handler.feature_columns)}
+        missing = len(self._column_index)       # extra slot in the profile vector that always stays 0
+        
+        # Catalog codes -> profile vector columns. Activities are padded to the longest list,
+        # keeping the original order of each list so the per-destination sums are added up
+        # exactly like the rowwise loop does
+        activity_columns = Catalog.code_map(catalog.activity_values, self._column_index, missing)
+        climate_columns = Catalog.code_map([f'climate_{value}' for value in catalog.climate_values],
+                                           self._column_index, missing)
+        type_columns = Catalog.code_map([f'type_{value}' for value in catalog.type_values], self._column_index, missing)
+        
+        self._scoring_arrays = {
+            'activity_codes': activity_columns[catalog.padded_activities(fill=-1)],
+            'activity_counts': catalog.activity_counts,
+            'climate_codes': climate_columns[catalog.climate_codes],
+            'type_codes': type_columns[catalog.type_codes],
+            'budget_level': catalog.budget_level.astype(np.float64),
+            'popularity_score': catalog.popularity_score
+        }
+        
+        # A new plan for the new arrays, published in one assignment like set_scoring_weights:
+        # requests in flight keep the old plan and the arrays it was bound to
+        plan = ScoringPlan(self.scoring_plan.weights).bind(self._scoring_arrays, self._column_index)
+        retrievals = {}         # built for the old catalog, other weights are rebuilt when switched to
+        if self.retrieval is not None:
+            self.retrieval = retrievals[plan.key] = copy.copy(self.retrieval).build(
+                self._scoring_arrays, self._column_index, plan.normalized
+            )
+        self._plan_retrievals = retrievals
+        self.scoring_plan = plan
+        self.similarity_calculator.plan = plan
+        
+    @instrumentation.timed('create_user_profile')
     def create_user_profile(self, user_id=1):
         """
             Create user profile based on travel history
             
+            Read from the profile store, which is kept up to date by add_rating
+            
+            Returns profile_features
+        """
+        if not self.initialized:
+            self.initialize()
+        
+        return self.profile_store.get_profile(user_id)
+    
+    def rebuild_user_profile(self, user_id=1):
+        """
+            Create user profile from scratch by replaying the user's whole travel history
+            
             Returns profile_features
         """
         visited_destinations, ratings = self.data_handler.get_user_profile(user_id)
@@ -33,7 +411,8 @@ class RecommendationEngine:
         # Calculate weighted averages for numerical features
         total_weight = ratings.sum()        # for normalization
         
-        for _, dest in visited_destinations.iterrows():         # index, row
+        catalog = self.data_handler.catalog
+        for dest in catalog.records(catalog.rows_of(visited_destinations['destination_id'].to_numpy())):
             weight = ratings.get(dest['destination_id'], 1.0)
             
             # Activities preference
@@ -68,62 +447,238 @@ class RecommendationEngine:
         
         return profile_features
     
-    def get_recommendations(self, user_id=1, num_recommendations=5):
+    @instrumentation.timed('get_recommendations')
+    def get_recommendations(self, user_id=1, num_recommendations=5, scoring_mode=None, filters=None):
         """
             Get destination recommendations for a user
+            
+            scoring_mode overrides the engine default for this call ('vectorized' or 'rowwise')
+            filters restricts the candidates before scoring, eg.
+                {'budget_range': (1, 2), 'climate': ['Tropical'], 'type': [...], 'country': [...]}
         """
-        if self.feature_matrix is None:
+        if not self.initialized:
             self.initialize()
         
+        scoring_mode = scoring_mode or self.scoring_mode
+        plan = self.scoring_plan        # read once: a concurrent set_scoring_weights can't mix two plans
+        retrieval = self._retrieval_for(plan)
+        cache_key = ('recommendations', user_id, num_recommendations, scoring_mode, self._filters_key(filters),
+                     retrieval.params() if retrieval is not None else None, self._blend_key(),
+                     plan.key, self._catalog_version, self._user_versions.get(user_id, 0))
+        hit, recommendations = self.result_cache.get(cache_key)
+        if hit:
+            instrumentation.count('result_cache_hits')
+            return recommendations.copy()
+        
+        recommendations = self._compute_recommendations(user_id, num_recommendations, scoring_mode, filters,
+                                                        plan, retrieval)
+        self.result_cache.put(cache_key, recommendations.copy())      # callers may modify what they get
+        return recommendations
+    
+    def _compute_recommendations(self, user_id, num_recommendations, scoring_mode, filters, plan, retrieval):
+        """
+            get_recommendations without the result cache, scored with the given plan / retrieval backend
+        """
         # Get user profile
         user_profile = self.create_user_profile(user_id)
         if user_profile is None:
-            return self._get_popular_destinations(num_recommendations)
+            return self._get_popular_destinations(num_recommendations, filters)
         
-        # Get unvisited destinations
-        unvisited_destinations = self.data_handler.get_unvisited_destinations(user_id)
+        # Get unvisited destinations matching the filters (row positions from the attribute index),
+        # with a retrieval backend only among the rows it returns for this profile
+        if retrieval is not None:
+            candidates = self._retrieve_candidates(user_profile, filters, user_id, num_recommendations, retrieval)
+        else:
+            candidates = self._filtered_candidates(filters, user_id)
         
-        if unvisited_destinations.empty:
+        if len(candidates) == 0:
             return pd.DataFrame()
         
-        # Calculate similarity scores for unvisited destinations
+        instrumentation.count('destinations_scored', len(candidates))
+        
+        if scoring_mode == 'vectorized':
+            return self._get_recommendations_vectorized(user_profile, candidates, num_recommendations, user_id, plan)
+        if scoring_mode != 'rowwise':
+            raise ValueError(f"Unknown scoring mode: {scoring_mode}")
+        
+        # Calculate similarity scores for unvisited destinations (record views of the catalog rows)
         recommendations = []
         
-        for _, dest in unvisited_destinations.iterrows():
-            similarity_score = self._calculate_destination_similarity(user_profile, dest)
-            
-            recommendations.append({
-                'destination_id': dest['destination_id'],
-                'name': dest['name'],
-                'country': dest['country'],
-                'type': dest['type'],
-                'activities': dest['activities'],
-                'climate': dest['climate'],
-                'budget_level': dest['budget_level'],
-                'popularity_score': dest['popularity_score'],
-                'similarity_score': similarity_score
-            })
+        with instrumentation.timer('score_destinations_rowwise'):      # the whole loop, not one timer per row
+            for dest in self.data_handler.catalog.records(candidates):
+                similarity_score = self._calculate_destination_similarity(user_profile, dest, plan)
+                
+                recommendations.append({
+                    'destination_id': dest['destination_id'],
+                    'name': dest['name'],
+                    'country': dest['country'],
+                    'type': dest['type'],
+                    'activities': dest['activities'],
+                    'climate': dest['climate'],
+                    'budget_level': dest['budget_level'],
+                    'popularity_score': dest['popularity_score'],
+                    'similarity_score': similarity_score
+                })
         
         # Sort by similarity score and get top recommendations
         recommendations_df = pd.DataFrame(recommendations)
-        recommendations_df = recommendations_df.sort_values('similarity_score', ascending=False)
+        recommendations_df['similarity_score'] = self._blend_collaborative(
+            user_id, candidates, recommendations_df['similarity_score'].to_numpy()
+        )
+        with instrumentation.timer('sort'):
+            recommendations_df = recommendations_df.sort_values('similarity_score', ascending=False, kind='stable')
         
         return recommendations_df.head(num_recommendations)
     
-    def _calculate_destination_similarity(self, user_profile, destination):     # for internal use only bcz it starts with '_'
+    def get_recommendations_batch(self, user_ids=None, k=5, chunk_size=256, n_jobs=1,
+                                  output_dir=None, output_format='parquet'):
+        """
+            Get recommendations for many users at once (eg. nightly for everyone in user_history)
+            
+            Profiles are built for all users in one sparse matrix and scored in chunks of
+            chunk_size users, optionally spread over n_jobs processes. Scores match
+            get_recommendations up to floating point rounding.
+            
+            Returns one dataframe (user_id, rank, destination columns, similarity_score), or
+            with output_dir the paths of the written part-NNNNN.parquet / .csv partitions
+        """
+        chunks = self.iter_recommendations_batch(user_ids, k, chunk_size, n_jobs)
+        if output_dir is None:
+            chunks = list(chunks)
+            if not chunks:      # no users
+                return pd.DataFrame(columns=['user_id', 'rank'] + RECOMMENDATION_COLUMNS + ['similarity_score'])
+            return pd.concat(chunks, ignore_index=True)
+        
+        if output_format not in ('parquet', 'csv'):
+            raise ValueError(f"Unknown output format: {output_format}")
+        os.makedirs(output_dir, exist_ok=True)
+        
+        paths = []
+        for part, chunk in enumerate(chunks):
+            path = os.path.join(output_dir, f'part-{part:05d}.{output_format}')
+            if output_format == 'parquet':
+                chunk.to_parquet(path, index=False)
+            else:
+                chunk.to_csv(path, index=False)
+            paths.append(path)
+        return paths
+    
+    def iter_recommendations_batch(self, user_ids=None, k=5, chunk_size=256, n_jobs=1):
+        """
+            Generator behind get_recommendations_batch, yields one dataframe per chunk of users
+        """
+        if not self.initialized:
+            self.initialize()
+        
+        streamed = bool(self.history_ingestor.files)       # part of the history is only in the profile store
+        user_history_df = self.data_handler.user_history_df
+        if user_ids is None:
+            user_ids = self.profile_store.user_ids() if streamed else user_history_df['user_id'].unique()
+        user_ids = list(user_ids)
+        
+        num_columns = len(self._column_index)
+        arrays = dict(
+            self._scoring_arrays,
+            numeric_columns=(self._column_index['budget_level'], self._column_index['popularity_score']),
+            plan=self.scoring_plan
+        )
+        arrays['activity_matrix'] = batch_scoring.destination_matrix(arrays, num_columns, activities_only=True)
+        if self.collaborative is not None:
+            arrays.update(item_factors=self.collaborative.item_matrix, rating_range=self.collaborative.rating_range,
+                          blend_weights=self.blend_weights)
+        
+        if streamed:
+            profiles, visited, has_profile = batch_scoring.build_profile_matrix_from_store(
+                self.profile_store, self.attribute_index.visited, user_ids, self._column_index, len(self.data_handler.catalog)
+            )
+        else:
+            profiles, visited, has_profile = batch_scoring.build_profile_matrix(
+                user_history_df, user_ids, self.data_handler.catalog, batch_scoring.destination_matrix(arrays, num_columns)
+            )
+        
+        # users without history get the popular destinations, like get_recommendations
+        if not has_profile.all():
+            popular = self._get_popular_destinations(k)
+        
+        chunk_starts = range(0, len(user_ids), chunk_size)
+        tasks = (
+            (profiles[start:start + chunk_size], visited[start:start + chunk_size], k,
+             self.collaborative.user_vectors(user_ids[start:start + chunk_size]) if self.collaborative is not None else None)
+            for start in chunk_starts
+        )
+        
+        destinations = self.data_handler.destinations_df
+        for start, (user_rows, positions, scores) in zip(chunk_starts, batch_scoring.score_chunks(tasks, arrays, n_jobs)):
+            chunk_users = np.arange(start, min(start + chunk_size, len(user_ids)))
+            keep = has_profile[start + user_rows]
+            user_rows, positions, scores = user_rows[keep], positions[keep], scores[keep]
+            
+            chunk_df = destinations.iloc[positions][RECOMMENDATION_COLUMNS].reset_index(drop=True)
+            chunk_df['similarity_score'] = scores
+            chunk_df.insert(0, 'user_id', [user_ids[start + row] for row in user_rows.tolist()])
+            chunk_df.insert(1, 'rank', pd.Series(user_rows).groupby(user_rows).cumcount().to_numpy() + 1)
+            
+            new_users = chunk_users[~has_profile[chunk_users]]
+            if len(new_users):
+                fallback = pd.concat([popular] * len(new_users), ignore_index=True)
+                fallback.insert(0, 'user_id', np.repeat([user_ids[row] for row in new_users.tolist()], len(popular)))
+                fallback.insert(1, 'rank', np.tile(np.arange(1, len(popular) + 1), len(new_users)))
+                chunk_df = pd.concat([chunk_df, fallback], ignore_index=True)
+            
+            yield chunk_df
+    
+    def _get_recommendations_vectorized(self, user_profile, candidates, num_recommendations, user_id=None, plan=None):
+        """
+            Score all candidate destinations (row positions) in one pass with numpy
+            
+            Gives the same scores and ordering as the rowwise loop (ties keep catalog order)
+        """
+        scores = self._score_destinations(self._profile_vector(user_profile), candidates, plan)
+        scores = self._blend_collaborative(user_id, candidates, scores)
+        with instrumentation.timer('sort'):
+            top = top_k_indices(scores, num_recommendations)
+        
+        recommendations_df = self.data_handler.destinations_df.iloc[candidates[top]][RECOMMENDATION_COLUMNS].copy()
+        recommendations_df['similarity_score'] = scores[top]
+        recommendations_df.index = top      # same index the rowwise dataframe would have
+        
+        return recommendations_df
+    
+    def _profile_vector(self, user_profile):
+        """
+            Turn a user profile dict into a vector aligned with the feature matrix columns
+            
+            avg_budget / avg_popularity go into the budget_level / popularity_score slots,
+            the last slot is padding and stays 0
+        """
+        profile_vector = np.zeros(len(self._column_index) + 1)
+        for key, value in user_profile.items():
+            if key in self._column_index:
+                profile_vector[self._column_index[key]] = value
+        
+        profile_vector[self._column_index['budget_level']] = user_profile.get('avg_budget', 0.0)
+        profile_vector[self._column_index['popularity_score']] = user_profile.get('avg_popularity', 0.0)
+        return profile_vector
+    
+    @instrumentation.timed('score_destinations')
+    def _score_destinations(self, profile_vector, positions, plan=None):
+        """
+            Vectorized version of _calculate_destination_similarity for the destinations at 'positions'
+            
+            One pass over the per-destination terms precomputed by the scoring plan (the engine's
+            current one by default), the floats match the rowwise version exactly
+        """
+        return (plan or self.scoring_plan).scores(profile_vector, positions)
+    
+    def _calculate_destination_similarity(self, user_profile, destination, plan=None):     # for internal use only bcz it starts with '_'
         """
             Calculate similarity between user profile and destination
+            
+            Weights are the scoring plan's normalized ones (they sum to 1), so the weighted sum is the score
         """
         similarity_score = 0.0
-        total_weight = 0.0
         
-        weights = {
-                'activities': 0.4,
-                'climate': 0.2,
-                'type': 0.2,
-                'budget': 0.1,
-                'popularity': 0.1
-            }
+        weights = (plan or self.scoring_plan).normalized
         
         # Activities similarity
         dest_activities = destination['activities_list']
@@ -131,37 +686,32 @@ class RecommendationEngine:
         for activity in dest_activities:
             if activity in user_profile:
                 activity_sim += user_profile[activity]
-        activity_sim = activity_sim / len(dest_activities) if dest_activities else 0    # so that destinations with more activities donot get unfairly high scores (so, we normalize)
-        similarity_score += activity_sim * weights['activities']
-        total_weight += weights['activities']
+        activity_weight = weights['activities'] / len(dest_activities) if dest_activities else 0.0    # so that destinations with more activities donot get unfairly high scores (so, we normalize)
+        similarity_score += activity_sim * activity_weight
         
         # Climate similarity
         climate_key = f"climate_{destination['climate']}"
         if climate_key in user_profile:
             similarity_score += user_profile[climate_key] * weights['climate']
-        total_weight += weights['climate']
         
         # Type similarity
         type_key = f"type_{destination['type']}"
         if type_key in user_profile:
             similarity_score += user_profile[type_key] * weights['type']
-        total_weight += weights['type']
         
         # Budget similarity
         if 'avg_budget' in user_profile:
             budget_diff = abs(user_profile['avg_budget'] - destination['budget_level'])
             budget_sim = max(0, 1.0 - budget_diff / 4.0)        # to avoid negative values
             similarity_score += budget_sim * weights['budget']
-        total_weight += weights['budget']
         
         # Popularity boost 
         popularity_factor = destination['popularity_score'] / 10.0
         similarity_score += popularity_factor * weights['popularity']
-        total_weight += weights['popularity']
         
-        return similarity_score / total_weight if total_weight > 0 else 0
+        return similarity_score
     
-    def _get_popular_destinations(self, num_recommendations=5):     # for internal use only (protected)
+    def _get_popular_destinations(self, num_recommendations=5, filters=None):     # for internal use only (protected)
         """
             Fallback: return popular destinations for new users
             
@@ -169,44 +719,148 @@ class RecommendationEngine:
         """
         if self.data_handler.destinations_df is None:
             self.data_handler.load_data()
+        
+        destinations = self.data_handler.destinations_df
+        if filters and self.initialized:
+            destinations = destinations.iloc[self._filtered_candidates(filters)]
             
-        popular = self.data_handler.destinations_df.nlargest(num_recommendations, 'popularity_score')
+        popular = destinations.nlargest(num_recommendations, 'popularity_score')
         popular['similarity_score'] = popular['popularity_score'] / 10.0
         
         return popular[['destination_id', 'name', 'country', 'type', 'activities', 
                        'climate', 'budget_level', 'popularity_score', 'similarity_score']]
     
+    def _blend_collaborative(self, user_id, candidates, scores):
+        """
+            Content scores of the candidates blended with the collaborative ones by blend_weights
+            
+            Users the collaborative filter has no ratings for keep their content scores
+        """
+        if self.collaborative is None or user_id is None:
+            return scores
+        collaborative_scores = self.collaborative.scores(user_id)
+        if collaborative_scores is None:
+            return scores
+        weights = self.blend_weights
+        return ((scores * weights['content'] + collaborative_scores[candidates] * weights['collaborative'])
+                / (weights['content'] + weights['collaborative']))
+    
+    def _blend_key(self):
+        """
+            What the collaborative blend depends on, for cache keys (None without one)
+        """
+        if self.collaborative is None:
+            return None
+        return self.collaborative.params(), tuple(sorted(self.blend_weights.items()))
+    
+    @staticmethod
+    def _filters_key(filters):
+        """
+            Hashable, order independent version of a filters dict (for cache keys)
+        """
+        if not filters:
+            return None
+        return tuple(sorted(
+            (key, tuple(sorted(values)) if isinstance(values, (list, set)) else values)
+            for key, values in filters.items()
+            if values is not None and (not isinstance(values, (list, set, tuple)) or len(values) > 0)
+        )) or None
+    
+    @instrumentation.timed('candidate_filter')
+    def _filtered_candidates(self, filters, user_id=None):
+        """
+            Row positions matching get_recommendations filters, from the attribute index
+        """
+        index_filters, ranges = self._index_filters(filters)
+        return self.attribute_index.candidates(index_filters, user_id=user_id, ranges=ranges)
+    
+    @instrumentation.timed('retrieval')
+    def _retrieve_candidates(self, user_profile, filters, user_id, num_recommendations, retrieval):
+        """
+            Rows the retrieval backend returns for this profile that match the filters and aren't visited
+            
+            The filters and visited rows are only checked on the rows of the probed lists
+        """
+        index_filters, ranges = self._index_filters(filters)
+        return retrieval.candidates(
+            self._profile_vector(user_profile), num_recommendations,
+            lambda rows: self.attribute_index.contains(rows, index_filters, user_id=user_id, ranges=ranges)
+        )
+    
+    @staticmethod
+    def _index_filters(filters):
+        """
+            get_recommendations filters as (attribute index filters, ranges)
+        """
+        index_filters, ranges = {}, {}
+        for key, values in (filters or {}).items():
+            if key == 'budget_range':
+                if values is not None:
+                    ranges['budget_level'] = values
+            elif key in ('climate', 'type', 'country', 'activities'):
+                index_filters[key] = values
+            else:
+                raise ValueError(f"Unknown filter: {key}")
+        return index_filters, ranges
+    
+    @instrumentation.timed('get_similar_destinations')
     def get_similar_destinations(self, destination_id, num_similar=3):
         """
             Get destinations similar to a given destination
         """
-        if self.feature_matrix is None:
+        if not self.initialized:
             self.initialize()
         
-        # Get the target destination
-        target_dest = self.data_handler.destinations_df[
-            self.data_handler.destinations_df['destination_id'] == destination_id
-        ]
+        plan = self.scoring_plan        # read once, like get_recommendations
+        cache_key = ('similar', destination_id, num_similar, plan.key, self._catalog_version)
+        hit, similar_df = self.result_cache.get(cache_key)
+        if hit:
+            instrumentation.count('result_cache_hits')
+            return similar_df.copy()
         
-        if target_dest.empty:
-            return pd.DataFrame()
-        
-        target_dest = target_dest.iloc[0]
+        similar_df = self._compute_similar_destinations(destination_id, num_similar, plan)
+        self.result_cache.put(cache_key, similar_df.copy())
+        return similar_df
+    
+    def _compute_similar_destinations(self, destination_id, num_similar, plan):
+        """
+            get_similar_destinations without the result cache, with the plan's weights
+        """
+        # Precomputed neighbours, O(K) per lookup
+        neighbors = self._get_similarity_index(plan).lookup(destination_id, num_similar)
+        if neighbors is not None:
+            neighbor_ids, scores = neighbors
+            rows = self.data_handler.catalog.rows_of(neighbor_ids)
+            similar_df = self.data_handler.destinations_df.iloc[rows][['destination_id', 'name', 'country']]
+            similar_df = similar_df.reset_index(drop=True)
+            similar_df['similarity_score'] = scores
+            return similar_df
         
-        # Calculate similarities with all other destinations
-        similarities = []
+        # Get the target destination
+        catalog = self.data_handler.catalog
+        row = catalog.row_of(destination_id)
+        if row is None:
+            return pd.DataFrame()
         
-        for _, dest in self.data_handler.destinations_df.iterrows():
-            if dest['destination_id'] != destination_id:
-                similarity = self.similarity_calculator.weighted_feature_similarity(
-                    target_dest.to_dict(), dest.to_dict()       # dict makes row data easier to work with
-                )
-                similarities.append({
-                    'destination_id': dest['destination_id'],
-                    'name': dest['name'],
-                    'country': dest['country'],
-                    'similarity_score': similarity
-                })
+        # Similarities with all other destinations, one vectorized one-to-all pass
+        scores = self.similarity_calculator.weighted_feature_similarity_to_all(
+            self._get_similarity_arrays(), row, plan.weights
+        )
+        others = np.flatnonzero(catalog.destination_ids != destination_id)
         
-        similar_df = pd.DataFrame(similarities)
-        return similar_df.sort_values('similarity_score', ascending=False).head(num_similar)
\ No newline at end of file
+        similar_df = self.data_handler.destinations_df.iloc[others][['destination_id', 'name', 'country']]
+        similar_df = similar_df.reset_index(drop=True)
+        similar_df['similarity_score'] = scores[others]
+        return similar_df.sort_values('similarity_score', ascending=False, kind='stable').head(num_similar)
+    
+    def _get_similarity_arrays(self):
+        """
+            Catalog arrays of the get_similar_destinations scan, built once (under the lazy state lock)
+        """
+        arrays = self._similarity_arrays
+        if arrays is None:
+            with self._lazy_state_lock:
+                if self._similarity_arrays is None:
+                    self._similarity_arrays = SimilarityCalculator.similarity_arrays(self.data_handler.catalog)
+                arrays = self._similarity_arrays
+        return arrays
\ No newline at end of file
@@ -0,0 +1,249 @@
+"""
+    HTTP API around one shared RecommendationEngine (asyncio, standard library only)
+
+        GET  /recommendations?user_id=1&k=5[&climate=Tropical&type=Beach&country=India&activities=...
+                             &budget_min=1&budget_max=3]
+        GET  /similar?destination_id=3&k=3
+        POST /ratings   {"user_id": 1, "destination_id": 3, "rating": 4.5, "visit_date": "2024-05-01"}
+
+    Run from the repo root:  python service.py [--port 8000] [--workers 4]
+"""
+import argparse
+import asyncio
+import functools
+import json
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+from recommendation_engine import RecommendationEngine
+
+REASONS = {200: 'OK', 201: 'Created', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+           413: 'Payload Too Large', 500: 'Internal Server Error'}
+MAX_BODY_SIZE = 1 << 20
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+class RecommendationService:
+    """
+        Serves the engine over HTTP/1.1 (keep-alive) from a single event loop
+
+        Scoring runs on a thread pool (the heavy parts are numpy and release the GIL), so
+        the loop keeps accepting requests. Identical concurrent reads are coalesced: they
+        wait on the same computation instead of each starting one. Ratings are writes: they
+        wait for the reads in flight, block new ones while they run, and start a new
+        coalescing generation so no later request joins a read that missed the rating.
+    """
+    def __init__(self, engine, max_workers=4):
+        self.engine = engine
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='scoring')
+        self._in_flight = {}        # (generation, endpoint, params) -> asyncio.Future
+        self._generation = 0
+        self._readers = 0
+        self._writing = False
+        self._state = None          # asyncio.Condition, created on the running loop
+        self.stats = {'requests': 0, 'coalesced': 0, 'computed': 0}
+
+    async def serve(self, host='127.0.0.1', port=8000):
+        server = await self.start(host, port)
+        async with server:
+            await server.serve_forever()
+
+    async def start(self, host='127.0.0.1', port=8000):
+        self._state = asyncio.Condition()
+        loop = asyncio.get_running_loop()
+        if not self.engine.initialized:
+            await loop.run_in_executor(self.executor, self.engine.initialize)
+        await loop.run_in_executor(self.executor, self.engine._get_similarity_index)     # not built by the first /similar
+        return await asyncio.start_server(self._handle_connection, host, port)
+
+    # --- endpoints ---
+
+    async def recommendations(self, query):
+        user_id = _int_param(query, 'user_id')
+        k = _int_param(query, 'k', 5, minimum=1)
+        filters = {key: query[key] for key in ('climate', 'type', 'country', 'activities') if key in query}
+        if 'budget_min' in query or 'budget_max' in query:
+            filters['budget_range'] = (_int_param(query, 'budget_min', 1), _int_param(query, 'budget_max', 5))
+
+        key = ('recommendations', user_id, k, self.engine._filters_key(filters))
+        return await self._read(key, self.engine.get_recommendations, user_id, k, filters=filters or None)
+
+    async def similar(self, query):
+        destination_id = _int_param(query, 'destination_id')
+        k = _int_param(query, 'k', 3, minimum=1)
+        return await self._read(('similar', destination_id, k), self.engine.get_similar_destinations, destination_id, k)
+
+    async def ratings(self, body):
+        try:
+            rating = json.loads(body)
+            if not isinstance(rating, dict):        # eg. a list or a string
+                raise TypeError
+            args = (int(rating['user_id']), int(rating['destination_id']), float(rating['rating']))
+            visit_date = rating.get('visit_date')
+        except (ValueError, KeyError, TypeError):
+            raise HTTPError(400, "expected a JSON object with user_id, destination_id and rating")
+
+        await self._write(self.engine.add_rating, *args, visit_date=visit_date)
+        return {'status': 'ok'}
+
+    # --- reads, writes and coalescing ---
+
+    async def _read(self, key, func, *args, **kwargs):
+        key = (self._generation,) + key
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._compute(func, *args, **kwargs))
+            self._in_flight[key] = task
+            task.add_done_callback(functools.partial(self._computed, key))
+        else:
+            self.stats['coalesced'] += 1
+        # the computation is a task of its own: a request that gets cancelled (eg. its client
+        # went away) stops waiting, the others joined on it still get the result
+        return await asyncio.shield(task)
+
+    def _computed(self, key, task):
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        if not task.cancelled():
+            task.exception()        # retrieved here, so a computation nobody waits for anymore doesn't warn
+
+    async def _compute(self, func, *args, **kwargs):
+        async with self._state:
+            await self._state.wait_for(lambda: not self._writing)
+            self._readers += 1
+        try:
+            self.stats['computed'] += 1
+            return await asyncio.get_running_loop().run_in_executor(self.executor, lambda: func(*args, **kwargs))
+        finally:
+            async with self._state:
+                self._readers -= 1
+                self._state.notify_all()
+
+    async def _write(self, func, *args, **kwargs):
+        async with self._state:
+            await self._state.wait_for(lambda: not self._writing)
+            self._writing = True        # new reads wait from here on
+            self._generation += 1
+            await self._state.wait_for(lambda: self._readers == 0)
+        try:
+            await asyncio.get_running_loop().run_in_executor(self.executor, lambda: func(*args, **kwargs))
+        finally:
+            async with self._state:
+                self._writing = False
+                self._state.notify_all()
+
+    # --- HTTP ---
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                request = await _read_request(reader)
+                if request is None:
+                    break
+                method, target, headers, body = request
+                status, payload = await self._dispatch(method, target, body)
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                writer.write(_response(status, payload, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except HTTPError as error:      # malformed request, answer and close
+            writer.write(_response(error.status, {'error': str(error)}, keep_alive=False))
+        finally:
+            writer.close()
+
+    async def _dispatch(self, method, target, body):
+        self.stats['requests'] += 1
+        url = urlsplit(target)
+        query = {key: values if key in ('climate', 'type', 'country', 'activities') else values[-1]
+                 for key, values in parse_qs(url.query).items()}
+        routes = {
+            '/recommendations': ('GET', lambda: self.recommendations(query)),
+            '/similar': ('GET', lambda: self.similar(query)),
+            '/ratings': ('POST', lambda: self.ratings(body))
+        }
+        try:
+            if url.path not in routes:
+                raise HTTPError(404, f"no endpoint {url.path}")
+            allowed, handler = routes[url.path]
+            if method != allowed:
+                raise HTTPError(405, f"{url.path} only accepts {allowed}")
+            result = await handler()
+        except HTTPError as error:
+            return error.status, {'error': str(error)}
+        except ValueError as error:     # eg. unknown filter
+            return 400, {'error': str(error)}
+        except Exception as error:
+            return 500, {'error': f"{type(error).__name__}: {error}"}
+
+        if hasattr(result, 'to_json'):
+            return 200, result.to_json(orient='records')
+        return (201 if method == 'POST' else 200), result
+
+def _int_param(query, name, default=None, minimum=None):
+    if name not in query:
+        if default is None:
+            raise HTTPError(400, f"missing parameter {name}")
+        return default
+    try:
+        value = int(query[name])
+    except ValueError:
+        raise HTTPError(400, f"{name} must be an integer")
+    if minimum is not None and value < minimum:
+        raise HTTPError(400, f"{name} must be at least {minimum}")
+    return value
+
+async def _read_request(reader):
+    """
+        (method, target, headers, body) of the next request, None when the client closed
+    """
+    request_line = await reader.readline()
+    if not request_line.strip():
+        return None
+    try:
+        method, target, _ = request_line.decode('latin-1').split()
+    except ValueError:
+        raise HTTPError(400, "malformed request line")
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+    try:
+        length = int(headers.get('content-length', 0) or 0)
+    except ValueError:
+        raise HTTPError(400, "Content-Length must be an integer")
+    if length < 0:
+        raise HTTPError(400, "Content-Length must not be negative")
+    if length > MAX_BODY_SIZE:
+        raise HTTPError(413, "request body too large")
+    body = await reader.readexactly(length) if length else b''
+    return method, target, headers, body
+
+def _response(status, payload, keep_alive=True):
+    body = (payload if isinstance(payload, str) else json.dumps(payload)).encode()
+    head = (f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    return head.encode('latin-1') + body
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=4, help='scoring threads')
+    args = parser.parse_args()
+
+    service = RecommendationService(RecommendationEngine(), max_workers=args.workers)
+    print(f"Serving on http://{args.host}:{args.port}")
+    asyncio.run(service.serve(args.host, args.port))
@@ -0,0 +1,23 @@
+import pytest
+
+from benchmarks.synthetic import make_destinations, make_user_history
+from recommendation_engine import RecommendationEngine
+
+NUM_DESTINATIONS = 400
+NUM_USERS = 40
+
+def make_engine(destinations_df, user_history_df, **kwargs):
+    """
+        Engine initialized on copies of the data, nothing read from / written to data/
+    """
+    kwargs.setdefault('similarity_index_path', None)
+    kwargs.setdefault('snapshot_path', None)
+    engine = RecommendationEngine(**kwargs)
+    engine.initialize(destinations_df.copy(), user_history_df.copy())
+    return engine
+
+@pytest.fixture
+def data():
+    destinations_df = make_destinations(NUM_DESTINATIONS, seed=1)
+    user_history_df = make_user_history(NUM_DESTINATIONS, num_users=NUM_USERS, visits_per_user=4, seed=1)
+    return destinations_df, user_history_df
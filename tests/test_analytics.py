@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from tests.conftest import make_engine
+
+@pytest.fixture
+def engine(data):
+    return make_engine(*data)
+
+def raw_summary(engine, user_id=None):
+    """
+        visit_summary recomputed from the rows, like the History page did before the cubes
+    """
+    history = engine.data_handler.user_history_df
+    if user_id is not None:
+        history = history[history['user_id'] == user_id]
+    visits = history.merge(engine.data_handler.destinations_df, on='destination_id')
+    budget_ratings = pd.crosstab(visits['budget_level'], np.clip(np.floor(visits['rating'] + 0.5), 0, 5).astype(int))
+    return len(visits), visits['climate'].value_counts(), budget_ratings
+
+def assert_matches_rows(engine, user_id=None):
+    summary = engine.analytics.visit_summary(user_id)
+    num_visits, climate_visits, budget_ratings = raw_summary(engine, user_id)
+    assert summary['visits'] == num_visits
+    assert summary['climate_visits'].to_dict() == climate_visits.to_dict()
+    cube = summary['budget_ratings']
+    cube = cube.loc[cube.sum(axis=1) > 0, cube.sum(axis=0) > 0]
+    assert cube.to_numpy().tolist() == budget_ratings.to_numpy().tolist()
+    assert cube.index.tolist() == budget_ratings.index.tolist()
+
+def test_visit_summary_is_per_user(engine):
+    for user_id in (None, 1, 2, 7):
+        assert_matches_rows(engine, user_id)
+
+    destination_id = int(engine.data_handler.destinations_df['destination_id'].iloc[0])
+    engine.add_rating(99, destination_id, 4.0)       # new user
+    engine.add_rating(1, destination_id, 2.0)
+    for user_id in (None, 1, 99):
+        assert_matches_rows(engine, user_id)
+    assert engine.analytics.visit_summary(12345)['visits'] == 0
+
+def test_half_star_ratings_round_up(engine):
+    destination_id = int(engine.data_handler.destinations_df['destination_id'].iloc[0])
+    budget_level = engine.data_handler.destinations_df['budget_level'].iloc[0]
+    for rating in (2.5, 3.5, 4.5):
+        engine.add_rating(99, destination_id, rating)       # new user
+
+    budget_ratings = engine.analytics.visit_summary(99)['budget_ratings']
+    assert budget_ratings.loc[budget_level].tolist() == [0, 0, 0, 1, 1, 1]
+    assert_matches_rows(engine, 99)
@@ -0,0 +1,26 @@
+import pandas as pd
+import pytest
+
+from tests.conftest import NUM_USERS, make_engine
+
+def test_get_recommendations_batch_matches_get_recommendations(data):
+    engine = make_engine(*data, cache_size=0)
+    batch = engine.get_recommendations_batch(k=5, chunk_size=7)
+    for user_id in (1, 2, NUM_USERS):
+        expected = engine.get_recommendations(user_id, 5)
+        got = batch[batch['user_id'] == user_id]
+        assert got['destination_id'].tolist() == expected['destination_id'].tolist()
+        assert got['similarity_score'].to_numpy() == pytest.approx(expected['similarity_score'].to_numpy())
+    assert engine.get_recommendations_batch([]).empty
+
+def test_interleaved_batches_keep_their_own_arrays(data):
+    engines = [make_engine(*data), make_engine(*data, scoring_weights={'popularity': 1.0})]
+    expected = [engine.get_recommendations_batch(k=5, chunk_size=7) for engine in engines]
+
+    generators = [engine.iter_recommendations_batch(k=5, chunk_size=7) for engine in engines]
+    chunks = [[], []]
+    for first, second in zip(*generators):          # one chunk of each in turn
+        chunks[0].append(first)
+        chunks[1].append(second)
+    for got, want in zip(chunks, expected):
+        pd.testing.assert_frame_equal(pd.concat(got, ignore_index=True), want)
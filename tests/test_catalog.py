@@ -0,0 +1,20 @@
+import numpy as np
+
+from utils.catalog import Catalog
+
+def test_rows_of_matches_dataframe_positions(data):
+    destinations_df, _ = data
+    destinations_df = destinations_df.sample(frac=1, random_state=0).reset_index(drop=True)      # ids out of order
+    catalog = Catalog.from_dataframe(destinations_df)
+
+    ids = destinations_df['destination_id'].to_numpy()
+    assert catalog.rows_of(ids).tolist() == list(range(len(ids)))
+    assert catalog.rows_of([ids.max() + 1, ids.min() - 1, ids[5]]).tolist() == [-1, -1, 5]
+    assert catalog.row_of(int(ids[7])) == 7
+    assert catalog.row_of(int(ids.max()) + 1) is None
+    assert catalog.record(3).name == destinations_df['name'].iloc[3]
+
+def test_rows_of_empty_catalog(data):
+    destinations_df, _ = data
+    catalog = Catalog.from_dataframe(destinations_df.iloc[:0])
+    assert catalog.rows_of(np.array([1, 2])).tolist() == [-1, -1]
@@ -0,0 +1,45 @@
+import json
+import os
+
+import pandas as pd
+import pytest
+
+from utils import data_cache
+
+pytest.importorskip('pyarrow')
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / 'destinations.csv'
+    pd.DataFrame({'destination_id': [1, 2], 'name': ['A', 'B']}).to_csv(path, index=False)
+    return str(path)
+
+def parses(monkeypatch):
+    """
+        List that gets one entry per parse of a source file
+    """
+    calls = []
+    read_source = data_cache._read_source
+    monkeypatch.setattr(data_cache, '_read_source', lambda path: calls.append(path) or read_source(path))
+    return calls
+
+def test_cache_is_reused(source, monkeypatch):
+    expected = data_cache.read_table(source)
+    calls = parses(monkeypatch)
+    pd.testing.assert_frame_equal(data_cache.read_table(source), expected)
+    assert calls == []
+    assert sorted(os.listdir(os.path.dirname(data_cache._cache_paths(source)[0]))) == [
+        'destinations.csv.feather', 'destinations.csv.feather.json']       # no temporary files left
+
+@pytest.mark.parametrize('meta', ['{"mtime_ns": 1, "si', '[]', '{}', ''])
+def test_unreadable_meta_is_a_cache_miss(source, monkeypatch, meta):
+    expected = data_cache.read_table(source)
+    cache_path, meta_path = data_cache._cache_paths(source)
+    with open(meta_path, 'w') as f:
+        f.write(meta)
+
+    calls = parses(monkeypatch)
+    pd.testing.assert_frame_equal(data_cache.read_table(source), expected)
+    assert calls == [source]
+    with open(meta_path) as f:
+        assert json.load(f)['sha256'] == data_cache._file_hash(source)      # rewritten whole
@@ -0,0 +1,65 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from utils import engine_snapshot
+from utils.engine_snapshot import SnapshotError, load_snapshot, save_snapshot
+
+@pytest.fixture
+def snapshot(tmp_path):
+    """
+        (snapshot path, source paths) of a small snapshot of two source files
+    """
+    sources = []
+    for name, content in (('destinations.csv', 'destination_id,name\n1,A\n'), ('history.csv', 'user_id\n1\n')):
+        source = tmp_path / name
+        source.write_text(content)
+        sources.append(str(source))
+    path = str(tmp_path / 'engine')
+    arrays = {'codes': np.arange(6, dtype=np.int8), 'scores': np.linspace(0.0, 1.0, 4)}
+    save_snapshot(path, sources, arrays, {'columns': ['a', 'b']}, {'users': {1: 2.5}})
+    return path, sources
+
+def test_matching_snapshot_loads(snapshot):
+    path, sources = snapshot
+    arrays, params, state = load_snapshot(path, sources)
+    np.testing.assert_array_equal(arrays['codes'], np.arange(6))
+    assert isinstance(arrays['codes'], np.memmap)
+    assert params == {'columns': ['a', 'b']}
+    assert state == {'users': {1: 2.5}}
+
+    # same content with a new mtime (eg. a fresh checkout) is still a match
+    os.utime(sources[0], ns=(0, 0))
+    load_snapshot(path, sources)
+
+def test_other_format_version_is_refused(snapshot, monkeypatch):
+    path, sources = snapshot
+    monkeypatch.setattr(engine_snapshot, 'FORMAT_VERSION', engine_snapshot.FORMAT_VERSION + 1)
+    with pytest.raises(SnapshotError, match='format'):
+        load_snapshot(path, sources)
+
+def test_changed_sources_are_refused(snapshot):
+    path, sources = snapshot
+    with open(sources[1], 'w') as f:       # same size, other content
+        f.write('user_id\n2\n')
+    with pytest.raises(SnapshotError, match='changed'):
+        load_snapshot(path, sources)
+
+    with pytest.raises(SnapshotError, match='other source files'):
+        load_snapshot(path, sources[:1])
+
+def test_unreadable_or_mismatched_files_are_refused(snapshot):
+    path, sources = snapshot
+    np.save(os.path.join(path, 'codes.npy'), np.arange(6, dtype=np.int64))
+    with pytest.raises(SnapshotError, match='codes'):
+        load_snapshot(path, sources)
+
+    with open(os.path.join(path, engine_snapshot.META_FILE), 'w') as f:
+        f.write(json.dumps({'format_version': engine_snapshot.FORMAT_VERSION})[:10])     # truncated
+    with pytest.raises(SnapshotError, match='unreadable'):
+        load_snapshot(path, sources)
+
+    with pytest.raises(SnapshotError, match='no snapshot'):
+        load_snapshot(path + '-missing', sources)
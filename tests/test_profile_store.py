@@ -0,0 +1,65 @@
+import pandas as pd
+import pytest
+
+from tests.conftest import NUM_DESTINATIONS, make_engine
+
+def assert_profiles_match(profile, expected):
+    if expected is None:
+        assert profile is None
+        return
+    assert profile.keys() == expected.keys()
+    assert profile == pytest.approx(expected, rel=1e-12, abs=1e-12)
+
+def new_ratings(user_history_df):
+    """
+        Ratings of unvisited destinations for known and new users, plus one outside the catalog
+    """
+    visited = set(zip(user_history_df['user_id'], user_history_df['destination_id']))
+    ratings = []
+    for step, user_id in enumerate([1, 2, 2, 7, 41, 41, 42, 1, 3]):
+        destination_id = next(dest_id for dest_id in range(1 + 17 * step, NUM_DESTINATIONS + 1)
+                              if (user_id, dest_id) not in visited)
+        visited.add((user_id, destination_id))
+        ratings.append((user_id, destination_id, [4.5, 3.0, 5.0, 1.5, 4.0][step % 5]))
+    ratings.append((7, NUM_DESTINATIONS + 100, 2.0))        # unknown destination, counts towards the total only
+    return ratings
+
+def test_add_rating_matches_rebuild(data):
+    destinations_df, user_history_df = data
+    engine = make_engine(destinations_df, user_history_df, cache_size=0)
+    for user_id, destination_id, rating in new_ratings(user_history_df):
+        engine.add_rating(user_id, destination_id, rating)
+
+    for user_id in engine.data_handler.user_history_df['user_id'].unique().tolist():
+        assert_profiles_match(engine.create_user_profile(user_id), engine.rebuild_user_profile(user_id))
+
+def test_streamed_history_matches_rebuild(data, tmp_path):
+    destinations_df, user_history_df = data
+    initial, streamed = user_history_df.iloc[::2], user_history_df.iloc[1::2]
+    engine = make_engine(destinations_df, initial, cache_size=0)
+
+    # two log files read in chunks of 7 rows, ratings added in between
+    streamed.iloc[:len(streamed) // 2].to_csv(tmp_path / 'part-0.csv', index=False)
+    engine.ingest_history(str(tmp_path), chunk_size=7)
+    ratings = new_ratings(user_history_df)
+    for user_id, destination_id, rating in ratings:
+        engine.add_rating(user_id, destination_id, rating)
+    streamed.iloc[len(streamed) // 2:].to_csv(tmp_path / 'part-1.csv', index=False)
+    engine.ingest_history(str(tmp_path), chunk_size=7)
+
+    # reference: every visit in user_history_df, profiles replayed from scratch
+    added = pd.DataFrame(ratings, columns=['user_id', 'destination_id', 'rating']).assign(visit_date='2024-01-01')
+    reference = make_engine(destinations_df, pd.concat([initial, streamed, added], ignore_index=True), cache_size=0)
+    for user_id in reference.data_handler.user_history_df['user_id'].unique().tolist():
+        assert_profiles_match(engine.create_user_profile(user_id), reference.rebuild_user_profile(user_id))
+
+def test_add_rating_keeps_extra_history_columns(data):
+    destinations_df, user_history_df = data
+    engine = make_engine(destinations_df, user_history_df.assign(companions=2), cache_size=0)
+    engine.add_rating(1, 5, 4.0, visit_date='2024-05-01')
+
+    history = engine.data_handler.user_history_df
+    assert len(history) == len(user_history_df) + 1
+    assert list(history.columns) == list(user_history_df.columns) + ['companions']
+    assert history.iloc[-1][['user_id', 'destination_id', 'rating', 'visit_date']].tolist() == [1, 5, 4.0, '2024-05-01']
+    assert pd.isna(history.iloc[-1]['companions'])
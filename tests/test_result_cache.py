@@ -0,0 +1,94 @@
+import pandas as pd
+
+from tests.conftest import make_engine
+from utils import result_cache
+from utils.result_cache import ResultCache
+
+def test_add_rating_invalidates_the_users_recommendations(data):
+    engine = make_engine(*data)
+    first = engine.get_recommendations(1, 5)
+    other = engine.get_recommendations(2, 5)
+    assert engine.get_recommendations(1, 5).equals(first)
+    hits = engine.result_cache.hits
+
+    top_id = int(first['destination_id'].iloc[0])
+    engine.add_rating(1, top_id, 1.0)
+    second = engine.get_recommendations(1, 5)
+    assert engine.result_cache.hits == hits
+    assert top_id not in second['destination_id'].tolist()      # now visited
+
+    uncached = make_engine(data[0], engine.data_handler.user_history_df, cache_size=0)
+    pd.testing.assert_frame_equal(second, uncached.get_recommendations(1, 5))
+
+    # other users keep their cached results
+    assert engine.get_recommendations(2, 5).equals(other)
+    assert engine.result_cache.hits == hits + 1
+
+def test_update_destinations_bumps_the_catalog_version(data):
+    destinations_df, user_history_df = data
+    engine = make_engine(destinations_df, user_history_df)
+    first = engine.get_recommendations(1, 5)
+    engine.get_similar_destinations(3, 3)
+    version = engine._catalog_version
+
+    # the best recommendation becomes the least popular destination of the catalog
+    edited = destinations_df[destinations_df['destination_id'] == first['destination_id'].iloc[0]].copy()
+    edited['popularity_score'] = 0.0
+    edited['budget_level'] = 5
+    engine.update_destinations(edited)
+    assert engine._catalog_version == version + 1
+    assert engine.result_cache.stats()['entries'] == 0
+
+    updated = destinations_df.copy()
+    updated.loc[updated['destination_id'] == edited['destination_id'].iloc[0], ['popularity_score', 'budget_level']] = (0.0, 5)
+    uncached = make_engine(updated, user_history_df, cache_size=0)
+    second = engine.get_recommendations(1, 5)
+    pd.testing.assert_frame_equal(second, uncached.get_recommendations(1, 5))
+    pd.testing.assert_frame_equal(engine.get_similar_destinations(3, 3), uncached.get_similar_destinations(3, 3))
+    assert second['destination_id'].iloc[0] != first['destination_id'].iloc[0]
+
+def test_other_scoring_weights_miss_the_cache(data):
+    engine = make_engine(*data)
+    default = engine.get_recommendations(1, 5)
+    default_key = engine.scoring_plan.key
+
+    weights = {'activities': 0.0, 'climate': 0.0, 'type': 0.0, 'budget': 0.0, 'popularity': 1.0}
+    engine.set_scoring_weights(weights)
+    assert engine.scoring_plan.key != default_key
+    hits = engine.result_cache.hits
+    popular_first = engine.get_recommendations(1, 5)
+    assert engine.result_cache.hits == hits
+
+    uncached = make_engine(*data, cache_size=0, scoring_weights=weights)
+    pd.testing.assert_frame_equal(popular_first, uncached.get_recommendations(1, 5))
+    assert not popular_first.equals(default)
+
+    # switching back finds the results of the default plan again
+    engine.set_scoring_weights(None)
+    assert engine.get_recommendations(1, 5).equals(default)
+    assert engine.result_cache.hits == hits + 1
+
+def test_expired_entries_are_not_returned(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(result_cache.time, 'monotonic', lambda: now[0])
+
+    cache = ResultCache(max_entries=10, ttl_seconds=30.0)
+    cache.put('key', 'value')
+    now[0] += 29.0
+    assert cache.get('key') == (True, 'value')
+    now[0] += 2.0
+    assert cache.get('key') == (False, None)
+    assert cache.stats()['expirations'] == 1
+    assert cache.stats()['entries'] == 0
+
+def test_expired_engine_results_are_recomputed(data, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(result_cache.time, 'monotonic', lambda: now[0])
+
+    engine = make_engine(*data, cache_ttl=60.0)
+    engine.get_recommendations(1, 5)
+    now[0] += 61.0
+    hits, misses = engine.result_cache.hits, engine.result_cache.misses
+    engine.get_recommendations(1, 5)
+    assert (engine.result_cache.hits, engine.result_cache.misses) == (hits, misses + 1)
+    assert engine.result_cache.expirations == 1
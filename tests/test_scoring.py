@@ -0,0 +1,16 @@
+import pandas as pd
+
+from tests.conftest import NUM_USERS, make_engine
+
+def test_rowwise_and_vectorized_scoring_match(data):
+    engine = make_engine(*data, cache_size=0)
+    for user_id in range(1, NUM_USERS + 1):
+        for filters in (None, {'budget_range': (1, 3), 'climate': ['Tropical', 'Temperate']}):
+            vectorized = engine.get_recommendations(user_id, 10, scoring_mode='vectorized', filters=filters)
+            rowwise = engine.get_recommendations(user_id, 10, scoring_mode='rowwise', filters=filters)
+            pd.testing.assert_frame_equal(vectorized, rowwise, check_exact=True)
+
+def test_users_without_history_get_the_popular_destinations_in_both_modes(data):
+    engine = make_engine(*data, cache_size=0)
+    pd.testing.assert_frame_equal(engine.get_recommendations(NUM_USERS + 1, 5, scoring_mode='vectorized'),
+                                  engine.get_recommendations(NUM_USERS + 1, 5, scoring_mode='rowwise'))
@@ -0,0 +1,80 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import make_destinations
+from tests.conftest import NUM_DESTINATIONS, make_engine
+from utils.retrieval import IVFRetrieval
+
+WEIGHTS = {'activities': 0.1, 'climate': 0.1, 'type': 0.1, 'budget': 0.2, 'popularity': 0.5}
+
+def test_similarity_index_is_kept_per_weights(data, tmp_path):
+    path = str(tmp_path / 'similarity_index.npz')
+    engine = make_engine(*data, similarity_index_path=path)
+    engine._persist_similarity_index = True         # set by initialize() from files only
+    default = engine.get_similar_destinations(5, 3)
+    default_index = engine.similarity_index
+    saved = os.stat(path).st_mtime_ns
+
+    engine.set_scoring_weights(WEIGHTS)
+    reweighted = engine.get_similar_destinations(5, 3)
+    assert engine.similarity_index is not default_index
+    assert os.stat(path).st_mtime_ns == saved       # the file keeps the configured weights' index
+    pd.testing.assert_frame_equal(reweighted, make_engine(*data, scoring_weights=WEIGHTS).get_similar_destinations(5, 3))
+
+    engine.set_scoring_weights(None)
+    assert engine.similarity_index is default_index
+    pd.testing.assert_frame_equal(engine.get_similar_destinations(5, 3), default)
+
+def test_retrieval_is_built_once_per_weights(data):
+    engine = make_engine(*data, retrieval=IVFRetrieval(num_probe=2), cache_size=0)
+    default = engine.get_recommendations(1, 5)
+    default_retrieval = engine._retrieval_for(engine.scoring_plan)
+
+    engine.set_scoring_weights(WEIGHTS)
+    reweighted_retrieval = engine._retrieval_for(engine.scoring_plan)
+    assert reweighted_retrieval is not default_retrieval
+    expected = make_engine(*data, retrieval=IVFRetrieval(num_probe=2), scoring_weights=WEIGHTS)
+    pd.testing.assert_frame_equal(engine.get_recommendations(1, 5), expected.get_recommendations(1, 5))
+
+    engine.set_scoring_weights(None)
+    assert engine._retrieval_for(engine.scoring_plan) is default_retrieval
+    engine.set_scoring_weights(WEIGHTS)
+    assert engine._retrieval_for(engine.scoring_plan) is reweighted_retrieval
+    engine.set_scoring_weights(None)
+    pd.testing.assert_frame_equal(engine.get_recommendations(1, 5), default)
+
+def test_weights_switched_mid_request_dont_mix_plans(data):
+    engine = make_engine(*data)
+    expected = make_engine(*data).get_recommendations(1, 5)
+    create_user_profile = engine.create_user_profile
+
+    def switch_then_create(user_id):        # another thread switching while this request runs
+        engine.set_scoring_weights(WEIGHTS)
+        return create_user_profile(user_id)
+
+    engine.create_user_profile = switch_then_create
+    pd.testing.assert_frame_equal(engine.get_recommendations(1, 5), expected)
+
+    # cached under the weights it was scored with
+    engine.create_user_profile = create_user_profile
+    engine.set_scoring_weights(None)
+    hits = engine.result_cache.hits
+    pd.testing.assert_frame_equal(engine.get_recommendations(1, 5), expected)
+    assert engine.result_cache.hits == hits + 1
+
+def test_update_destinations_publishes_a_new_plan(data):
+    destinations_df, user_history_df = data
+    engine = make_engine(destinations_df, user_history_df, scoring_weights=WEIGHTS)
+    plan = engine.scoring_plan
+    activity_weight, popularity_term = plan.activity_weight, plan.popularity_term
+
+    new = make_destinations(5, seed=9).assign(destination_id=np.arange(NUM_DESTINATIONS + 1, NUM_DESTINATIONS + 6))
+    engine.update_destinations(new)
+    assert engine.scoring_plan is not plan
+    assert engine.scoring_plan.weights == plan.weights
+    assert engine.similarity_calculator.plan is engine.scoring_plan
+    # the old plan still scores the catalog it was bound to, for requests that read it before the update
+    assert plan.activity_weight is activity_weight and plan.popularity_term is popularity_term
+    assert len(engine.scoring_plan.popularity_term) == NUM_DESTINATIONS + 5
@@ -0,0 +1,35 @@
+import asyncio
+import json
+
+import pytest
+
+from service import RecommendationService
+from tests.conftest import make_engine
+
+def dispatch(service, method, target, body=b''):
+    async def run():
+        service._state = asyncio.Condition()        # set by start() on the serving loop
+        return await service._dispatch(method, target, body)
+    return asyncio.run(run())
+
+@pytest.fixture
+def service(data):
+    service = RecommendationService(make_engine(*data), max_workers=1)
+    yield service
+    service.executor.shutdown()
+
+@pytest.mark.parametrize('body', [b'[1, 2, 3]', b'"rating"', b'4.5', b'null', b'{"user_id": 1}', b'{"user_id": 1,'])
+def test_malformed_ratings_are_rejected(service, body):
+    status, response = dispatch(service, 'POST', '/ratings', body)
+    assert status == 400
+    assert 'JSON object' in response['error']
+
+def test_rating_is_recorded(service):
+    body = json.dumps({'user_id': 1, 'destination_id': 5, 'rating': 4.0, 'visit_date': '2024-05-01'}).encode()
+    assert dispatch(service, 'POST', '/ratings', body) == (201, {'status': 'ok'})
+    history = service.engine.data_handler.user_history_df
+    assert history.iloc[-1][['user_id', 'destination_id', 'rating', 'visit_date']].tolist() == [1, 5, 4.0, '2024-05-01']
+
+@pytest.mark.parametrize('target', ['/recommendations?user_id=1&k=0', '/similar?destination_id=1&k=-2'])
+def test_k_below_one_is_rejected(service, target):
+    assert dispatch(service, 'GET', target)[0] == 400
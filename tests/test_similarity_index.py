@@ -0,0 +1,34 @@
+import numpy as np
+
+from benchmarks.synthetic import make_destinations
+from tests.conftest import NUM_DESTINATIONS, make_engine
+from utils.similarity_index import SimilarityIndex
+
+def changed_destinations(destinations_df):
+    """
+        A few edited destinations and a few new ones
+    """
+    edited = destinations_df.iloc[[0, 17, 250]].copy()
+    edited['popularity_score'] = [9.9, 0.1, 5.0]
+    edited['activities'] = ['Hiking,Beach', edited['activities'].iloc[1], 'Museum']
+    edited.loc[edited.index[1], 'climate'] = 'Desert'
+    new = make_destinations(5, seed=9).assign(destination_id=np.arange(NUM_DESTINATIONS + 1, NUM_DESTINATIONS + 6))
+    return edited, new
+
+def test_update_matches_a_fresh_build(data):
+    destinations_df, user_history_df = data
+    engine = make_engine(destinations_df, user_history_df, cache_size=0)
+    engine.get_similar_destinations(1, 3)         # builds the index
+    index = engine.similarity_index
+
+    for changes in changed_destinations(destinations_df):
+        engine.update_destinations(changes)
+    assert engine.similarity_index is index       # updated in place, not rebuilt
+
+    fresh = SimilarityIndex(index.num_neighbors, index.weights).build(engine.data_handler.destinations_df)
+    np.testing.assert_array_equal(index.destination_ids, fresh.destination_ids)
+    for destination_id in fresh.destination_ids.tolist():
+        updated_ids, updated_scores = index.lookup(destination_id, index.num_neighbors)
+        fresh_ids, fresh_scores = fresh.lookup(destination_id, index.num_neighbors)
+        np.testing.assert_array_equal(updated_scores, fresh_scores)
+        np.testing.assert_array_equal(updated_ids, fresh_ids)
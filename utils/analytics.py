@@ -0,0 +1,198 @@
+import numpy as np
+import pandas as pd
+
+class AnalyticsCubes:
+    """
+        Pre-aggregated counts behind the Explore and Travel History charts
+
+        Destinations are counted in a cube over (country, type, climate, budget level,
+        popularity bin), so the charts for any combination of the Explore filters are sums
+        over a few slices of it. Visits of catalog destinations are folded in as they come
+        (build, add_ratings per rating or per streamed chunk, like the profile store): rating
+        sums and counts per type, visits per climate and per (budget level, rating), each
+        per user and in total. Reading a chart costs the number of distinct values, not the
+        number of destinations or visits.
+
+        Slot 0 of the country / type / climate axes counts rows where the value is missing.
+        The destination cube follows the catalog: it is rebuilt (one bincount) with it.
+    """
+    POPULARITY_BINS = 10        # popularity 0-10 in steps of 1 (10 falls in the last bin)
+    RATING_BINS = 6             # ratings rounded half up to 0..5
+
+    def __init__(self):
+        self.countries, self.types, self.climates = [], [], []
+        self.budget_levels = np.array([])
+        self.destination_counts = None      # (countries + 1, types + 1, climates + 1, budget levels, popularity bins)
+        self.user_index = {}                # user_id -> row of the per-user arrays
+        self.type_rating_sums = None        # (users, types + 1) sum of the ratings per user and type
+        self.type_visits = None             # (users, types + 1) number of ratings per user and type
+        self.climate_visits = None          # (users, climates + 1)
+        self.budget_rating_visits = None    # (users, budget levels, rating bins)
+        self.total_type_rating_sums = None  # (types + 1,) the per-user arrays summed over the users
+        self.total_type_visits = None
+        self.total_climate_visits = None
+        self.total_budget_rating_visits = None
+        self._catalog = None
+        self._row_types = self._row_climates = self._row_budgets = None
+
+    def build(self, catalog, user_history_df):
+        """
+            Full build from the catalog and the history (later ratings go through add_ratings)
+        """
+        self.countries, self.types, self.climates = catalog.country_values, catalog.type_values, catalog.climate_values
+        self.budget_levels = np.unique(catalog.budget_level)
+        self.set_catalog(catalog)
+
+        popularity = np.nan_to_num(catalog.popularity_score)
+        popularity_bins = np.clip(np.floor(popularity), 0, self.POPULARITY_BINS - 1).astype(np.int64)
+        shape = (len(self.countries) + 1, len(self.types) + 1, len(self.climates) + 1, len(self.budget_levels),
+                 self.POPULARITY_BINS)
+        cells = np.ravel_multi_index((catalog.country_codes.astype(np.int64) + 1, self._row_types, self._row_climates,
+                                      self._row_budgets, popularity_bins), shape)
+        self.destination_counts = np.bincount(cells, minlength=int(np.prod(shape))).reshape(shape)
+
+        self.user_index = {}
+        self.type_rating_sums = np.zeros((0, len(self.types) + 1))
+        self.type_visits = np.zeros((0, len(self.types) + 1), dtype=np.int64)
+        self.climate_visits = np.zeros((0, len(self.climates) + 1), dtype=np.int64)
+        self.budget_rating_visits = np.zeros((0, len(self.budget_levels), self.RATING_BINS), dtype=np.int64)
+        self.total_type_rating_sums = np.zeros(len(self.types) + 1)
+        self.total_type_visits = np.zeros(len(self.types) + 1, dtype=np.int64)
+        self.total_climate_visits = np.zeros(len(self.climates) + 1, dtype=np.int64)
+        self.total_budget_rating_visits = np.zeros((len(self.budget_levels), self.RATING_BINS), dtype=np.int64)
+        self.add_ratings(user_history_df['user_id'].to_numpy(), user_history_df['destination_id'].to_numpy(),
+                         user_history_df['rating'].to_numpy())
+        return self
+
+    def set_catalog(self, catalog):
+        """
+            Slots of every catalog row (after build and after unpickling, they aren't pickled)
+        """
+        self._catalog = catalog
+        self._row_types = catalog.type_codes.astype(np.int32) + 1
+        self._row_climates = catalog.climate_codes.astype(np.int32) + 1
+        self._row_budgets = np.searchsorted(self.budget_levels, catalog.budget_level).astype(np.int32)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.update(_catalog=None, _row_types=None, _row_climates=None, _row_budgets=None)
+        return state
+
+    def add_ratings(self, user_ids, destination_ids, ratings):
+        """
+            Fold ratings into the visit aggregates (destinations outside the catalog are skipped)
+        """
+        rows = self._catalog.rows_of(destination_ids)
+        in_catalog = rows >= 0
+        rows = rows[in_catalog]
+        ratings = np.asarray(ratings, dtype=np.float64)[in_catalog]
+        users = self._user_rows(np.asarray(user_ids)[in_catalog])
+
+        types = self._row_types[rows]
+        np.add.at(self.type_rating_sums, (users, types), ratings)
+        np.add.at(self.type_visits, (users, types), 1)
+        self.total_type_rating_sums += np.bincount(types, weights=ratings, minlength=len(self.types) + 1)
+        self.total_type_visits += np.bincount(types, minlength=len(self.types) + 1)
+
+        climates = self._row_climates[rows]
+        np.add.at(self.climate_visits, (users, climates), 1)
+        self.total_climate_visits += np.bincount(climates, minlength=len(self.climates) + 1)
+
+        budgets = self._row_budgets[rows]
+        rating_bins = np.clip(np.floor(ratings + 0.5), 0, self.RATING_BINS - 1).astype(np.int64)
+        np.add.at(self.budget_rating_visits, (users, budgets, rating_bins), 1)
+        cells = budgets * self.RATING_BINS + rating_bins
+        self.total_budget_rating_visits += np.bincount(cells, minlength=self.total_budget_rating_visits.size).reshape(
+            self.total_budget_rating_visits.shape)
+
+    def destination_summary(self, countries=None, types=None, climates=None):
+        """
+            Charts of the destinations matching the Explore filters (empty / None -> any value)
+
+            Returns (destinations per type, most first; budget level x popularity bin counts)
+        """
+        cube = self.destination_counts
+        if countries:
+            cube = np.take(cube, self._codes(self.countries, countries), axis=0)
+        if climates:
+            cube = np.take(cube, self._codes(self.climates, climates), axis=2)
+        by_type = cube.sum(axis=(0, 2))         # (types + 1, budget levels, popularity bins)
+        if types:
+            by_type = by_type * np.isin(np.arange(len(by_type)), self._codes(self.types, types))[:, None, None]
+
+        type_counts = pd.Series(by_type.sum(axis=(1, 2))[1:], index=self.types, name='count')
+        type_counts = type_counts[type_counts > 0].sort_values(ascending=False, kind='stable')
+        budget_popularity = pd.DataFrame(by_type.sum(axis=0), index=self.budget_levels,
+                                         columns=self._popularity_labels())
+        return type_counts, budget_popularity
+
+    def visit_summary(self, user_id=None):
+        """
+            Travel History figures for one user's visits (None -> every visit)
+
+            Returns {'visits', 'average_rating', 'favorite_type', 'type_ratings' (average per type,
+            best first), 'climate_visits', 'budget_ratings' (budget level x rating counts)}, all
+            of them over the same visits
+        """
+        if user_id is None:
+            sums, visits = self.total_type_rating_sums, self.total_type_visits
+            climates, budget_ratings = self.total_climate_visits, self.total_budget_rating_visits
+        elif user_id in self.user_index:
+            row = self.user_index[user_id]
+            sums, visits = self.type_rating_sums[row], self.type_visits[row]
+            climates, budget_ratings = self.climate_visits[row], self.budget_rating_visits[row]
+        else:
+            sums, visits = np.zeros(len(self.types) + 1), np.zeros(len(self.types) + 1, dtype=np.int64)
+            climates = np.zeros(len(self.climates) + 1, dtype=np.int64)
+            budget_ratings = np.zeros((len(self.budget_levels), self.RATING_BINS), dtype=np.int64)
+
+        rated = visits[1:] > 0
+        type_ratings = pd.Series(sums[1:][rated] / visits[1:][rated], index=np.array(self.types, dtype=object)[rated])
+        climate_visits = pd.Series(climates[1:], index=self.climates)
+        return {
+            'visits': int(visits.sum()),
+            'average_rating': sums.sum() / visits.sum() if visits.sum() > 0 else float('nan'),
+            'favorite_type': self.types[int(np.argmax(visits[1:]))] if rated.any() else None,    # first of the ties, like mode()
+            'type_ratings': type_ratings.sort_values(ascending=False, kind='stable'),
+            'climate_visits': climate_visits[climate_visits > 0].sort_values(ascending=False, kind='stable'),
+            'budget_ratings': pd.DataFrame(budget_ratings, index=self.budget_levels,
+                                           columns=np.arange(self.RATING_BINS))
+        }
+
+    def _user_rows(self, user_ids):
+        """
+            Row of every user in the per-user arrays, new users get rows appended
+        """
+        codes, users = pd.factorize(user_ids)
+        rows = np.empty(len(users), dtype=np.int64)
+        for code, user_id in enumerate(users.tolist()):
+            row = self.user_index.get(user_id)
+            if row is None:
+                row = self.user_index[user_id] = len(self.user_index)
+            rows[code] = row
+
+        if len(self.user_index) > len(self.type_visits):     # grow by doubling, appends stay amortized O(1)
+            capacity = max(len(self.user_index), 2 * len(self.type_visits))
+            self.type_rating_sums = self._grow(self.type_rating_sums, capacity)
+            self.type_visits = self._grow(self.type_visits, capacity)
+            self.climate_visits = self._grow(self.climate_visits, capacity)
+            self.budget_rating_visits = self._grow(self.budget_rating_visits, capacity)
+        return rows[codes]
+
+    @staticmethod
+    def _grow(per_user, capacity):
+        """
+            per_user with zero rows appended up to capacity rows
+        """
+        return np.concatenate([per_user, np.zeros((capacity - len(per_user),) + per_user.shape[1:], dtype=per_user.dtype)])
+
+    @staticmethod
+    def _codes(values, selected):
+        """
+            Cube slots of the selected values (values unknown to the catalog select nothing)
+        """
+        slot = {value: code + 1 for code, value in enumerate(values)}
+        return np.array([slot[value] for value in selected if value in slot], dtype=np.int64)
+
+    def _popularity_labels(self):
+        return [f'{low}-{low + 1}' for low in range(self.POPULARITY_BINS)]
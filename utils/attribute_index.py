@@ -0,0 +1,178 @@
+import numpy as np
+import pandas as pd
+
+from utils.catalog import _small_codes
+
+class AttributeIndex:
+    """
+        Inverted index over catalog rows
+
+        Every attribute value (climate, type, country, budget_level, activity) has a sorted
+        array of the rows that have it, every user a sorted array of visited rows. Candidate
+        sets are built as a bitmap over the catalog: union within an attribute, intersection
+        across attributes, minus the user's visited rows.
+    """
+    ATTRIBUTES = ['climate', 'type', 'country', 'budget_level']
+
+    def __init__(self):
+        self.num_rows = 0
+        self.postings = {}          # attribute -> {value: sorted row positions}
+        self.row_codes = {}         # attribute -> (N,) code of each row's value (-1 missing), single-valued ones
+        self.value_codes = {}       # attribute -> {value: code}
+        self.visited = {}           # user_id -> sorted row positions
+        self._catalog = None
+
+    def build(self, destinations_df, user_history_df, catalog):
+        """
+            Full build, rows are the catalog's (ids are looked up through the catalog)
+        """
+        self.num_rows = len(destinations_df)
+        self.set_catalog(catalog)
+        self.postings = {
+            attribute: self._group_rows(destinations_df[attribute].to_numpy(), np.arange(self.num_rows))
+            for attribute in self.ATTRIBUTES
+        }
+        for attribute in self.ATTRIBUTES:
+            codes, values = pd.factorize(destinations_df[attribute].to_numpy())
+            self.row_codes[attribute] = _small_codes(codes, len(values))
+            self.value_codes[attribute] = {value: code for code, value in enumerate(values.tolist())}
+
+        activities = destinations_df['activities'].reset_index(drop=True).str.split(',').explode().dropna()
+        self.postings['activities'] = self._group_rows(activities.to_numpy(), activities.index.to_numpy())
+
+        # visited rows per user, grouped once
+        positions = catalog.rows_of(user_history_df['destination_id'].to_numpy())
+        in_catalog = positions >= 0
+        self.visited = self._group_rows(user_history_df['user_id'].to_numpy()[in_catalog], positions[in_catalog])
+        return self
+
+    def set_catalog(self, catalog):
+        """
+            Look ids up in the catalog (after build and after unpickling, it isn't pickled)
+        """
+        self._catalog = catalog
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_catalog'] = None
+        return state
+
+    def mark_visited(self, user_id, destination_id):
+        row = self._catalog.row_of(destination_id)
+        if row is None:
+            return
+        visited = self.visited.get(user_id, np.array([], dtype=np.int64))
+        self.visited[user_id] = np.union1d(visited, [row])
+
+    def add_visits(self, user_ids, destination_ids):
+        """
+            mark_visited for a whole chunk of history, grouped per user
+        """
+        positions = self._catalog.rows_of(destination_ids)
+        in_catalog = positions >= 0
+        user_ids = np.asarray(user_ids)[in_catalog]
+        for user_id, rows in self._group_rows(user_ids, positions[in_catalog]).items():
+            visited = self.visited.get(user_id)
+            self.visited[user_id] = np.unique(rows) if visited is None else np.union1d(visited, rows)
+
+    def values(self, attribute):
+        """
+            Distinct values of an attribute, sorted
+        """
+        return sorted(self.postings[attribute])
+
+    def bitmap(self, attribute, values):
+        """
+            Boolean mask of the rows having any of the values
+        """
+        mask = np.zeros(self.num_rows, dtype=bool)
+        postings = self.postings[attribute]
+        for value in values:
+            if value in postings:
+                mask[postings[value]] = True
+        return mask
+
+    def visited_bitmap(self, user_id):
+        mask = np.zeros(self.num_rows, dtype=bool)
+        mask[self.visited.get(user_id, [])] = True
+        return mask
+
+    def candidates(self, filters=None, user_id=None, ranges=None):
+        """
+            Sorted row positions matching the filters and not visited by user_id
+
+            filters maps an attribute ('climate', 'type', 'country', 'budget_level' or
+            'activities') to the accepted values; empty / None values mean no constraint.
+            ranges maps an attribute to an inclusive (low, high) range of values
+        """
+        mask = np.ones(self.num_rows, dtype=bool)
+        for attribute, values in (filters or {}).items():
+            if values is None or len(values) == 0:
+                continue
+            mask &= self.bitmap(attribute, values)
+
+        for attribute, (low, high) in (ranges or {}).items():
+            mask &= self.bitmap(attribute, [value for value in self.postings[attribute] if low <= value <= high])
+
+        if user_id is not None:
+            mask[self.visited.get(user_id, [])] = False
+        return np.flatnonzero(mask)
+
+    def contains(self, rows, filters=None, user_id=None, ranges=None):
+        """
+            Boolean mask over 'rows': which of them candidates() would return
+
+            Only the given rows are checked (a code lookup per row for climate / type / country /
+            budget_level, binary search in the postings for activities and visited rows), so
+            testing a few rows (eg. the probed lists of a retrieval backend) costs no pass over
+            the catalog
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        keep = np.ones(len(rows), dtype=bool)
+        for attribute, values in (filters or {}).items():
+            if values is None or len(values) == 0:
+                continue
+            keep &= self._has_value(rows, attribute, values)
+
+        for attribute, (low, high) in (ranges or {}).items():
+            keep &= self._has_value(rows, attribute, [value for value in self.postings[attribute] if low <= value <= high])
+
+        if user_id is not None and user_id in self.visited:
+            keep &= ~self._in_sorted(rows, self.visited[user_id])
+        return keep
+
+    def _has_value(self, rows, attribute, values):
+        """
+            Mask of the rows having any of the values (bitmap() restricted to 'rows')
+        """
+        if attribute in self.row_codes:
+            value_codes = self.value_codes[attribute]
+            accepted = np.zeros(len(value_codes) + 1, dtype=bool)       # last slot is code -1 (missing)
+            accepted[[value_codes[value] for value in values if value in value_codes]] = True
+            return accepted[self.row_codes[attribute][rows]]
+
+        found = np.zeros(len(rows), dtype=bool)
+        postings = self.postings[attribute]
+        for value in values:
+            if value in postings:
+                found |= self._in_sorted(rows, postings[value])
+        return found
+
+    @staticmethod
+    def _in_sorted(rows, sorted_rows):
+        if len(sorted_rows) == 0:
+            return np.zeros(len(rows), dtype=bool)
+        positions = np.minimum(np.searchsorted(sorted_rows, rows), len(sorted_rows) - 1)
+        return sorted_rows[positions] == rows
+
+    @staticmethod
+    def _group_rows(keys, rows):
+        """
+            {key: sorted rows} with one sort instead of a mask per key (missing keys are skipped)
+        """
+        codes, uniques = pd.factorize(keys)
+        order = np.lexsort((rows, codes))
+        codes, rows = codes[order], rows[order]
+        rows = rows[codes >= 0]
+        counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+        return dict(zip(uniques.tolist(), np.split(rows.astype(np.int64), np.cumsum(counts)[:-1])))
@@ -0,0 +1,170 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import scipy.sparse as sp
+
+from utils.collaborative import predicted_scores
+from utils.similarity_calculator import top_k_indices
+
+_worker_arrays = {}     # destination arrays of a pool worker process (set once by init_worker)
+
+def destination_matrix(scoring_arrays, num_columns, activities_only=False):
+    """
+        Sparse destinations x features matrix in the layout of the user profile vector
+
+        Activities are counted (a duplicated activity counts twice like in the rowwise loop),
+        climate / type are one-hot and the budget / popularity slots hold the raw values
+    """
+    activity_codes = scoring_arrays['activity_codes']
+    num_destinations, width = activity_codes.shape
+    destination_rows = np.arange(num_destinations)
+    budget_column, popularity_column = scoring_arrays['numeric_columns']
+
+    rows = [np.repeat(destination_rows, width)]
+    columns = [activity_codes.ravel()]
+    values = [np.ones(num_destinations * width)]
+    if not activities_only:
+        rows += [destination_rows] * 4
+        columns += [
+            scoring_arrays['climate_codes'],
+            scoring_arrays['type_codes'],
+            np.full(num_destinations, budget_column),
+            np.full(num_destinations, popularity_column)
+        ]
+        values += [
+            np.ones(num_destinations),
+            np.ones(num_destinations),
+            scoring_arrays['budget_level'],
+            scoring_arrays['popularity_score']
+        ]
+
+    rows, columns, values = np.concatenate(rows), np.concatenate(columns), np.concatenate(values)
+    keep = columns != num_columns       # padding slot never contributes
+    return sp.csr_matrix((values[keep], (rows[keep], columns[keep])), shape=(num_destinations, num_columns + 1))
+
+def build_profile_matrix(user_history_df, user_ids, catalog, destinations):
+    """
+        All user profiles at once as a sparse users x features matrix
+
+        The history is grouped once: every visit becomes a rating / total_rating weight
+        in a users x destinations matrix which is multiplied with the destination matrix
+
+        Returns (profiles, visited, has_profile)
+    """
+    user_row = {user_id: row for row, user_id in enumerate(user_ids)}
+    history = user_history_df[user_history_df['user_id'].isin(user_row)]
+    positions = catalog.rows_of(history['destination_id'].to_numpy())
+    history, positions = history[positions >= 0], positions[positions >= 0]
+
+    users = history['user_id'].map(user_row).to_numpy(dtype=np.int64)      # int even when no visit is left
+    ratings = history['rating'].to_numpy(dtype=np.float64)
+
+    # weights are normalized by each user's total rating, same as create_user_profile
+    totals = user_history_df[user_history_df['user_id'].isin(user_row)].groupby('user_id')['rating'].sum()
+    weights = ratings / history['user_id'].map(totals).to_numpy(dtype=np.float64)
+
+    shape = (len(user_ids), destinations.shape[0])
+    visit_weights = sp.csr_matrix((weights, (users, positions)), shape=shape)
+    visited = sp.csr_matrix((np.ones(len(users), dtype=bool), (users, positions)), shape=shape)
+
+    profiles = (visit_weights @ destinations).tocsr()
+    has_profile = np.bincount(users, minlength=len(user_ids)) > 0
+    return profiles, visited, has_profile
+
+def build_profile_matrix_from_store(profile_store, visited_rows, user_ids, column_index, num_destinations):
+    """
+        Same output as build_profile_matrix, from the running profiles of a UserProfileStore
+
+        Used when (part of) the history was streamed in and is not available as a dataframe,
+        visited_rows is AttributeIndex.visited (user_id -> catalog rows)
+    """
+    numeric_columns = {'avg_budget': column_index['budget_level'], 'avg_popularity': column_index['popularity_score']}
+    rows, columns, values = [], [], []
+    visited_users, visited_positions = [], []
+    has_profile = np.zeros(len(user_ids), dtype=bool)
+
+    for row, user_id in enumerate(user_ids):
+        profile = profile_store.get_profile(user_id)
+        if profile is None:
+            continue
+        has_profile[row] = True
+        for key, value in profile.items():
+            column = numeric_columns.get(key, column_index.get(key))
+            if column is not None:
+                rows.append(row)
+                columns.append(column)
+                values.append(value)
+        positions = visited_rows.get(user_id, [])
+        visited_users.append(np.full(len(positions), row))
+        visited_positions.append(positions)
+
+    profiles = sp.csr_matrix((values, (rows, columns)), shape=(len(user_ids), len(column_index) + 1))
+    visited_users = np.concatenate(visited_users) if visited_users else np.array([], dtype=np.int64)
+    visited_positions = np.concatenate(visited_positions) if visited_positions else np.array([], dtype=np.int64)
+    visited = sp.csr_matrix((np.ones(len(visited_users), dtype=bool), (visited_users, visited_positions)),
+                            shape=(len(user_ids), num_destinations))
+    return profiles, visited, has_profile
+
+def init_worker(scoring_arrays):
+    """
+        Pool initializer, the destination arrays are sent once per worker process
+    """
+    _worker_arrays.clear()
+    _worker_arrays.update(scoring_arrays)
+
+def score_chunk(task, arrays=None):
+    """
+        Score a chunk of users against every destination and keep each user's top-k
+
+        task is (profiles, visited, k, collaborative) for the chunk, collaborative being None or
+        the (vectors, offsets, known) of CollaborativeFilter.user_vectors. arrays are the
+        destination arrays, those of the pool worker when None. Returns (user_rows, positions,
+        scores) with user_rows relative to the chunk
+    """
+    profiles, visited, k, collaborative = task
+    arrays = _worker_arrays if arrays is None else arrays
+    scores = arrays['plan'].batch_scores(profiles.toarray(), arrays['activity_matrix'])
+    
+    if collaborative is not None:       # blended like RecommendationEngine._blend_collaborative
+        vectors, offsets, known = collaborative
+        blend = arrays['blend_weights']
+        collaborative_scores = predicted_scores(arrays['item_factors'], arrays['rating_range'], vectors, offsets)
+        blended = ((scores * blend['content'] + collaborative_scores * blend['collaborative'])
+                   / (blend['content'] + blend['collaborative']))
+        scores = np.where(known[:, None], blended, scores)
+
+    visited_rows, visited_positions = visited.nonzero()
+    scores[visited_rows, visited_positions] = -np.inf
+
+    user_rows, positions, top_scores = [], [], []
+    for row in range(scores.shape[0]):
+        top = top_k_indices(scores[row], k)
+        top = top[np.isfinite(scores[row, top])]
+        user_rows.append(np.full(len(top), row))
+        positions.append(top)
+        top_scores.append(scores[row, top])
+
+    return np.concatenate(user_rows), np.concatenate(positions), np.concatenate(top_scores)
+
+def score_chunks(tasks, scoring_arrays, n_jobs=1):
+    """
+        Run score_chunk over the tasks in order, in this process or spread over a process pool
+
+        At most 2 chunks per worker are in flight so results stream out instead of piling up.
+        In this process the arrays are passed along with every chunk, so generators of other
+        engines / plans can run interleaved
+    """
+    if n_jobs == 1:
+        for task in tasks:
+            yield score_chunk(task, scoring_arrays)
+        return
+
+    with ProcessPoolExecutor(max_workers=n_jobs, initializer=init_worker, initargs=(scoring_arrays,)) as pool:
+        pending = deque()
+        for task in tasks:
+            pending.append(pool.submit(score_chunk, task))
+            if len(pending) >= 2 * n_jobs:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
@@ -0,0 +1,252 @@
+import sys
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+def _small_codes(codes, num_values):
+    """
+        Category codes in the smallest signed integer type that holds them (-1 = missing)
+    """
+    dtype = np.int8 if num_values < 2 ** 7 else np.int16 if num_values < 2 ** 15 else np.int32
+    return codes.astype(dtype)
+
+def _decode(values, code):
+    return values[code] if code >= 0 else np.nan
+
+class DestinationRecord:
+    """
+        Read-only view of one catalog row, decoded on access
+
+        Behaves like the row dicts the scoring functions were written for (record['climate'],
+        'activities_list' in record), so _calculate_destination_similarity and
+        weighted_feature_similarity take it as is
+    """
+    __slots__ = ('catalog', 'row')
+
+    KEYS = ('destination_id', 'name', 'country', 'type', 'activities', 'climate', 'budget_level',
+            'popularity_score', 'activities_list')
+
+    def __init__(self, catalog, row):
+        self.catalog = catalog
+        self.row = row
+
+    @property
+    def destination_id(self):
+        return int(self.catalog.destination_ids[self.row])
+
+    @property
+    def name(self):
+        return self.catalog.names[self.row]
+
+    @property
+    def country(self):
+        return _decode(self.catalog.country_values, self.catalog.country_codes[self.row])
+
+    @property
+    def type(self):
+        return _decode(self.catalog.type_values, self.catalog.type_codes[self.row])
+
+    @property
+    def climate(self):
+        return _decode(self.catalog.climate_values, self.catalog.climate_codes[self.row])
+
+    @property
+    def activities_list(self):
+        catalog = self.catalog
+        codes = catalog.activity_codes[catalog.activity_offsets[self.row]:catalog.activity_offsets[self.row + 1]]
+        return [catalog.activity_values[code] for code in codes.tolist()]
+
+    @property
+    def activities(self):
+        return ','.join(self.activities_list)
+
+    @property
+    def budget_level(self):
+        return self.catalog.budget_level[self.row].item()
+
+    @property
+    def popularity_score(self):
+        return float(self.catalog.popularity_score[self.row])
+
+    def keys(self):
+        return self.KEYS
+
+    def __contains__(self, key):
+        return key in self.KEYS
+
+    def __getitem__(self, key):
+        if key not in self.KEYS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def to_dict(self):
+        return {key: self[key] for key in self.KEYS}
+
+    def __repr__(self):
+        return f"DestinationRecord({self.destination_id}, {self.name!r})"
+
+class Catalog:
+    """
+        Integer-coded destinations: what the scoring paths need, without per-row Python objects
+
+        Activities, climate, type and country are interned: every distinct string is stored
+        once in *_values and rows hold small integer codes. Activities of row i are
+        activity_codes[activity_offsets[i]:activity_offsets[i + 1]] (CSR layout, original
+        order and duplicates kept). Budget and popularity are typed numpy arrays. Display
+        names are the DataFrame's own name column (not copied). Ids are looked up with a
+        binary search over the sorted ids (rows_of / row_of). record(i) gives a __slots__
+        view of one row.
+    """
+    def __init__(self, destination_ids, names, activity_offsets, activity_codes, activity_values,
+                 climate_codes, climate_values, type_codes, type_values, country_codes, country_values,
+                 budget_level, popularity_score):
+        self.destination_ids = destination_ids      # (N,) int64
+        self.names = names                          # (N,) the DataFrame's name column (its .array, shared)
+        self.activity_offsets = activity_offsets    # (N + 1,) int64
+        self.activity_codes = activity_codes        # (total activities,) int32
+        self.activity_values = activity_values      # code -> activity
+        self.climate_codes = climate_codes          # (N,) int8 / int16 / int32, -1 when missing
+        self.climate_values = climate_values
+        self.type_codes = type_codes
+        self.type_values = type_values
+        self.country_codes = country_codes
+        self.country_values = country_values
+        self.budget_level = budget_level            # (N,) int8 for whole levels, float64 otherwise
+        self.popularity_score = popularity_score    # (N,) float64 (float32 would change the scores)
+        order = np.argsort(destination_ids, kind='stable')
+        self._sorted_ids = destination_ids[order]               # (N,) int64, ids in ascending order
+        self._sorted_rows = order.astype(np.int32 if len(order) < 2 ** 31 else np.int64)     # row of each sorted id
+
+    @classmethod
+    def from_dataframe(cls, destinations_df):
+        """
+            Encode a destinations dataframe (comma separated activities, as in the excel file)
+        """
+        activity_lists = destinations_df['activities'].str.split(',').tolist()      # transient, only the codes are kept
+        lengths = np.array([len(activities) if isinstance(activities, list) else 0 for activities in activity_lists],
+                           dtype=np.int64)
+        flat = [activity for activities in activity_lists if isinstance(activities, list) for activity in activities]
+        activity_codes, activity_values = pd.factorize(pd.Series(flat, dtype=object), sort=True)
+
+        categories = {}
+        for column in ('climate', 'type', 'country'):
+            codes, values = pd.factorize(destinations_df[column], sort=True)
+            categories[column] = (_small_codes(codes, len(values)), values.tolist())
+
+        budget_level = destinations_df['budget_level'].to_numpy()
+        whole_levels = np.issubdtype(budget_level.dtype, np.integer) and (
+            len(budget_level) == 0 or (budget_level.min() >= -128 and budget_level.max() < 128)
+        )
+        return cls(
+            destination_ids=destinations_df['destination_id'].to_numpy(dtype=np.int64),
+            names=destinations_df['name'].array,
+            activity_offsets=np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64),
+            activity_codes=activity_codes.astype(np.int32),
+            activity_values=activity_values.tolist(),
+            climate_codes=categories['climate'][0], climate_values=categories['climate'][1],
+            type_codes=categories['type'][0], type_values=categories['type'][1],
+            country_codes=categories['country'][0], country_values=categories['country'][1],
+            budget_level=budget_level.astype(np.int8) if whole_levels else budget_level.astype(np.float64),
+            popularity_score=destinations_df['popularity_score'].to_numpy(dtype=np.float64)
+        )
+
+    ARRAYS = ('destination_ids', 'activity_offsets', 'activity_codes', 'climate_codes', 'type_codes',
+              'country_codes', 'budget_level', 'popularity_score')
+    VALUES = ('activity_values', 'climate_values', 'type_values', 'country_values')
+    
+    def to_arrays(self):
+        """
+            (numeric arrays, vocabularies) for writing to disk, names are left out (see from_arrays)
+        """
+        return ({name: getattr(self, name) for name in self.ARRAYS},
+                {name: list(getattr(self, name)) for name in self.VALUES})
+    
+    @classmethod
+    def from_arrays(cls, arrays, values, names):
+        """
+            Inverse of to_arrays, the arrays are used as given (eg. memory-mapped)
+        """
+        return cls(names=names, **{name: arrays[name] for name in cls.ARRAYS},
+                   **{name: values[name] for name in cls.VALUES})
+    
+    def __len__(self):
+        return len(self.destination_ids)
+
+    def rows_of(self, destination_ids):
+        """
+            Catalog rows of an array of destination ids, -1 for ids that aren't in the catalog
+
+            The last row wins for a duplicated id
+        """
+        ids = np.asarray(destination_ids)
+        if ids.dtype == object:
+            ids = ids.astype(np.float64)
+        if len(self._sorted_ids) == 0:
+            return np.full(ids.shape, -1, dtype=np.int64)
+        positions = np.searchsorted(self._sorted_ids, ids, side='right') - 1
+        found = (positions >= 0) & (self._sorted_ids[np.maximum(positions, 0)] == ids)
+        return np.where(found, self._sorted_rows[np.maximum(positions, 0)], -1).astype(np.int64)
+
+    def row_of(self, destination_id):
+        """
+            Catalog row of one destination id, None if it isn't in the catalog
+        """
+        row = self.rows_of([destination_id])[0]
+        return int(row) if row >= 0 else None
+
+    def record(self, row):
+        return DestinationRecord(self, row)
+
+    def records(self, rows=None):
+        for row in (range(len(self)) if rows is None else rows):
+            yield DestinationRecord(self, int(row))
+
+    @property
+    def activity_counts(self):
+        return np.diff(self.activity_offsets)
+
+    def padded_activities(self, fill):
+        """
+            (N, longest list) activity codes, each row in its original order, padded with fill
+        """
+        counts = self.activity_counts
+        padded = np.full((len(self), max(counts.max(initial=0), 1)), fill, dtype=np.int64)
+        rows = np.repeat(np.arange(len(self)), counts)
+        slots = np.arange(len(self.activity_codes)) - np.repeat(self.activity_offsets[:-1], counts)
+        padded[rows, slots] = self.activity_codes
+        return padded
+
+    def activity_matrix(self, binary=False):
+        """
+            CSR (N x activities) of activity counts, or of presence with binary=True (set semantics)
+        """
+        matrix = sp.csr_matrix(
+            (np.ones(len(self.activity_codes), dtype=np.int64), self.activity_codes, self.activity_offsets),
+            shape=(len(self), len(self.activity_values)), copy=True       # the arrays may be read-only (mmap)
+        )
+        matrix.sum_duplicates()         # sorts in place
+        if binary:
+            matrix.data[:] = 1
+        return matrix
+
+    @staticmethod
+    def code_map(values, mapping, missing):
+        """
+            Array translating codes of 'values' through mapping, index -1 (missing code) -> missing
+        """
+        return np.array([mapping.get(value, missing) for value in values] + [missing], dtype=np.int64)
+
+    def memory_usage(self):
+        """
+            Bytes held by the catalog: the arrays, the id lookup and each distinct string once
+
+            The names are the DataFrame's column and are counted with the DataFrame
+        """
+        arrays = [self.destination_ids, self.activity_offsets, self.activity_codes, self.climate_codes,
+                  self.type_codes, self.country_codes, self.budget_level, self.popularity_score,
+                  self._sorted_ids, self._sorted_rows]
+        total = sum(array.nbytes for array in arrays)
+        for values in (self.activity_values, self.climate_values, self.type_values, self.country_values):
+            total += sum(sys.getsizeof(value) for value in values)
+        return total
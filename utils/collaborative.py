@@ -0,0 +1,230 @@
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+def predicted_scores(item_matrix, rating_range, vectors, offsets):
+    """
+        Predicted ratings rescaled to 0-1 over rating_range
+
+        One user (vectors (F + 1,), a scalar offset) -> (N,), several ((m, F + 1), (m,)) -> (m, N)
+    """
+    low, high = rating_range
+    predictions = vectors @ item_matrix.T + np.asarray(offsets)[..., None]
+    return np.clip((predictions - low) / (high - low if high > low else 1.0), 0.0, 1.0)
+
+class CollaborativeFilter:
+    """
+        Matrix factorization of the user x destination ratings (collaborative filtering)
+
+        rating ~ mean + user bias + destination bias + user factors . destination factors
+
+        Biases are regularized means, the factors are fitted on what the biases leave over,
+        with alternating least squares (method='als') or a truncated SVD of the sparse
+        residual matrix (method='svd'). Factors are stored as float32 with the destination
+        bias as an extra column, so scoring a user against the whole catalog is one
+        matrix-vector product. Scores are predicted ratings rescaled to 0-1 over the rating
+        range seen in fit, like the content similarity they are blended with.
+
+        A rating added after fit refits only that user's factors (fold-in, destination
+        factors fixed) until the next fit.
+    """
+    def __init__(self, num_factors=32, method='als', regularization=0.1, bias_regularization=5.0,
+                 num_iterations=10, chunk_size=65_536, seed=0):
+        if method not in ('als', 'svd'):
+            raise ValueError(f"Unknown method: {method}")
+        self.num_factors = num_factors
+        self.method = method
+        self.regularization = regularization            # per rating of the user / destination (ALS-WR)
+        self.bias_regularization = bias_regularization  # pseudo-ratings at the mean for the biases
+        self.num_iterations = num_iterations            # ALS sweeps (users, then destinations)
+        self.chunk_size = chunk_size                    # padded ratings per batched solve
+        self.seed = seed
+        self.item_matrix = None         # (N, F + 1) float32: destination factors, destination bias
+        self.user_matrix = None         # (U, F + 1) float32: user factors, 1
+        self.user_offsets = None        # (U,) float32: mean + user bias
+        self.user_index = {}            # user_id -> row of user_matrix
+        self.rating_range = (0.0, 1.0)
+        self._mean = 0.0
+        self._ratings = None            # (U, N) CSR of rating sums, duplicates kept as sum / count
+        self._counts = None
+        self._added = {}                # user_id -> {destination row: [sum, count]} since fit
+
+    def params(self):
+        return ('mf', self.method, self.num_factors, self.regularization, self.bias_regularization,
+                self.num_iterations, self.seed)
+
+    def fit(self, user_ids, destination_rows, ratings, num_destinations):
+        """
+            Fit on parallel arrays of ratings, destination_rows are catalog row positions
+        """
+        ratings = np.asarray(ratings, dtype=np.float64)
+        user_codes, users = pd.factorize(np.asarray(user_ids))
+        shape = (len(users), num_destinations)
+        self._ratings = sp.csr_matrix((ratings, (user_codes, destination_rows)), shape=shape)
+        self._counts = sp.csr_matrix((np.ones(len(ratings)), (user_codes, destination_rows)), shape=shape)
+        self._ratings.sum_duplicates()
+        self._counts.sum_duplicates()
+        self.user_index = {user_id: code for code, user_id in enumerate(users.tolist())}
+        self._added = {}
+
+        # one value per (user, destination): the mean of its ratings
+        user_rows = np.repeat(np.arange(shape[0]), np.diff(self._ratings.indptr))
+        item_rows = self._ratings.indices
+        values = self._ratings.data / self._counts.data
+        self._mean = values.mean() if len(values) else 0.0
+        self.rating_range = (float(values.min()), float(values.max())) if len(values) else (0.0, 1.0)
+
+        user_bias, item_bias = self._biases(user_rows, item_rows, values, shape)
+        residuals = sp.csr_matrix((values - self._mean - user_bias[user_rows] - item_bias[item_rows],
+                                   self._ratings.indices, self._ratings.indptr), shape=shape)
+        num_factors = max(min(self.num_factors, min(shape) - 1), 1)
+        if self.method == 'svd' and min(shape) > 1:
+            user_factors, item_factors = self._svd(residuals, num_factors)
+        else:
+            user_factors, item_factors = self._als(residuals, num_factors)
+
+        self.item_matrix = np.hstack([item_factors, item_bias[:, None]]).astype(np.float32)
+        self.user_matrix = np.hstack([user_factors, np.ones((shape[0], 1))]).astype(np.float32)
+        self.user_offsets = (self._mean + user_bias).astype(np.float32)
+        return self
+
+    def scores(self, user_id):
+        """
+            (N,) float32 scores in 0-1 for every destination, None for a user without ratings
+        """
+        vectors, offsets, known = self.user_vectors([user_id])
+        if not known[0]:
+            return None
+        return predicted_scores(self.item_matrix, self.rating_range, vectors[0], offsets[0])
+
+    def user_vectors(self, user_ids):
+        """
+            (vectors (m, F + 1), offsets (m,), known (m,) bool) of the given users
+        """
+        vectors = np.zeros((len(user_ids), self.item_matrix.shape[1]), dtype=np.float32)
+        offsets = np.zeros(len(user_ids), dtype=np.float32)
+        known = np.zeros(len(user_ids), dtype=bool)
+        for position, user_id in enumerate(user_ids):
+            code = self.user_index.get(user_id)
+            if code is not None:
+                vectors[position], offsets[position], known[position] = self.user_matrix[code], self.user_offsets[code], True
+        return vectors, offsets, known
+
+    def add_rating(self, user_id, destination_row, rating):
+        """
+            Record a rating and refit this user's factors against the fixed destination factors
+        """
+        added = self._added.setdefault(user_id, {})
+        entry = added.setdefault(destination_row, [0.0, 0])
+        entry[0] += rating
+        entry[1] += 1
+
+        # the user's ratings: fitted ones merged with the ones added since
+        sums, counts = {}, {}
+        for row, (total, count) in added.items():
+            sums[row], counts[row] = total, count
+        code = self.user_index.get(user_id)
+        if code is not None and code < self._ratings.shape[0]:
+            start, stop = self._ratings.indptr[code], self._ratings.indptr[code + 1]
+            for row, total, count in zip(self._ratings.indices[start:stop].tolist(),
+                                         self._ratings.data[start:stop].tolist(), self._counts.data[start:stop].tolist()):
+                sums[row] = sums.get(row, 0.0) + total
+                counts[row] = counts.get(row, 0) + count
+        rows = np.array(list(sums), dtype=np.int64)
+        values = np.array([sums[row] / counts[row] for row in rows.tolist()])
+
+        item_factors = self.item_matrix[rows, :-1].astype(np.float64)
+        item_bias = self.item_matrix[rows, -1].astype(np.float64)
+        user_bias = (values - self._mean - item_bias).sum() / (self.bias_regularization + len(rows))
+        residuals = values - self._mean - user_bias - item_bias
+        gram = item_factors.T @ item_factors + self.regularization * len(rows) * np.eye(item_factors.shape[1])
+        user_factors = np.linalg.solve(gram, item_factors.T @ residuals)
+
+        vector = np.append(user_factors, 1.0).astype(np.float32)
+        if code is None:
+            self.user_index[user_id] = code = len(self.user_matrix)
+            self.user_matrix = np.vstack([self.user_matrix, vector])
+            self.user_offsets = np.append(self.user_offsets, np.float32(self._mean + user_bias))
+        else:
+            self.user_matrix[code] = vector
+            self.user_offsets[code] = self._mean + user_bias
+
+    def _biases(self, user_rows, item_rows, values, shape):
+        """
+            Regularized user and destination biases, two alternating passes
+        """
+        user_bias = np.zeros(shape[0])
+        item_bias = np.zeros(shape[1])
+        item_counts = np.bincount(item_rows, minlength=shape[1]) + self.bias_regularization
+        user_counts = np.bincount(user_rows, minlength=shape[0]) + self.bias_regularization
+        for _ in range(2):
+            item_bias = np.bincount(item_rows, weights=values - self._mean - user_bias[user_rows],
+                                    minlength=shape[1]) / item_counts
+            user_bias = np.bincount(user_rows, weights=values - self._mean - item_bias[item_rows],
+                                    minlength=shape[0]) / user_counts
+        return user_bias, item_bias
+
+    def _svd(self, residuals, num_factors):
+        from scipy.sparse.linalg import svds       # deferred, ~50 ms to import and only the svd solver needs it
+        user_factors, singular_values, item_factors = svds(residuals, k=num_factors, random_state=self.seed)
+        scale = np.sqrt(singular_values)
+        return user_factors * scale, item_factors.T * scale
+
+    def _als(self, residuals, num_factors):
+        rng = np.random.default_rng(self.seed)
+        item_factors = rng.normal(0.0, 0.1, size=(residuals.shape[1], num_factors))
+        by_item = residuals.T.tocsr()
+        user_factors = np.zeros((residuals.shape[0], num_factors))
+        for _ in range(self.num_iterations):
+            user_factors = self._solve_rows(residuals, item_factors)
+            item_factors = self._solve_rows(by_item, user_factors)
+        return user_factors, item_factors
+
+    def _solve_rows(self, matrix, factors):
+        """
+            Ridge solution for every row of matrix against the fixed factors of its columns
+
+            Rows are taken in order of their number of ratings and solved in batches: each
+            batch's ratings are gathered into a zero-padded (rows, longest, F) block so the
+            normal equations are one batched matmul. Sorting keeps the padding small, a batch
+            holds about chunk_size padded ratings. Rows with fewer ratings than factors (most
+            users) solve the equivalent ratings x ratings system instead of factors x factors.
+            Rows without ratings get zero factors.
+        """
+        num_factors = factors.shape[1]
+        solution = np.zeros((matrix.shape[0], num_factors))
+        counts = np.diff(matrix.indptr)
+        order = np.argsort(counts, kind='stable')
+        order = order[counts[order] > 0]
+        sorted_counts = counts[order]
+
+        start = 0
+        while start < len(order):
+            # largest batch whose rows * longest row stays within chunk_size (at least one row)
+            window = sorted_counts[start:start + max(self.chunk_size // sorted_counts[start], 1)]
+            fits = np.arange(1, len(window) + 1) * window <= self.chunk_size
+            stop = start + max(int(np.argmin(fits)) if not fits.all() else len(window), 1)
+
+            rows = order[start:stop]
+            lengths = counts[rows]
+            batch_rows = np.repeat(np.arange(len(rows)), lengths)
+            slots = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+            entries = np.repeat(matrix.indptr[rows], lengths) + slots
+
+            block = np.zeros((len(rows), lengths.max(), num_factors))
+            block[batch_rows, slots] = factors[matrix.indices[entries]]
+            values = np.zeros((len(rows), lengths.max(), 1))
+            values[batch_rows, slots, 0] = matrix.data[entries]
+
+            transposed = block.transpose(0, 2, 1)
+            ridge = (self.regularization * lengths)[:, None, None]
+            if block.shape[1] < num_factors:
+                # fewer ratings than factors: the same solution from the smaller system
+                # (B^T B + c I)^-1 B^T v = B^T (B B^T + c I)^-1 v, padding solves to 0
+                gram = block @ transposed + ridge * np.eye(block.shape[1])
+                solution[rows] = (transposed @ np.linalg.solve(gram, values))[..., 0]
+            else:
+                gram = transposed @ block + ridge * np.eye(num_factors)
+                solution[rows] = np.linalg.solve(gram, transposed @ values)[..., 0]
+            start = stop
+        return solution
@@ -0,0 +1,117 @@
+import hashlib
+import json
+import os
+import tempfile
+
+import pandas as pd
+
+try:
+    import pyarrow.feather as feather
+except ImportError:         # no pyarrow -> always parse the source file
+    feather = None
+
+CACHE_DIR_NAME = '.cache'   # created next to the source file
+
+def read_table(source_path, use_cache=True):
+    """
+        Read an excel / csv file, going through a Feather copy of it when possible
+
+        The cache is keyed on the source file's mtime and size first, and on its sha256
+        when those changed (eg. a fresh checkout), so the source is only parsed again
+        when its content really changed. Reading the cache skips parsing: the Feather file
+        is memory-mapped while it is read, the returned dataframe is still a copy in memory.
+        A missing or unreadable meta file is a cache miss.
+    """
+    if not use_cache or feather is None:
+        return _read_source(source_path)
+
+    cache_path, meta_path = _cache_paths(source_path)
+    meta = _read_meta(meta_path)
+    stat = os.stat(source_path)
+
+    if meta is not None and os.path.exists(cache_path):
+        if meta['mtime_ns'] == stat.st_mtime_ns and meta['size'] == stat.st_size:
+            return _read_cache(cache_path)
+
+        if meta['sha256'] == _file_hash(source_path):
+            meta.update(mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+            _write_meta(meta_path, meta)
+            return _read_cache(cache_path)
+
+    return build_cache(source_path)
+
+def build_cache(source_path):
+    """
+        Parse the source file and (re)write its Feather cache, returns the dataframe
+    """
+    df = _read_source(source_path)
+    if feather is None:
+        raise ImportError("pyarrow is needed to write the data cache")
+
+    cache_path, meta_path = _cache_paths(source_path)
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    stat = os.stat(source_path)
+
+    # uncompressed so the file can be memory-mapped
+    _write_atomically(cache_path, lambda path: feather.write_feather(df, path, compression='uncompressed'))
+    _write_meta(meta_path, {
+        'source': os.path.basename(source_path),
+        'mtime_ns': stat.st_mtime_ns,
+        'size': stat.st_size,
+        'sha256': _file_hash(source_path)
+    })
+    return df
+
+def _read_source(source_path):
+    if source_path.endswith('.csv'):
+        return pd.read_csv(source_path)
+    return pd.read_excel(source_path)
+
+def _read_cache(cache_path):
+    return feather.read_table(cache_path, memory_map=True).to_pandas()
+
+def _cache_paths(source_path):
+    directory, name = os.path.split(source_path)
+    cache_path = os.path.join(directory, CACHE_DIR_NAME, name + '.feather')
+    return cache_path, cache_path + '.json'
+
+def _read_meta(meta_path):
+    """
+        The meta dict, None when it is missing or unreadable (eg. truncated) so the cache is rebuilt
+    """
+    try:
+        with open(meta_path) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(meta, dict) or not {'mtime_ns', 'size', 'sha256'} <= meta.keys():
+        return None
+    return meta
+
+def _write_meta(meta_path, meta):
+    def write(path):
+        with open(path, 'w') as f:
+            json.dump(meta, f, indent=2)
+    _write_atomically(meta_path, write)
+
+def _write_atomically(path, write):
+    """
+        write(temporary path) then swap it in, readers see the old file or the new one, never
+        a partial one. The temporary name is unique so concurrent builders don't collide
+    """
+    handle, temporary = tempfile.mkstemp(dir=os.path.dirname(path), prefix=os.path.basename(path) + '.', suffix='.tmp')
+    os.close(handle)
+    try:
+        write(temporary)
+        os.replace(temporary, path)
+    except BaseException:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        raise
+
+def _file_hash(path):
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha256.update(block)
+    return sha256.hexdigest()
@@ -0,0 +1,122 @@
+import gc
+import json
+import os
+import pickle
+import shutil
+
+import numpy as np
+
+from utils.data_cache import _file_hash
+
+FORMAT_VERSION = 7          # bump whenever the arrays, their dtypes or the meta / state layout change
+META_FILE = 'meta.json'
+STATE_FILE = 'state.pkl'
+
+class SnapshotError(ValueError):
+    """
+        The snapshot can't be used: missing, written by another format version, or built from other data
+    """
+
+def source_signature(paths):
+    """
+        {'name', 'size', 'mtime_ns', 'sha256'} of every source file
+    """
+    signature = []
+    for path in paths:
+        stat = os.stat(path)
+        signature.append({'name': os.path.basename(path), 'size': stat.st_size,
+                          'mtime_ns': stat.st_mtime_ns, 'sha256': _file_hash(path)})
+    return signature
+
+def save_snapshot(path, sources, arrays, params, state):
+    """
+        Write a snapshot directory: one .npy per array, meta.json, and state.pkl for the Python objects
+
+        arrays: name -> numpy array (numeric dtypes only, they are memory-mapped on load)
+        params: JSON-able dict (vocabularies, scaler parameters, column names ...)
+        state: anything picklable that isn't an array (eg. per-user dicts)
+
+        The directory is written next to the old one and swapped in, so a reader never
+        sees a half-written snapshot and processes that mapped the old files keep them.
+    """
+    for name, array in arrays.items():
+        if array.dtype.hasobject:
+            raise TypeError(f"{name}: object arrays can't be memory-mapped")
+
+    staging = f"{path}.tmp-{os.getpid()}"
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    for name, array in arrays.items():
+        np.save(os.path.join(staging, name + '.npy'), np.ascontiguousarray(array))
+    with open(os.path.join(staging, STATE_FILE), 'wb') as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    meta = {
+        'format_version': FORMAT_VERSION,
+        'sources': source_signature(sources),
+        'arrays': {name: {'dtype': array.dtype.str, 'shape': list(array.shape)} for name, array in arrays.items()},
+        'params': params
+    }
+    with open(os.path.join(staging, META_FILE), 'w') as f:        # written last: marks the snapshot complete
+        json.dump(meta, f)
+
+    retired = f"{path}.old-{os.getpid()}"
+    if os.path.exists(path):
+        os.replace(path, retired)
+    os.replace(staging, path)
+    shutil.rmtree(retired, ignore_errors=True)
+
+def load_snapshot(path, sources, mmap=True):
+    """
+        (arrays, params, state) of a snapshot, arrays memory-mapped read-only
+
+        Raises SnapshotError when the format version, the array schema or the source files
+        don't match. Sources are compared on size and mtime first and on their sha256 when
+        those differ (eg. a fresh checkout), like the data cache.
+    """
+    meta = read_meta(path)
+    if meta.get('format_version') != FORMAT_VERSION:
+        raise SnapshotError(f"snapshot format {meta.get('format_version')}, expected {FORMAT_VERSION}")
+    _check_sources(meta['sources'], sources)
+
+    arrays = {}
+    for name, schema in meta['arrays'].items():
+        try:
+            array = np.load(os.path.join(path, name + '.npy'), mmap_mode='r' if mmap else None)
+        except (OSError, ValueError) as error:
+            raise SnapshotError(f"{name}: {error}")
+        if array.dtype.str != schema['dtype'] or list(array.shape) != schema['shape']:
+            raise SnapshotError(f"{name}: {array.dtype.str} {list(array.shape)}, "
+                                f"expected {schema['dtype']} {schema['shape']}")
+        arrays[name] = array
+
+    gc_enabled = gc.isenabled()
+    gc.disable()        # millions of small objects: collections during the load cost more than the load
+    try:
+        with open(os.path.join(path, STATE_FILE), 'rb') as f:
+            state = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError) as error:
+        raise SnapshotError(f"state: {error}")
+    finally:
+        if gc_enabled:
+            gc.enable()
+    return arrays, meta['params'], state
+
+def read_meta(path):
+    try:
+        with open(os.path.join(path, META_FILE)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        raise SnapshotError(f"no snapshot at {path}")
+    except (OSError, ValueError) as error:
+        raise SnapshotError(f"unreadable {META_FILE}: {error}")
+
+def _check_sources(recorded, paths):
+    if [source['name'] for source in recorded] != [os.path.basename(path) for path in paths]:
+        raise SnapshotError("snapshot was built from other source files")
+    for source, path in zip(recorded, paths):
+        stat = os.stat(path)
+        if source['size'] == stat.st_size and source['mtime_ns'] == stat.st_mtime_ns:
+            continue
+        if source['size'] != stat.st_size or source['sha256'] != _file_hash(path):
+            raise SnapshotError(f"{source['name']} changed since the snapshot was built")
@@ -0,0 +1,164 @@
+import functools
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from recommendation_engine import RecommendationEngine
+from utils.collaborative import CollaborativeFilter
+from utils.retrieval import IVFRetrieval
+
+# scoring backends of the engine, see make_engine ('batch' replays get_recommendations_batch)
+BACKENDS = ('rowwise', 'vectorized', 'batch', 'ivf', 'collaborative', 'ivf+collaborative')
+
+_worker = {}        # engine of the current process (set once per pool worker)
+
+def make_engine(backend):
+    """
+        Engine configured for one of BACKENDS, without caches or files (nothing shared between runs)
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend: {backend}")
+    options = dict(similarity_index_path=None, snapshot_path=None, cache_size=0)
+    if backend == 'rowwise':
+        options['scoring_mode'] = 'rowwise'
+    if backend.startswith('ivf'):
+        options['retrieval'] = IVFRetrieval()
+    if backend.endswith('collaborative'):
+        options['collaborative'] = CollaborativeFilter()
+    return RecommendationEngine(**options)
+
+def temporal_split(user_history_df, test_fraction=0.2, cutoff=None):
+    """
+        (train, test): visits before the cutoff date and visits from it on
+
+        Without a cutoff it is the visit_date quantile that leaves test_fraction of the visits in test
+    """
+    dates = pd.to_datetime(user_history_df['visit_date'])
+    if cutoff is None:
+        cutoff = dates.quantile(1.0 - test_fraction)
+    is_test = (dates >= pd.Timestamp(cutoff)).to_numpy()
+    return user_history_df[~is_test].reset_index(drop=True), user_history_df[is_test].reset_index(drop=True)
+
+def relevant_destinations(train_df, test_df, min_rating=None):
+    """
+        user_id -> set of destinations visited in test (rated at least min_rating) but not in train
+    """
+    if min_rating is not None:
+        test_df = test_df[test_df['rating'] >= min_rating]
+    seen = set(zip(train_df['user_id'].tolist(), train_df['destination_id'].tolist()))
+    relevant = {}
+    for user_id, destination_id in zip(test_df['user_id'].tolist(), test_df['destination_id'].tolist()):
+        if (user_id, destination_id) not in seen:
+            relevant.setdefault(user_id, set()).add(destination_id)
+    return relevant
+
+def ranking_metrics(recommended, relevant, k):
+    """
+        (precision@k, recall@k, NDCG@k) of one user, binary relevance
+    """
+    hits = np.array([destination_id in relevant for destination_id in recommended[:k]], dtype=float)
+    discounts = 1.0 / np.log2(np.arange(2, k + 2))
+    ideal = discounts[:min(len(relevant), k)].sum()
+    return hits.sum() / k, hits.sum() / len(relevant), (hits * discounts[:len(hits)]).sum() / ideal
+
+def evaluate(destinations_df, user_history_df, backends=('vectorized',), k=10, test_fraction=0.2, cutoff=None,
+             min_rating=None, n_jobs=1, chunk_size=64):
+    """
+        Replay the recommendations of every test user on each backend and score them
+
+        The engine is initialized on the train part of a temporal split, once per worker
+        process. Test users are sent to the workers chunk_size at a time and every
+        get_recommendations call is timed (for 'batch' the chunk time is spread over its
+        users). backends holds names of BACKENDS or (name, factory) pairs, factory being a
+        picklable callable returning an uninitialized engine.
+
+        Returns one row per backend: users, precision / recall / NDCG at k, coverage of the
+        catalog, engine init time, latency per user (p50 / p99) and throughput
+    """
+    train_df, test_df = temporal_split(user_history_df, test_fraction, cutoff)
+    relevant = relevant_destinations(train_df, test_df, min_rating)
+    user_ids = sorted(relevant)
+    chunks = [user_ids[start:start + chunk_size] for start in range(0, len(user_ids), chunk_size)]
+
+    rows = []
+    for backend in backends:
+        name, factory = backend if isinstance(backend, tuple) else (backend, functools.partial(make_engine, backend))
+        recommended, seconds, init_seconds, wall_seconds = _replay(
+            name, factory, destinations_df, train_df, chunks, k, n_jobs
+        )
+
+        metrics = np.array([ranking_metrics(recommended[user_id], relevant[user_id], k) for user_id in user_ids])
+        metrics = metrics.mean(axis=0) if len(metrics) else np.full(3, np.nan)
+        covered = set().union(*recommended.values()) if recommended else set()
+        latencies = np.array([seconds[user_id] for user_id in user_ids]) * 1000
+        rows.append({
+            'backend': name,
+            'users': len(user_ids),
+            f'precision@{k}': metrics[0],
+            f'recall@{k}': metrics[1],
+            f'ndcg@{k}': metrics[2],
+            'coverage': len(covered) / len(destinations_df),
+            'init_s': init_seconds,
+            'p50_ms': np.percentile(latencies, 50) if len(latencies) else np.nan,
+            'p99_ms': np.percentile(latencies, 99) if len(latencies) else np.nan,
+            'users_per_s': len(user_ids) / wall_seconds if wall_seconds > 0 else np.nan
+        })
+    return pd.DataFrame(rows)
+
+def _replay(name, factory, destinations_df, train_df, chunks, k, n_jobs):
+    """
+        ({user_id: recommended ids}, {user_id: seconds}, slowest engine init, replay wall time)
+
+        The wall time leaves the engine init out (workers initialize in parallel, the
+        slowest one is subtracted)
+    """
+    init_args = (name, factory, destinations_df, train_df)
+    start = time.perf_counter()
+    if n_jobs == 1:
+        _init_worker(*init_args)
+        results = [_replay_chunk((chunk, k)) for chunk in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker, initargs=init_args) as pool:
+            results = list(pool.map(_replay_chunk, [(chunk, k) for chunk in chunks]))
+    wall_seconds = time.perf_counter() - start
+
+    recommended, seconds, init_seconds = {}, {}, [_worker.get('init_seconds', 0.0) if n_jobs == 1 else 0.0]
+    for chunk_recommended, chunk_seconds, worker_init in results:
+        recommended.update(chunk_recommended)
+        seconds.update(chunk_seconds)
+        init_seconds.append(worker_init)
+    return recommended, seconds, max(init_seconds), wall_seconds - max(init_seconds)
+
+def _init_worker(name, factory, destinations_df, train_df):
+    start = time.perf_counter()
+    engine = factory()
+    engine.initialize(destinations_df.copy(), train_df.copy())
+    _worker.clear()
+    _worker.update(engine=engine, batch=name == 'batch', init_seconds=time.perf_counter() - start)
+
+def _replay_chunk(task):
+    """
+        Recommendations and latency of a chunk of users on this process's engine
+    """
+    user_ids, k = task
+    engine = _worker['engine']
+    recommended, seconds = {}, {}
+    if _worker['batch']:
+        start = time.perf_counter()
+        batch = engine.get_recommendations_batch(user_ids=user_ids, k=k)
+        elapsed = (time.perf_counter() - start) / max(len(user_ids), 1)
+        grouped = batch.groupby('user_id', sort=False)['destination_id'].agg(list).to_dict()
+        for user_id in user_ids:
+            recommended[user_id], seconds[user_id] = grouped.get(user_id, []), elapsed
+    else:
+        for user_id in user_ids:
+            start = time.perf_counter()
+            recommendations = engine.get_recommendations(user_id, k)
+            seconds[user_id] = time.perf_counter() - start
+            recommended[user_id] = recommendations['destination_id'].tolist() if len(recommendations) else []
+
+    # each worker reports its init time once, with its first chunk
+    init_seconds, _worker['init_seconds'] = _worker.get('init_seconds', 0.0), 0.0
+    return recommended, seconds, init_seconds
@@ -0,0 +1,114 @@
+import glob
+import os
+import time
+
+import pandas as pd
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:         # no pyarrow -> csv logs only
+    pq = None
+
+HISTORY_COLUMNS = ['user_id', 'destination_id', 'rating']
+HISTORY_EXTENSIONS = ('.csv', '.csv.gz', '.parquet')
+
+def iter_history_chunks(path, chunk_size=500_000):
+    """
+        Read a csv / parquet history log chunk by chunk, only the columns profiles need
+    """
+    if path.endswith(('.csv', '.csv.gz')):
+        yield from pd.read_csv(path, usecols=HISTORY_COLUMNS, chunksize=chunk_size)
+    elif path.endswith('.parquet'):
+        if pq is None:
+            raise ImportError("pyarrow is needed to read parquet history files")
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size, columns=HISTORY_COLUMNS):
+            yield batch.to_pandas()
+    else:
+        raise ValueError(f"Unsupported history file: {path}")
+
+def expand_paths(paths):
+    """
+        Files to read, directories are replaced by their csv / parquet files in name order
+    """
+    if isinstance(paths, str):
+        paths = [paths]
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files += sorted(f for f in glob.glob(os.path.join(path, '*')) if f.endswith(HISTORY_EXTENSIONS))
+        else:
+            files.append(path)
+    return [os.path.abspath(f) for f in files]
+
+class HistoryIngestor:
+    """
+        Streams history logs into a UserProfileStore, the visited rows of an AttributeIndex
+        and the visit aggregates of AnalyticsCubes (optional)
+
+        Chunks are folded in and dropped, the raw history is never kept. Ingested files are
+        remembered (size and mtime) so calling ingest again on a log directory only reads
+        the files added since; a file that changed after being ingested is refused, its rows
+        would be counted twice.
+    """
+    def __init__(self, profile_store, attribute_index, chunk_size=500_000, analytics=None):
+        self.profile_store = profile_store
+        self.attribute_index = attribute_index
+        self.analytics = analytics
+        self.chunk_size = chunk_size
+        self.files = {}         # absolute path -> {'size', 'mtime_ns', 'rows'}
+
+    def reset(self):
+        self.files = {}
+
+    def ingest(self, paths, on_chunk=None):
+        """
+            Fold every file not ingested yet, on_chunk(user_ids) is called after each chunk
+
+            Returns {'files', 'skipped', 'rows', 'seconds', 'rows_per_second'}
+        """
+        start = time.perf_counter()
+        num_files = skipped = rows = 0
+
+        for path in expand_paths(paths):
+            stat = os.stat(path)
+            known = self.files.get(path)
+            if known is not None:
+                if known['size'] == stat.st_size and known['mtime_ns'] == stat.st_mtime_ns:
+                    skipped += 1
+                    continue
+                raise ValueError(f"{path} changed after it was ingested, write new rows to a new file")
+
+            file_rows = self._fold_file(path, on_chunk)
+            self.files[path] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'rows': file_rows}
+            num_files += 1
+            rows += file_rows
+
+        seconds = time.perf_counter() - start
+        return {
+            'files': num_files,
+            'skipped': skipped,
+            'rows': rows,
+            'seconds': seconds,
+            'rows_per_second': rows / seconds if seconds > 0 else 0.0
+        }
+
+    def replay(self):
+        """
+            Fold every ingested file again (after the store / index were rebuilt for a new catalog)
+        """
+        for path in self.files:
+            self._fold_file(path)
+
+    def _fold_file(self, path, on_chunk=None):
+        rows = 0
+        for chunk in iter_history_chunks(path, self.chunk_size):
+            user_ids = chunk['user_id'].to_numpy()
+            destination_ids = chunk['destination_id'].to_numpy()
+            users = self.profile_store.add_ratings(user_ids, destination_ids, chunk['rating'].to_numpy())
+            self.attribute_index.add_visits(user_ids, destination_ids)
+            if self.analytics is not None:
+                self.analytics.add_ratings(user_ids, destination_ids, chunk['rating'].to_numpy())
+            if on_chunk is not None:
+                on_chunk(users)
+            rows += len(chunk)
+        return rows
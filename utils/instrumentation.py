@@ -0,0 +1,154 @@
+import functools
+import json
+import os
+import threading
+import time
+
+class _NullTimer:
+    """
+        Returned by Instrumentation.timer while disabled, does nothing
+    """
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+_NULL_TIMER = _NullTimer()
+
+class _Timer:
+    def __init__(self, instrumentation, name):
+        self.instrumentation = instrumentation
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.instrumentation.record(self.name, time.perf_counter() - self.start)
+        return False
+
+class Instrumentation:
+    """
+        Named stage timers and counters for the recommendation pipeline
+
+        Off by default, turned on with RECOMMENDER_INSTRUMENTATION=1 in the environment (or
+        enable()). While off, timer() hands back a shared no-op context manager and timed()
+        functions only pay one attribute check, so the hot paths stay as fast as without it
+    """
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._timers = {}       # name -> [count, total seconds, max seconds]
+        self._counters = {}     # name -> value
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        with self._lock:
+            self._timers = {}
+            self._counters = {}
+
+    def timer(self, name):
+        """
+            with instrumentation.timer('stage'): ...
+        """
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name)
+
+    def timed(self, name):
+        """
+            Decorator version of timer()
+        """
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.record(name, time.perf_counter() - start)
+            return wrapper
+        return decorator
+
+    def record(self, name, seconds):
+        with self._lock:
+            stats = self._timers.get(name)
+            if stats is None:
+                self._timers[name] = [1, seconds, seconds]
+            else:
+                stats[0] += 1
+                stats[1] += seconds
+                stats[2] = max(stats[2], seconds)
+
+    def count(self, name, value=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def snapshot(self):
+        """
+            {'timers': {name: {count, total_s, mean_s, max_s}}, 'counters': {name: value}}
+        """
+        with self._lock:
+            return {
+                'timers': {
+                    name: {'count': count, 'total_s': total, 'mean_s': total / count, 'max_s': maximum}
+                    for name, (count, total, maximum) in sorted(self._timers.items())
+                },
+                'counters': dict(sorted(self._counters.items()))
+            }
+
+    def to_prometheus(self, prefix='recommender'):
+        """
+            Prometheus text exposition format
+        """
+        snapshot = self.snapshot()
+        lines = [
+            f'# HELP {prefix}_stage_seconds Time spent in each pipeline stage.',
+            f'# TYPE {prefix}_stage_seconds summary'
+        ]
+        for name, stats in snapshot['timers'].items():
+            lines.append(f'{prefix}_stage_seconds_count{{stage="{name}"}} {stats["count"]}')
+            lines.append(f'{prefix}_stage_seconds_sum{{stage="{name}"}} {stats["total_s"]:.9f}')
+        lines += [
+            f'# HELP {prefix}_stage_seconds_max Slowest single call of each pipeline stage.',
+            f'# TYPE {prefix}_stage_seconds_max gauge'
+        ]
+        for name, stats in snapshot['timers'].items():
+            lines.append(f'{prefix}_stage_seconds_max{{stage="{name}"}} {stats["max_s"]:.9f}')
+        lines += [
+            f'# HELP {prefix}_events_total Pipeline counters.',
+            f'# TYPE {prefix}_events_total counter'
+        ]
+        for name, value in snapshot['counters'].items():
+            lines.append(f'{prefix}_events_total{{name="{name}"}} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def to_json_lines(self):
+        """
+            One JSON object per timer / counter, stamped with the export time
+        """
+        snapshot = self.snapshot()
+        timestamp = time.time()
+        lines = [
+            json.dumps({'timestamp': timestamp, 'type': 'timer', 'name': name, **stats})
+            for name, stats in snapshot['timers'].items()
+        ]
+        lines += [
+            json.dumps({'timestamp': timestamp, 'type': 'counter', 'name': name, 'value': value})
+            for name, value in snapshot['counters'].items()
+        ]
+        return '\n'.join(lines) + '\n' if lines else ''
+
+# process-wide instance used by DataHandler / RecommendationEngine / app.py
+instrumentation = Instrumentation(enabled=os.environ.get('RECOMMENDER_INSTRUMENTATION') == '1')
@@ -0,0 +1,146 @@
+import copy
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+class UserProfileStore:
+    """
+        Running user profiles: unnormalized rating-weighted feature sums and total weight per user
+
+        get_profile divides by the total weight on the way out, so a new rating only touches
+        the features of the rated destination instead of replaying the user's whole history.
+        Destination features are read from the catalog (codes turned into one sparse row per
+        destination), the store keeps no per-destination Python objects
+    """
+    def __init__(self):
+        self._sums = {}                     # user_id -> {feature: sum of rating * count}
+        self._total_weight = {}             # user_id -> sum of all the user's ratings
+        self._num_rated = {}                # user_id -> ratings of destinations in the catalog
+        self._catalog = None
+        self._feature_matrix = None         # destinations x profile keys, activity counts and climate / type indicators
+        self._keys = []                     # profile key of each column
+
+    def set_catalog(self, catalog):
+        """
+            Feature keys of every destination from the catalog codes, named like the keys of create_user_profile
+
+            Needed after build and after unpickling (the destination part isn't pickled)
+        """
+        num_activities, num_climates = len(catalog.activity_values), len(catalog.climate_values)
+        rows = [np.repeat(np.arange(len(catalog)), catalog.activity_counts)]
+        columns = [catalog.activity_codes.astype(np.int64)]
+        for offset, codes in ((num_activities, catalog.climate_codes), (num_activities + num_climates, catalog.type_codes)):
+            known = codes >= 0          # a missing climate / type adds no key, like in the scoring
+            rows.append(np.flatnonzero(known))
+            columns.append(codes[known].astype(np.int64) + offset)
+        rows, columns = np.concatenate(rows), np.concatenate(columns)
+
+        self._keys = (list(catalog.activity_values) + [f'climate_{climate}' for climate in catalog.climate_values]
+                      + [f'type_{dest_type}' for dest_type in catalog.type_values])
+        self._feature_matrix = sp.csr_matrix((np.ones(len(rows)), (rows, columns)),
+                                             shape=(len(catalog), len(self._keys)))     # duplicated activities are summed
+        self._catalog = catalog
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.update(_catalog=None, _feature_matrix=None, _keys=[])
+        return state
+
+    def build(self, user_history_df, catalog):
+        """
+            Full build from the history (done once, later ratings go through add_rating)
+        """
+        self.set_catalog(catalog)
+        self._sums, self._total_weight, self._num_rated = {}, {}, {}
+        self.add_ratings(user_history_df['user_id'].to_numpy(), user_history_df['destination_id'].to_numpy(),
+                         user_history_df['rating'].to_numpy())
+
+    def add_rating(self, user_id, destination_id, rating):
+        """
+            Fold one rating into the user's profile, O(features of the destination)
+        """
+        self._total_weight[user_id] = self._total_weight.get(user_id, 0.0) + rating
+
+        row = self._catalog.row_of(destination_id)
+        if row is None:         # counts towards the total like in create_user_profile, adds no features
+            return
+
+        matrix = self._feature_matrix
+        start, stop = matrix.indptr[row], matrix.indptr[row + 1]
+        sums = self._sums.setdefault(user_id, {})
+        for column, count in zip(matrix.indices[start:stop].tolist(), matrix.data[start:stop].tolist()):
+            key = self._keys[column]
+            sums[key] = sums.get(key, 0.0) + count * rating
+        sums['avg_budget'] = sums.get('avg_budget', 0.0) + self._catalog.budget_level[row].item() * rating
+        sums['avg_popularity'] = sums.get('avg_popularity', 0.0) + self._catalog.popularity_score[row].item() * rating
+        self._num_rated[user_id] = self._num_rated.get(user_id, 0) + 1
+
+    def add_ratings(self, user_ids, destination_ids, ratings):
+        """
+            Fold a chunk of ratings at once (streaming ingestion), same result as add_rating per row
+
+            The chunk is reduced to per-user feature sums with one sparse product, so the Python
+            work is per (user, feature) pair of the chunk instead of per row and feature
+        """
+        ratings = np.asarray(ratings, dtype=np.float64)
+        user_codes, users = pd.factorize(np.asarray(user_ids))
+        users = users.tolist()
+
+        for user_id, total in zip(users, np.bincount(user_codes, weights=ratings, minlength=len(users)).tolist()):
+            self._total_weight[user_id] = self._total_weight.get(user_id, 0.0) + total
+
+        catalog = self._catalog
+        rows = catalog.rows_of(destination_ids)
+        in_catalog = rows >= 0
+        user_codes, rows, ratings = user_codes[in_catalog], rows[in_catalog], ratings[in_catalog]
+
+        num_rated = np.bincount(user_codes, minlength=len(users))
+        visit_ratings = sp.csr_matrix((ratings, (user_codes, rows)), shape=(len(users), len(catalog)))
+        feature_sums = (visit_ratings @ self._feature_matrix).tocsr()
+        budget_sums = np.bincount(user_codes, weights=ratings * catalog.budget_level[rows], minlength=len(users))
+        popularity_sums = np.bincount(user_codes, weights=ratings * catalog.popularity_score[rows], minlength=len(users))
+
+        indptr, indices, values = feature_sums.indptr, feature_sums.indices, feature_sums.data.tolist()
+        keys = self._keys
+        for code in np.flatnonzero(num_rated).tolist():
+            user_id = users[code]
+            sums = self._sums.setdefault(user_id, {})
+            for column, value in zip(indices[indptr[code]:indptr[code + 1]].tolist(), values[indptr[code]:indptr[code + 1]]):
+                sums[keys[column]] = sums.get(keys[column], 0.0) + value
+            sums['avg_budget'] = sums.get('avg_budget', 0.0) + budget_sums[code].item()
+            sums['avg_popularity'] = sums.get('avg_popularity', 0.0) + popularity_sums[code].item()
+            self._num_rated[user_id] = self._num_rated.get(user_id, 0) + int(num_rated[code])
+        return users
+
+    def user_ids(self):
+        """
+            Every user with at least one rating
+        """
+        return list(self._total_weight)
+
+    def get_profile(self, user_id):
+        """
+            Normalized profile features, None if the user rated no destination of the catalog
+        """
+        if not self._num_rated.get(user_id):
+            return None
+
+        total_weight = self._total_weight[user_id]
+        return {key: value / total_weight for key, value in self._sums[user_id].items()}
+
+    def snapshot(self):
+        """
+            Copy of the state of every user, to be given back to restore()
+        """
+        return copy.deepcopy({
+            'sums': self._sums,
+            'total_weight': self._total_weight,
+            'num_rated': self._num_rated
+        })
+
+    def restore(self, snapshot):
+        snapshot = copy.deepcopy(snapshot)
+        self._sums = snapshot['sums']
+        self._total_weight = snapshot['total_weight']
+        self._num_rated = snapshot['num_rated']
@@ -0,0 +1,108 @@
+import numpy as np
+
+DEFAULT_WEIGHTS = {
+    'activities': 0.4,
+    'climate': 0.2,
+    'type': 0.2,
+    'budget': 0.1,
+    'popularity': 0.1
+}
+
+class ScoringPlan:
+    """
+        Scoring weights compiled once and shared by every scoring path
+
+        Built from a weights config like DEFAULT_WEIGHTS (features left out weigh 0). The
+        weights are normalized to sum to 1 up front, so a score is the weighted sum of its
+        terms without dividing by the total weight on every call. Used as is by the rowwise
+        and destination-to-destination scoring; bind() additionally precomputes the
+        per-destination terms of the catalog (activity weight / activity count, popularity
+        term, budget level codes) so scores() and batch_scores() are one gather-and-add pass.
+
+        Plans are not modified after they are built, changing weights means a new plan.
+    """
+    def __init__(self, weights=None):
+        weights = DEFAULT_WEIGHTS if weights is None else weights
+        unknown = set(weights) - set(DEFAULT_WEIGHTS)
+        if unknown:
+            raise ValueError(f"Unknown scoring features: {sorted(unknown)}")
+        self.weights = {feature: float(weights.get(feature, 0.0)) for feature in DEFAULT_WEIGHTS}
+        if any(weight < 0 for weight in self.weights.values()):
+            raise ValueError(f"Scoring weights must not be negative: {self.weights}")
+
+        self.total_weight = 0.0
+        for weight in self.weights.values():
+            self.total_weight += weight
+        self.normalized = {feature: weight / self.total_weight if self.total_weight > 0 else 0.0
+                           for feature, weight in self.weights.items()}
+        self.key = tuple(self.weights.values())        # hashable, for cache keys
+
+        self._arrays = None
+        self.activity_weight = None         # (N,) normalized activities weight / number of activities
+        self.popularity_term = None         # (N,) popularity / 10 * normalized popularity weight
+        self.budget_levels = None           # distinct budget levels, budget_codes index them
+        self.budget_codes = None
+        self.budget_column = None           # avg_budget slot of the profile vector
+
+    def bind(self, scoring_arrays, column_index):
+        """
+            Precompute the per-destination terms for the engine's scoring arrays
+        """
+        counts = scoring_arrays['activity_counts'].astype(np.float64)
+        self.activity_weight = np.divide(self.normalized['activities'], counts, out=np.zeros(len(counts)),
+                                         where=counts > 0)
+        self.popularity_term = scoring_arrays['popularity_score'] / 10.0 * self.normalized['popularity']
+        self.budget_levels, self.budget_codes = np.unique(scoring_arrays['budget_level'], return_inverse=True)
+        self.budget_column = column_index['budget_level']
+        self._arrays = scoring_arrays
+        return self
+
+    def scores(self, profile_vector, positions):
+        """
+            Scores of one profile vector for the destinations at 'positions'
+
+            Terms are added in the same order as RecommendationEngine._calculate_destination_similarity
+            so the floats match the rowwise loop exactly
+        """
+        arrays = self._arrays
+        weights = self.normalized
+
+        # Activities similarity (summed slot by slot, padding slots add 0.0)
+        activity_values = profile_vector[arrays['activity_codes'][positions]]
+        scores = activity_values[:, 0].copy()
+        for slot in range(1, activity_values.shape[1]):
+            scores += activity_values[:, slot]
+        scores *= self.activity_weight[positions]
+
+        # Climate and type similarity (0 when the profile has no such key)
+        scores += profile_vector[arrays['climate_codes'][positions]] * weights['climate']
+        scores += profile_vector[arrays['type_codes'][positions]] * weights['type']
+
+        # Budget similarity, once per distinct budget level
+        scores += self._budget_terms(profile_vector[self.budget_column])[self.budget_codes[positions]]
+        scores += self.popularity_term[positions]
+        return scores
+
+    def batch_scores(self, profiles, activity_matrix):
+        """
+            (users, N) scores of dense (users, profile columns) profiles against every destination
+
+            activity_matrix is the activities-only batch_scoring.destination_matrix
+        """
+        arrays = self._arrays
+        weights = self.normalized
+
+        scores = (activity_matrix @ profiles.T).T
+        scores *= self.activity_weight
+        scores += profiles[:, arrays['climate_codes']] * weights['climate']
+        scores += profiles[:, arrays['type_codes']] * weights['type']
+        scores += self._budget_terms(profiles[:, [self.budget_column]])[:, self.budget_codes]
+        scores += self.popularity_term
+        return scores
+
+    def _budget_terms(self, avg_budget):
+        """
+            Weighted budget similarity of avg_budget (scalar or (users, 1)) to every budget level
+        """
+        budget_diff = np.abs(avg_budget - self.budget_levels)
+        return np.maximum(0, 1.0 - budget_diff / 4.0) * self.normalized['budget']
@@ -1,18 +1,119 @@
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
+from utils.catalog import Catalog
+from utils.scoring_plan import ScoringPlan
+
+INFO_COLUMNS = ['destination_id', 'name', 'country']        # leading columns of a dense feature matrix, not features
+
+def top_k_indices(scores, k):
+    """
+        Indices of the k best scores, highest first, ties broken by position
+        
+        np.argpartition finds the k-th best score, everything tied with it is kept
+        so the final ordering does not depend on how the partition split the ties
+    """
+    if k <= 0 or len(scores) == 0:
+        return np.array([], dtype=np.int64)
+    
+    if k < len(scores):
+        kth_best = scores[np.argpartition(-scores, k - 1)[:k]].min()
+        candidates = np.flatnonzero(scores >= kth_best)
+    else:
+        candidates = np.arange(len(scores))
+    
+    order = np.lexsort((candidates, -scores[candidates]))
+    return candidates[order][:k]
 
 class SimilarityCalculator:    
-    def cosine_similarity_matrix(self, feature_matrix):
+    def __init__(self, plan=None):
+        self.plan = plan or ScoringPlan()       # weights, shared with the engine's recommendation scoring
+    
+    @property
+    def feature_weights(self):
+        return self.plan.weights
+    
+    def _plan(self, weights):
+        """
+            The calculator's plan, or one compiled from the weights given for this call
+        """
+        return self.plan if weights is None else ScoringPlan(weights)
+    
+    def cosine_similarity_matrix(self, feature_matrix, feature_columns=None):
         """
             Calculate cosine similarity between destinations
+            
+            Accepts the dense feature dataframe, a SparseFeatureMatrix or any scipy sparse matrix
+            (sparse input is handed to sklearn as is, never densified). feature_columns picks the
+            dataframe columns compared (eg. DataHandler.feature_columns), by default every column
+            but the id / name / country, the same ones a SparseFeatureMatrix holds
         """
-        # Remove non-numeric columns for similarity calculation
-        numeric_cols = feature_matrix.select_dtypes(include=[np.number]).columns    # list
-        numeric_features = feature_matrix[numeric_cols].fillna(0)
+        from sklearn.metrics.pairwise import cosine_similarity     # deferred, sklearn is slow to import
         
-        similarity_matrix = cosine_similarity(numeric_features)   # creates nxn similarity matrix between 2 rows (ie, between row i and j)
+        similarity_matrix = cosine_similarity(self._numeric_features(feature_matrix, feature_columns))   # creates nxn similarity matrix between 2 rows (ie, between row i and j)
         return similarity_matrix
     
+    def topk_cosine_similarity(self, feature_matrix, k=10, chunk_size=1024, output_path=None, exclude_self=True,
+                               feature_columns=None):
+        """
+            Top-k cosine neighbours of every destination without building the NxN matrix
+            
+            Rows are processed chunk_size at a time, so peak memory is chunk_size x N floats.
+            Returns (indices, scores), both N x k, best first. With output_path they are
+            written to <output_path>.indices.npy / <output_path>.scores.npy as memory-mapped
+            arrays while they are computed. feature_columns as in cosine_similarity_matrix.
+        """
+        from sklearn.preprocessing import normalize
+        
+        features = normalize(self._numeric_features(feature_matrix, feature_columns))      # unit rows -> dot product is the cosine
+        num_rows = features.shape[0]
+        k = min(k, num_rows - 1 if exclude_self else num_rows)
+        
+        if output_path is None:
+            indices = np.empty((num_rows, k), dtype=np.int64)
+            scores = np.empty((num_rows, k), dtype=np.float64)
+        else:
+            indices = np.lib.format.open_memmap(f'{output_path}.indices.npy', mode='w+', dtype=np.int64, shape=(num_rows, k))
+            scores = np.lib.format.open_memmap(f'{output_path}.scores.npy', mode='w+', dtype=np.float64, shape=(num_rows, k))
+        
+        if k <= 0:
+            return indices, scores
+        
+        is_sparse = hasattr(features, 'toarray')
+        for start in range(0, num_rows, chunk_size):
+            stop = min(start + chunk_size, num_rows)
+            chunk = features[start:stop]
+            
+            # (N x features) @ dense (features x chunk) -> no sparse intermediate for sparse input
+            block = np.ascontiguousarray((features @ (chunk.T.toarray() if is_sparse else chunk.T)).T)
+            if exclude_self:
+                block[np.arange(stop - start), np.arange(start, stop)] = -np.inf
+            
+            # k best of each row (unordered), then sorted by score and position
+            top = np.argpartition(block, -k, axis=1)[:, -k:]
+            top_scores = np.take_along_axis(block, top, axis=1)
+            order = np.lexsort((top, -top_scores), axis=1)
+            indices[start:stop] = np.take_along_axis(top, order, axis=1)
+            scores[start:stop] = np.take_along_axis(top_scores, order, axis=1)
+        
+        if output_path is not None:
+            indices.flush()
+            scores.flush()
+        return indices, scores
+    
+    @staticmethod
+    def _numeric_features(feature_matrix, feature_columns=None):
+        """
+            Feature columns of a feature matrix (dense dataframe, SparseFeatureMatrix or sparse matrix)
+            
+            The dense path takes the same columns as the sparse one: the one-hot blocks (boolean
+            type dummies included) and the scaled numbers, not the destination_id
+        """
+        if hasattr(feature_matrix, 'tocsr'):
+            return feature_matrix.tocsr()
+        
+        if feature_columns is None:
+            feature_columns = [col for col in feature_matrix.columns if col not in INFO_COLUMNS]
+        return feature_matrix[feature_columns].fillna(0).to_numpy(dtype=np.float64)
+    
     def calculate_user_destination_similarity(self, user_profile_vector, destination_vector):
         """
             Calculate similarity between user profile and a destination
@@ -23,24 +124,22 @@ class SimilarityCalculator:
         dest_vec = destination_vector[:min_len]
         
         # Calculate cosine similarity
+        from sklearn.metrics.pairwise import cosine_similarity
+        
         similarity = cosine_similarity([user_vec], [dest_vec])[0][0]
         return similarity
     
     def weighted_feature_similarity(self, dest1_features, dest2_features, weights=None):
         """
             Calculate weighted similarity between two destinations
+            
+            Features missing from either destination are left out and the others reweighted
         """
-        if weights is None:
-            weights = {
-                'activities': 0.4,
-                'climate': 0.2,
-                'type': 0.2,
-                'budget': 0.1,
-                'popularity': 0.1
-            }
+        weights = self._plan(weights).normalized
         
         total_similarity = 0
         total_weight = 0
+        compared = 0
         
         # Activities similarity -> JACCARD similarity for sets
         if 'activities_list' in dest1_features and 'activities_list' in dest2_features:
@@ -49,18 +148,21 @@ class SimilarityCalculator:
             jaccard_sim = len(set1.intersection(set2)) / len(set1.union(set2)) if len(set1.union(set2)) > 0 else 0
             total_similarity += jaccard_sim * weights['activities']
             total_weight += weights['activities']
+            compared += 1
         
         # Climate similarity
         if 'climate' in dest1_features and 'climate' in dest2_features:
             climate_sim = 1.0 if dest1_features['climate'] == dest2_features['climate'] else 0.0
             total_similarity += climate_sim * weights['climate']
             total_weight += weights['climate']
+            compared += 1
         
         # Type similarity
         if 'type' in dest1_features and 'type' in dest2_features:
             type_sim = 1.0 if dest1_features['type'] == dest2_features['type'] else 0.0
             total_similarity += type_sim * weights['type']
             total_weight += weights['type']
+            compared += 1
         
         # Budget similarity (normalized difference)
         if 'budget_level' in dest1_features and 'budget_level' in dest2_features:
@@ -68,6 +170,7 @@ class SimilarityCalculator:
             budget_sim = 1.0 - (budget_diff / 4.0)          # Assuming budget levels 1-5
             total_similarity += budget_sim * weights['budget']
             total_weight += weights['budget']
+            compared += 1
         
         # Popularity similarity
         if 'popularity_score' in dest1_features and 'popularity_score' in dest2_features:
@@ -75,5 +178,70 @@ class SimilarityCalculator:
             pop_sim = 1.0 - (pop_diff / 10.0)               # Assuming popularity 0-10
             total_similarity += pop_sim * weights['popularity']
             total_weight += weights['popularity']
+            compared += 1
+        
+        if total_weight <= 0:
+            return 0
+        return total_similarity if compared == len(weights) else total_similarity / total_weight     # normalized weights sum to 1
+    
+    @staticmethod
+    def similarity_arrays(destinations):
+        """
+            Arrays used by the vectorized weighted_feature_similarity, from a Catalog or a destinations dataframe
+        """
+        catalog = destinations if isinstance(destinations, Catalog) else Catalog.from_dataframe(destinations)
+        activities = catalog.activity_matrix(binary=True)       # jaccard works on sets
+        return {
+            'ids': catalog.destination_ids,
+            'activities': activities,
+            'activity_counts': np.asarray(activities.sum(axis=1)).ravel(),
+            'climate': catalog.climate_codes,
+            'type': catalog.type_codes,
+            'budget_level': catalog.budget_level.astype(np.float64),
+            'popularity_score': catalog.popularity_score
+        }
+    
+    def weighted_feature_similarity_block(self, arrays, rows, weights=None):
+        """
+            weighted_feature_similarity between the destinations at 'rows' and every destination
+            
+            arrays come from similarity_arrays, returns a len(rows) x N matrix. Jaccard uses sparse
+            intersection counts and set sizes, terms are added in the same order as the scalar
+            version so the floats match
+        """
+        weights = self._plan(weights).normalized
+        rows = np.atleast_1d(rows)
+        activities = arrays['activities']
         
-        return total_similarity / total_weight if total_weight > 0 else 0
\ No newline at end of file
+        # Activities similarity -> jaccard from sparse intersection counts
+        intersection = (activities[rows] @ activities.T).toarray()
+        union = arrays['activity_counts'][rows, None] + arrays['activity_counts'][None, :] - intersection
+        jaccard_sim = np.divide(intersection, union, out=np.zeros(intersection.shape), where=union > 0)
+        total_similarity = jaccard_sim * weights['activities']
+        
+        total_similarity += (arrays['climate'][rows, None] == arrays['climate'][None, :]) * weights['climate']
+        total_similarity += (arrays['type'][rows, None] == arrays['type'][None, :]) * weights['type']
+        
+        budget_diff = np.abs(arrays['budget_level'][rows, None] - arrays['budget_level'][None, :])
+        total_similarity += (1.0 - (budget_diff / 4.0)) * weights['budget']
+        
+        pop_diff = np.abs(arrays['popularity_score'][rows, None] - arrays['popularity_score'][None, :])
+        total_similarity += (1.0 - (pop_diff / 10.0)) * weights['popularity']
+        return total_similarity
+    
+    def weighted_feature_similarity_to_all(self, arrays, row, weights=None):
+        """
+            One-to-all: weighted_feature_similarity of the destination at 'row' with every destination (N,)
+        """
+        return self.weighted_feature_similarity_block(arrays, [row], weights)[0]
+    
+    def weighted_feature_similarity_blocks(self, arrays, block_size=256, weights=None):
+        """
+            Blocked all-to-all: yields (rows, len(rows) x N scores) covering the whole catalog
+            
+            Peak memory is block_size x N floats instead of the N x N matrix
+        """
+        num_rows = len(arrays['ids'])
+        for start in range(0, num_rows, block_size):
+            rows = np.arange(start, min(start + block_size, num_rows))
+            yield rows, self.weighted_feature_similarity_block(arrays, rows, weights)
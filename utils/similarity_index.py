@@ -0,0 +1,202 @@
+import os
+import threading
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+from utils.scoring_plan import DEFAULT_WEIGHTS, ScoringPlan
+from utils.similarity_calculator import SimilarityCalculator, top_k_indices
+
+class SimilarityIndex:
+    """
+        Precomputed top-K neighbours for every destination
+
+        Scores are the same as SimilarityCalculator.weighted_feature_similarity,
+        so a lookup gives the same answer as scanning the whole catalog
+    """
+    def __init__(self, num_neighbors=10, weights=None, block_size=256):
+        self.num_neighbors = num_neighbors
+        self.weights = weights or DEFAULT_WEIGHTS
+        self.block_size = block_size        # rows scored at once while building (block_size x N floats)
+        self.destination_ids = None         # (N,)
+        self.fingerprints = None            # (N,) hash of the features of each destination
+        self.neighbor_ids = None            # (N, K) destination ids, -1 when there are fewer than K
+        self.neighbor_scores = None         # (N, K) similarity scores, nan when there are fewer than K
+        self._row_of = {}
+        self._calculator = SimilarityCalculator(ScoringPlan(self.weights))
+
+    def build(self, destinations_df):
+        """
+            Build the index from scratch (O(N^2) similarity computations, done in blocks)
+        """
+        arrays = SimilarityCalculator.similarity_arrays(destinations_df)
+        num_rows = len(arrays['ids'])
+        self.destination_ids = arrays['ids']
+        self.fingerprints = self._fingerprints(destinations_df)
+        self.neighbor_ids = np.full((num_rows, self.num_neighbors), -1, dtype=np.int64)
+        self.neighbor_scores = np.full((num_rows, self.num_neighbors), np.nan)
+
+        for rows, block_scores in self._calculator.weighted_feature_similarity_blocks(arrays, self.block_size):
+            self._store_neighbors(rows, block_scores, arrays['ids'])
+
+        self._row_of = {dest_id: row for row, dest_id in enumerate(self.destination_ids.tolist())}
+        return self
+
+    def update(self, destinations_df):
+        """
+            Bring the index up to date with a new version of the catalog
+
+            Only new / changed destinations and the rows that had one of them (or a removed
+            destination) as neighbour are recomputed, every other row merges the changed
+            destinations into its current neighbour list
+
+            Returns True if anything changed
+        """
+        if self.destination_ids is None:
+            self.build(destinations_df)
+            return True
+
+        new_ids = destinations_df['destination_id'].to_numpy(dtype=np.int64)
+        new_fingerprints = self._fingerprints(destinations_df)
+        old_rows = np.array([self._row_of.get(dest_id, -1) for dest_id in new_ids.tolist()], dtype=np.int64)
+        known = old_rows >= 0
+
+        unchanged = known.copy()
+        unchanged[known] = self.fingerprints[old_rows[known]] == new_fingerprints[known]
+        changed_ids = new_ids[~unchanged]
+        removed_ids = np.setdiff1d(self.destination_ids, new_ids)
+
+        if len(changed_ids) == 0 and len(removed_ids) == 0 and np.array_equal(new_ids, self.destination_ids):
+            return False
+
+        # Ties are broken by catalog position, so reordered catalogs need a full rebuild
+        if not np.all(np.diff(old_rows[known]) > 0):
+            self.build(destinations_df)
+            return True
+
+        arrays = SimilarityCalculator.similarity_arrays(destinations_df)
+        num_rows = len(new_ids)
+        old_neighbor_ids = np.full((num_rows, self.num_neighbors), -1, dtype=np.int64)
+        old_neighbor_scores = np.full((num_rows, self.num_neighbors), np.nan)
+        old_neighbor_ids[unchanged] = self.neighbor_ids[old_rows[unchanged]]
+        old_neighbor_scores[unchanged] = self.neighbor_scores[old_rows[unchanged]]
+
+        # Rows that lost a neighbour to an edit or deletion have to be rescored against everything
+        stale = np.isin(old_neighbor_ids, np.concatenate([changed_ids, removed_ids])).any(axis=1)
+        recompute = np.flatnonzero(~unchanged | stale)
+        merge = np.flatnonzero(unchanged & ~stale)
+
+        self.destination_ids = new_ids
+        self.fingerprints = new_fingerprints
+        self.neighbor_ids = old_neighbor_ids
+        self.neighbor_scores = old_neighbor_scores
+        self._row_of = {dest_id: row for row, dest_id in enumerate(new_ids.tolist())}
+
+        for start in range(0, len(recompute), self.block_size):
+            rows = recompute[start:start + self.block_size]
+            block_scores = self._calculator.weighted_feature_similarity_block(arrays, rows)
+            self._store_neighbors(rows, block_scores, new_ids)
+
+        changed_rows = np.flatnonzero(~unchanged)
+        if len(changed_rows) and len(merge):
+            # similarity is symmetric, so column i of (changed x N) is row i against the changed rows
+            changed_scores = self._calculator.weighted_feature_similarity_block(arrays, changed_rows)
+            for row in merge.tolist():
+                self._merge_neighbors(row, changed_rows, changed_scores[:, row], new_ids)
+
+        return True
+
+    def lookup(self, destination_id, num_similar):
+        """
+            Neighbour ids and scores of a destination, best first (O(K))
+
+            Returns None if the destination is not indexed or num_similar is bigger than K
+        """
+        row = self._row_of.get(destination_id)
+        if row is None or num_similar > self.num_neighbors:
+            return None
+
+        neighbor_ids = self.neighbor_ids[row, :num_similar]
+        valid = neighbor_ids >= 0
+        return neighbor_ids[valid], self.neighbor_scores[row, :num_similar][valid]
+
+    def save(self, path):
+        """
+            Write the index next to path and swap it in, readers never see a half-written file
+        """
+        staging = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+        with open(staging, 'wb') as f:
+            np.savez(
+                f,
+                num_neighbors=self.num_neighbors,
+                weights=np.array([self.weights[key] for key in sorted(self.weights)]),
+                destination_ids=self.destination_ids,
+                fingerprints=self.fingerprints,
+                neighbor_ids=self.neighbor_ids,
+                neighbor_scores=self.neighbor_scores
+            )
+        os.replace(staging, path)
+
+    @classmethod
+    def load(cls, path, num_neighbors=10, weights=None):
+        """
+            Load a saved index, returns None if there is none, it can't be read (eg. truncated)
+            or it was built with other settings
+        """
+        if not os.path.exists(path):
+            return None
+
+        index = cls(num_neighbors, weights)
+        try:
+            with np.load(path) as data:
+                expected_weights = np.array([index.weights[key] for key in sorted(index.weights)])
+                if int(data['num_neighbors']) != num_neighbors or not np.array_equal(data['weights'], expected_weights):
+                    return None
+                index.destination_ids = data['destination_ids']
+                index.fingerprints = data['fingerprints']
+                index.neighbor_ids = data['neighbor_ids']
+                index.neighbor_scores = data['neighbor_scores']
+        except (OSError, ValueError, KeyError, EOFError, zipfile.BadZipFile):
+            return None
+
+        index._row_of = {dest_id: row for row, dest_id in enumerate(index.destination_ids.tolist())}
+        return index
+
+    def _store_neighbors(self, rows, block_scores, ids):
+        """
+            Keep the top-K of each scored row, skipping the destination itself
+        """
+        for row, scores in zip(rows.tolist(), block_scores):
+            scores[ids == ids[row]] = -np.inf
+            top = top_k_indices(scores, self.num_neighbors)
+            top = top[np.isfinite(scores[top])]
+            self.neighbor_ids[row] = -1
+            self.neighbor_scores[row] = np.nan
+            self.neighbor_ids[row, :len(top)] = ids[top]
+            self.neighbor_scores[row, :len(top)] = scores[top]
+
+    def _merge_neighbors(self, row, changed_rows, changed_scores, ids):
+        """
+            Merge freshly scored destinations into the neighbour list of an untouched row
+        """
+        current = self.neighbor_ids[row] >= 0
+        candidate_rows = np.concatenate([
+            np.array([self._row_of[dest_id] for dest_id in self.neighbor_ids[row][current].tolist()], dtype=np.int64),
+            changed_rows
+        ])
+        candidate_scores = np.concatenate([self.neighbor_scores[row][current], changed_scores])
+
+        keep = ids[candidate_rows] != ids[row]
+        candidate_rows, candidate_scores = candidate_rows[keep], candidate_scores[keep]
+        order = np.lexsort((candidate_rows, -candidate_scores))[:self.num_neighbors]
+
+        self.neighbor_ids[row] = -1
+        self.neighbor_scores[row] = np.nan
+        self.neighbor_ids[row, :len(order)] = ids[candidate_rows[order]]
+        self.neighbor_scores[row, :len(order)] = candidate_scores[order]
+
+    @staticmethod
+    def _fingerprints(destinations_df):
+        columns = ['destination_id', 'activities', 'climate', 'type', 'budget_level', 'popularity_score']
+        return pd.util.hash_pandas_object(destinations_df[columns], index=False).to_numpy()